@@ -0,0 +1,81 @@
+# coding: utf8
+#
+#        Copyright (C) 2017 Yandex LLC
+#        http://yandex.com
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#
+
+"""
+Сравнение пакетной распаковки unpack_container_messages с распаковкой по одному сообщению в цикле.
+
+Запуск: python -m benchmarks.batch_unpack
+"""
+
+import argparse
+import base64
+import struct
+
+from ofd.protocol import DOCUMENTS, VLN, ProtocolPacker, unpack_container_message, unpack_container_messages
+from benchmarks.samples import make_receipt_raw, best_of, FISCAL_SIGN
+
+
+def unpack_container_message_legacy(container_message_raw, fiscal_sign):
+    """
+    Прежняя реализация unpack_container_message: VLN для ФПО создаётся на каждый вызов.
+    """
+    ty, length = struct.unpack('<HH', container_message_raw[:4])
+    stlv_doc = DOCUMENTS[ty]
+    fps = VLN('fiscalSignOperator', 'фпс для оператора')
+
+    container_message = stlv_doc.unpack(container_message_raw[4:4 + length])
+    container_message['rawData'] = base64.b64encode(container_message_raw + fiscal_sign).decode('utf8')
+    container_message['code'] = ty
+    container_message['messageFiscalSign'] = fps.unpack(fiscal_sign)
+    if 'docName' in container_message:
+        del container_message['docName']
+
+    container_message = ProtocolPacker.format_message_fields(container_message)
+    return {stlv_doc.name: container_message}, stlv_doc
+
+
+def loop(unpack, messages):
+    result = []
+    for raw, fiscal_sign in messages:
+        try:
+            result.append(unpack(raw, fiscal_sign))
+        except Exception as e:
+            result.append(e)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--messages', default=5000, type=int, help='количество сообщений в пачке')
+    parser.add_argument('--items', default=3, type=int, help='количество позиций в чеке')
+    argv = parser.parse_args()
+
+    raw = make_receipt_raw(argv.items)
+    messages = [(raw, FISCAL_SIGN)] * argv.messages
+
+    legacy = best_of(lambda: loop(unpack_container_message_legacy, messages), 1)
+    current = best_of(lambda: loop(unpack_container_message, messages), 1)
+    batch = best_of(lambda: list(unpack_container_messages(messages)), 1)
+
+    print('{} messages, {} bytes each'.format(argv.messages, len(raw)))
+    for title, elapsed in [('legacy loop', legacy), ('loop', current), ('batch', batch)]:
+        print('{:>12}: {:8.1f} us/message, {:8.0f} messages/s'.format(title, elapsed / argv.messages * 1e6,
+                                                                      argv.messages / elapsed))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+# coding: utf8
+#
+#        Copyright (C) 2017 Yandex LLC
+#        http://yandex.com
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#
+
+"""
+Выгрузка чеков в столбцы: ColumnarExporter против распаковки unpack_container_message и построчного разворачивания
+dict в списки значений. Память - пик tracemalloc на всю выгрузку.
+
+Запуск: python -m benchmarks.columnar_export --documents 10000 --items 5
+"""
+
+import argparse
+import time
+import tracemalloc
+
+from ofd.columnar import DOCUMENT_FIELDS, ITEM_FIELDS, export_columns
+from ofd.protocol import unpack_container_message
+from benchmarks.samples import make_receipt_raw, FISCAL_SIGN
+
+
+def export_rows(messages):
+    """
+    Как выгрузка делается сейчас: распаковать документ в dict и переложить реквизиты в строки таблиц.
+    """
+    documents = []
+    items = []
+    for raw in messages:
+        doc, stlv_doc = unpack_container_message(raw, FISCAL_SIGN)
+        body = doc[stlv_doc.name]
+        body['code'] = stlv_doc.ty
+        documents.append(tuple(body.get(field) for field in DOCUMENT_FIELDS))
+        for item in body.get('items', ()):
+            items.append((len(documents) - 1,) + tuple(item.get(field) for field in ITEM_FIELDS))
+    return documents, items
+
+
+def measure(export, messages):
+    started = time.perf_counter()
+    export(messages)
+    elapsed = time.perf_counter() - started
+
+    tracemalloc.start()
+    result = export(messages)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    del result
+    return elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--documents', default=10000, type=int, help='количество чеков')
+    parser.add_argument('--items', default=5, type=int, help='количество позиций в чеке')
+    argv = parser.parse_args()
+
+    messages = [make_receipt_raw(argv.items)] * argv.documents
+    for title, export in [('rows', export_rows), ('columns', export_columns)]:
+        elapsed, peak = min(measure(export, messages) for _ in range(3))
+        print('{:>8}: {:8.1f} us/document, peak memory {:8.1f} KiB'.format(title, elapsed * 1e6 / argv.documents,
+                                                                           peak / 1024))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+# coding: utf8
+#
+#        Copyright (C) 2017 Yandex LLC
+#        http://yandex.com
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#
+
+"""
+Расчёт и проверка CRC контейнера.
+
+Запуск: python -m benchmarks.crc
+"""
+
+import argparse
+
+import crcmod.predefined
+
+from ofd.protocol import FrameHeader, verify_crc
+from benchmarks.samples import make_receipt_raw, best_of
+
+
+def recalculate_crc_legacy(header, body):
+    """
+    Прежняя реализация FrameHeader.recalculate_crc: таблица CRC строится на каждый вызов, части склеиваются.
+    """
+    f = crcmod.predefined.mkPredefinedCrcFun('crc-ccitt-false')
+    pack = header.pack()
+    header.crc = f(pack[:2] + pack[4:] + body)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--items', default=[1, 300], type=int, nargs='+', help='количество позиций в чеке')
+    parser.add_argument('--number', default=2000, type=int, help='количество вызовов в одном замере')
+    argv = parser.parse_args()
+
+    print('{:>6} {:>8} {:>16} {:>16} {:>16}'.format('items', 'bytes', 'legacy, us', 'recalculate, us',
+                                                    'verify, us'))
+    for count in argv.items:
+        body = make_receipt_raw(count)
+        header = FrameHeader(length=FrameHeader.STRUCT.size + len(body), crc=0, doctype=3, extra1=b'\x10\t',
+                             devnum=b'\x99\x99\x07\x89\x00\x00T\x88', docnum=b'\x00\x00\x01', extra2=b'\x00' * 12)
+        view = memoryview(body)
+        header.recalculate_crc(body)
+        assert verify_crc(header, view)
+
+        legacy = best_of(lambda: recalculate_crc_legacy(header, body), argv.number)
+        recalculate = best_of(lambda: header.recalculate_crc(body), argv.number)
+        verify = best_of(lambda: verify_crc(header, view), argv.number)
+        print('{:>6} {:>8} {:>16.2f} {:>16.2f} {:>16.2f}'.format(count, len(body), legacy * 1e6, recalculate * 1e6,
+                                                                 verify * 1e6))
+
+
+if __name__ == '__main__':
+    main()
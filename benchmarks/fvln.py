@@ -0,0 +1,83 @@
+# coding: utf8
+#
+#        Copyright (C) 2017 Yandex LLC
+#        http://yandex.com
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#
+
+"""
+Упаковка и распаковка FVLN: прежняя реализация через Decimal и struct против целочисленной.
+
+Запуск: python -m benchmarks.fvln
+"""
+
+import argparse
+import decimal
+import struct
+
+from ofd.protocol import FVLN
+from benchmarks.samples import best_of
+
+
+def unpack_decimal(data):
+    """
+    Прежняя реализация FVLN.unpack.
+    """
+    pad = b'\x00' * (9 - len(data))
+    pos, num = struct.unpack('<bQ', bytes(data) + pad)
+    d = decimal.Decimal(10) ** +pos
+    q = decimal.Decimal(10) ** -pos
+    return float((decimal.Decimal(num) / d).quantize(q))
+
+
+def pack_struct(data, maxlen=8):
+    """
+    Прежняя реализация FVLN.pack.
+    """
+    str_data = str(data)
+    point = str_data.index('.')
+    prepared = int(str_data[0:point] + str_data[point + 1:])
+    packed = struct.pack('<bQ', len(str_data) - 1 - point, prepared)
+    if len(packed) > maxlen:
+        trim_part = packed[maxlen: len(packed)]
+        if trim_part != b'\x00' * len(trim_part):
+            raise ValueError('FVLN cant pack {} because is greater than maximum {}'.format(data, maxlen))
+        return packed[:maxlen]
+    return packed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--number', default=100000, type=int, help='количество операций в одном замере')
+    argv = parser.parse_args()
+
+    quantity = FVLN('quantity', 'Количество', maxlen=8)
+    values = [1.0, 0.333, 12.125, 1453.67]
+    packed = [memoryview(quantity.pack(value)) for value in values]
+
+    rows = [
+        ('unpack', lambda: [unpack_decimal(data) for data in packed],
+         lambda: [quantity.unpack(data) for data in packed]),
+        ('pack', lambda: [pack_struct(value) for value in values],
+         lambda: [quantity.pack(value) for value in values]),
+    ]
+    print('{:>8} {:>10} {:>10} {:>8}'.format('', 'old, us', 'new, us', 'speedup'))
+    for title, old, new in rows:
+        assert old() == new()
+        before = best_of(old, argv.number // len(values)) / len(values)
+        after = best_of(new, argv.number // len(values)) / len(values)
+        print('{:>8} {:>10.3f} {:>10.3f} {:>7.2f}x'.format(title, before * 1e6, after * 1e6, before / after))
+
+
+if __name__ == '__main__':
+    main()
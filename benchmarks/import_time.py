@@ -0,0 +1,97 @@
+# coding: utf8
+#
+#        Copyright (C) 2017 Yandex LLC
+#        http://yandex.com
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#
+
+"""
+Время импорта пакета по python -X importtime (нужен Python 3.7+) и время создания DocumentValidator с валидацией
+первого документа по директориям схем и по бандлам - то, что платит каждый короткоживущий процесс.
+
+Запуск: python -m benchmarks.import_time --repeat 10
+"""
+
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+from ofd.bundle import write_bundles
+
+SCHEMA_PATH = os.path.join(os.path.dirname(__file__), '..', 'schemas')
+
+FIRST_VALIDATION = '''
+import time
+from ofd.protocol import DocumentValidator
+from benchmarks.samples import make_receipt_doc
+doc = make_receipt_doc(3)
+started = time.perf_counter()
+DocumentValidator(['1.0', '1.05', '1.1'], {path!r}, backend={backend!r}, check_schema={check_schema!r},
+                  bundle={bundle!r}).validate(doc, '1.0')
+print((time.perf_counter() - started) * 1e6)
+'''
+
+
+def run(args, **kwargs):
+    # байт-код должен быть закэширован, как в боевом окружении
+    env = dict(os.environ)
+    env.pop('PYTHONDONTWRITEBYTECODE', None)
+    return subprocess.run([sys.executable] + args, env=env, check=True, **kwargs)
+
+
+def import_times(module):
+    """
+    Собственное и накопленное время импорта модулей в микросекундах по выводу -X importtime.
+    """
+    output = run(['-X', 'importtime', '-c', 'import ' + module], stderr=subprocess.PIPE).stderr.decode()
+    result = {}
+    for line in output.splitlines()[1:]:  # первая строка - заголовок таблицы
+        self_us, cumulative_us, name = line.split(':', 1)[1].split('|')
+        result[name.strip()] = (int(self_us), int(cumulative_us))
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--repeat', default=10, type=int, help='количество запусков, берётся лучший')
+    parser.add_argument('--modules', default=['ofd', 'ofd.protocol', 'jsonschema'], nargs='+',
+                        help='модули, время импорта которых выводится')
+    argv = parser.parse_args()
+
+    import_times('ofd')  # прогрев: компиляция в __pycache__
+    runs = [import_times('ofd') for _ in range(argv.repeat)]
+    print('import ofd, best of {}:'.format(argv.repeat))
+    for module in argv.modules:
+        self_us = min(times[module][0] for times in runs)
+        cumulative_us = min(times[module][1] for times in runs)
+        print('{:>14}: self {:8.1f} ms, cumulative {:8.1f} ms'.format(module, self_us / 1e3, cumulative_us / 1e3))
+
+    bundle_path = tempfile.mkdtemp()
+    write_bundles(SCHEMA_PATH, bundle_path)
+    print('DocumentValidator for 3 versions + first validation, best of {}:'.format(argv.repeat))
+    for backend in ['jsonschema', 'compiled']:
+        for check_schema in [True, False]:
+            for bundle in [False, True]:
+                code = FIRST_VALIDATION.format(path=bundle_path if bundle else SCHEMA_PATH, backend=backend,
+                                               check_schema=check_schema, bundle=bundle)
+                elapsed = min(float(run(['-c', code], stdout=subprocess.PIPE).stdout) for _ in range(argv.repeat))
+                print('{:>14}: check_schema={!s:5} bundle={!s:5} {:8.1f} ms'.format(backend, check_schema, bundle,
+                                                                                    elapsed / 1e3))
+    shutil.rmtree(bundle_path)
+
+
+if __name__ == '__main__':
+    main()
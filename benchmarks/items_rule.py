@@ -0,0 +1,48 @@
+# coding: utf8
+#
+#        Copyright (C) 2017 Yandex LLC
+#        http://yandex.com
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#
+"""
+Скорость проверки позиций чека ItemsConsistency на NumPy и на чистом Python.
+
+Запуск: python -m benchmarks.items_rule --items 10 1000 10000
+"""
+
+import argparse
+
+from ofd import rules
+from ofd.rules import ItemsConsistency
+from benchmarks.samples import make_receipt, best_of
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--items', default=[10, 1000, 10000], type=int, nargs='+', help='количество позиций в чеке')
+    argv = parser.parse_args()
+
+    checkers = [('python', ItemsConsistency(use_numpy=False))]
+    if rules.numpy is not None:
+        checkers.append(('numpy', ItemsConsistency(use_numpy=True)))
+
+    for items in argv.items:
+        body = make_receipt(items)['receipt']  # в контейнер ФФД тысячи позиций не помещаются
+        for title, check in checkers:
+            elapsed = best_of(lambda: check('receipt', body), max(1, 100000 // items))
+            print('{:>6} items, {:>6}: {:8.1f} us/receipt, {:6.3f} us/item'.format(items, title, elapsed * 1e6,
+                                                                                   elapsed * 1e6 / items))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+# coding: utf8
+#
+#        Copyright (C) 2017 Yandex LLC
+#        http://yandex.com
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#
+
+"""
+Память на документы "в полёте" и время до чтения нескольких реквизитов: unpack_container_message против
+unpack_container_message_lazy.
+
+Запуск: python -m benchmarks.lazy_document --documents 1000 --items 10
+"""
+
+import argparse
+import time
+import tracemalloc
+
+from ofd.lazy import unpack_container_message_lazy
+from ofd.protocol import get_body_field, unpack_container_message
+from benchmarks.samples import make_receipt_raw, FISCAL_SIGN
+
+FIELDS = ('fiscalDriveNumber', 'fiscalDocumentNumber', 'dateTime', 'totalSum')
+
+
+def hold(unpack, messages):
+    """
+    Распаковать все документы, держать их в памяти и прочитать у каждого FIELDS.
+    """
+    docs = [unpack(raw, FISCAL_SIGN)[0] for raw in messages]
+    for doc in docs:
+        for field in FIELDS:
+            get_body_field(doc, field)
+    return docs
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--documents', default=1000, type=int, help='количество документов в памяти')
+    parser.add_argument('--items', default=[1, 10, 100], type=int, nargs='+', help='количество позиций в чеке')
+    argv = parser.parse_args()
+
+    print('{:>6} {:>8} {:>14} {:>14}'.format('items', 'unpack', 'us/document', 'KiB/document'))
+    for count in argv.items:
+        # у каждого документа свой буфер, как у сообщений из сокета
+        messages = [bytes(bytearray(make_receipt_raw(count))) for _ in range(argv.documents)]
+        for title, unpack in [('full', unpack_container_message), ('lazy', unpack_container_message_lazy)]:
+            elapsed = min(timeit_once(unpack, messages) for _ in range(3))
+
+            tracemalloc.start()
+            docs = hold(unpack, messages)
+            size = tracemalloc.get_traced_memory()[0]
+            tracemalloc.stop()
+            del docs
+            print('{:>6} {:>8} {:>14.1f} {:>14.2f}'.format(count, title, elapsed * 1e6 / argv.documents,
+                                                           size / 1024 / argv.documents))
+
+
+def timeit_once(unpack, messages):
+    started = time.perf_counter()
+    hold(unpack, messages)
+    return time.perf_counter() - started
+
+
+if __name__ == '__main__':
+    main()
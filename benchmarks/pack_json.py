@@ -0,0 +1,90 @@
+# coding: utf8
+#
+#        Copyright (C) 2017 Yandex LLC
+#        http://yandex.com
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#
+
+"""
+Сравнение упаковки в один bytearray с прежней упаковкой через конкатенацию bytes.
+
+Запуск: python -m benchmarks.pack_json
+"""
+
+import argparse
+import struct
+import time
+
+from ofd.protocol import pack_json, DOCS_BY_NAME, _select_tag_by_key
+from benchmarks.samples import make_receipt, best_of
+
+
+def pack_json_concat(doc, docs=DOCS_BY_NAME, parent_ty=None):
+    """
+    Прежняя реализация pack_json: каждый вложенный STLV собирается отдельно и копируется в родительский.
+    """
+    wr = b''
+    for name, value in doc.items():
+        ty, cls = _select_tag_by_key(key=name, docs=docs, parent_ty=parent_ty)
+        if isinstance(value, list):
+            list_tags = b''
+            for item in value:
+                if isinstance(item, dict):
+                    item_data = pack_json_concat(item, docs=docs, parent_ty=ty)
+                else:
+                    item_data = cls.pack(item)
+                list_tags += struct.pack('<HH', ty, len(item_data)) + item_data
+            wr += list_tags
+        else:
+            if isinstance(value, dict):
+                data = pack_json_concat(value, docs=docs, parent_ty=ty)
+            else:
+                data = cls.pack(value)
+            wr += struct.pack('<HH', ty, len(data)) + data
+    return wr
+
+
+def make_operator_ack():
+    return {
+        'operatorAck': {
+            'ofdInn': '7704358518',
+            'fiscalDriveNumber': '9999078900005488',
+            'fiscalDocumentNumber': 1,
+            'dateTime': int(time.time()),
+            'messageToFn': {'ofdResponseCode': 0}
+        }
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--items', default=[1, 10, 100, 300], type=int, nargs='+', help='количество позиций в чеке')
+    parser.add_argument('--number', default=200, type=int, help='количество упаковок в одном замере')
+    argv = parser.parse_args()
+
+    samples = [('operatorAck', make_operator_ack())]
+    samples += [('receipt/{}'.format(count), make_receipt(count)) for count in argv.items]
+
+    print('{:>12} {:>8} {:>12} {:>14} {:>8}'.format('document', 'bytes', 'concat, us', 'bytearray, us', 'speedup'))
+    for title, doc in samples:
+        packed = pack_json(doc, docs=DOCS_BY_NAME)
+        assert packed == pack_json_concat(doc)
+
+        before = best_of(lambda: pack_json_concat(doc), argv.number)
+        after = best_of(lambda: pack_json(doc, docs=DOCS_BY_NAME), argv.number)
+        print('{:>12} {:>8} {:>12.1f} {:>14.1f} {:>7.2f}x'.format(title, len(packed), before * 1e6, after * 1e6,
+                                                                  before / after))
+
+
+if __name__ == '__main__':
+    main()
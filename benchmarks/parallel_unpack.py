@@ -0,0 +1,70 @@
+# coding: utf8
+#
+#        Copyright (C) 2017 Yandex LLC
+#        http://yandex.com
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#
+
+"""
+Пропускная способность ParallelUnpacker в зависимости от количества процессов.
+
+Запуск: python -m benchmarks.parallel_unpack --workers 1 2 4 8
+"""
+
+import argparse
+import os
+import time
+
+from ofd.parallel import ParallelUnpacker, get_validator
+from ofd.protocol import unpack_message
+from benchmarks.samples import make_receipt_raw, FISCAL_SIGN
+
+SCHEMA_PATH = os.path.join(os.path.dirname(__file__), '..', 'schemas')
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--workers', default=[1, 2, 4], type=int, nargs='+', help='количество процессов')
+    parser.add_argument('--messages', default=20000, type=int, help='количество сообщений')
+    parser.add_argument('--items', default=3, type=int, help='количество позиций в чеке')
+    parser.add_argument('--chunk-size', default=256, type=int, help='размер пачки')
+    parser.add_argument('--validate', action='store_true', help='валидировать документы по схеме 1.0')
+    argv = parser.parse_args()
+
+    version = '1.0' if argv.validate else None
+    messages = [(make_receipt_raw(argv.items), FISCAL_SIGN, version)] * argv.messages
+    versions = ['1.0'] if argv.validate else None
+
+    validator = get_validator((tuple(versions), (('path', SCHEMA_PATH),))) if versions else None
+    started = time.perf_counter()
+    for message in messages:
+        unpack_message(*message, validator=validator)
+    sequential = time.perf_counter() - started
+    print('{:>10}: {:8.0f} messages/s'.format('sequential', argv.messages / sequential))
+
+    for workers in argv.workers:
+        with ParallelUnpacker(workers=workers, chunk_size=argv.chunk_size, versions=versions,
+                              path=SCHEMA_PATH) as unpacker:
+            list(unpacker.unpack(messages[:workers * argv.chunk_size]))  # прогрев процессов
+
+            started = time.perf_counter()
+            for _ in unpacker.unpack(messages):
+                pass
+            elapsed = time.perf_counter() - started
+
+        print('{:>10}: {:8.0f} messages/s, {:.2f}x'.format('{} workers'.format(workers), argv.messages / elapsed,
+                                                           sequential / elapsed))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,48 @@
+# coding: utf8
+#
+#        Copyright (C) 2017 Yandex LLC
+#        http://yandex.com
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#
+
+"""
+Распаковка всех реквизитов чека и только тех, что нужны маршрутизации и дедупликации.
+
+Запуск: python -m benchmarks.projection --items 1 10 100
+"""
+
+import argparse
+
+from ofd.protocol import unpack_container_message
+from benchmarks.samples import make_receipt_raw, best_of, FISCAL_SIGN
+
+ROUTING_FIELDS = frozenset(['fiscalDriveNumber', 'fiscalDocumentNumber', 'dateTime', 'totalSum'])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--items', default=[1, 10, 100], type=int, nargs='+', help='количество позиций в чеке')
+    parser.add_argument('--number', default=200, type=int, help='количество распаковок в одном замере')
+    argv = parser.parse_args()
+
+    print('{:>6} {:>8} {:>10} {:>12} {:>8}'.format('items', 'bytes', 'full, us', 'routing, us', 'speedup'))
+    for count in argv.items:
+        raw = make_receipt_raw(count)
+        full = best_of(lambda: unpack_container_message(raw, FISCAL_SIGN), argv.number)
+        routing = best_of(lambda: unpack_container_message(raw, FISCAL_SIGN, ROUTING_FIELDS), argv.number)
+        print('{:>6} {:>8} {:>10.1f} {:>12.1f} {:>7.2f}x'.format(count, len(raw), full * 1e6, routing * 1e6,
+                                                                 full / routing))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+# coding: utf8
+#
+#        Copyright (C) 2017 Yandex LLC
+#        http://yandex.com
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#
+
+"""
+Память и время распаковки чеков в пакетной обработке: dict из unpack_container_message против записей со слотами
+из unpack_container_message_record. Время - лучший из --repeat замеров, потому что отдельные замеры шумят.
+
+Запуск: python -m benchmarks.records --documents 10000 --items 1 5 20
+"""
+
+import argparse
+import time
+import tracemalloc
+
+from ofd.protocol import unpack_container_message
+from ofd.records import unpack_container_message_record
+from benchmarks.samples import make_receipt_raw, FISCAL_SIGN
+
+
+VARIANTS = [('dict', unpack_container_message), ('record', unpack_container_message_record)]
+
+
+def measure_time(unpack, messages):
+    started = time.perf_counter()
+    docs = [unpack(raw, FISCAL_SIGN)[0] for raw in messages]
+    elapsed = time.perf_counter() - started
+    del docs
+    return elapsed
+
+
+def measure_size(unpack, messages):
+    unpack(messages[0], FISCAL_SIGN)  # таблицы распаковки заполняются при первом документе, их не считаем
+    tracemalloc.start()
+    docs = [unpack(raw, FISCAL_SIGN)[0] for raw in messages]
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del docs
+    return size
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--documents', default=10000, type=int, help='количество чеков в памяти')
+    parser.add_argument('--items', default=[1, 5, 20], type=int, nargs='+', help='количество позиций в чеке')
+    parser.add_argument('--repeat', default=15, type=int, help='количество замеров, берётся лучший')
+    argv = parser.parse_args()
+
+    print('{:>6} {:>8} {:>14} {:>14}'.format('items', 'unpack', 'us/document', 'KiB/document'))
+    for count in argv.items:
+        messages = [make_receipt_raw(count)] * argv.documents
+        sizes = {title: measure_size(unpack, messages) for title, unpack in VARIANTS}
+        # варианты замеряются по очереди в каждом повторе, чтобы фоновая нагрузка влияла на них одинаково
+        elapsed = {title: float('inf') for title, _ in VARIANTS}
+        for _ in range(argv.repeat):
+            for title, unpack in VARIANTS:
+                elapsed[title] = min(elapsed[title], measure_time(unpack, messages))
+
+        for title, _ in VARIANTS:
+            print('{:>6} {:>8} {:>14.1f} {:>14.2f}'.format(count, title, elapsed[title] * 1e6 / argv.documents,
+                                                           sizes[title] / 1024 / argv.documents))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+# coding: utf8
+#
+#        Copyright (C) 2017 Yandex LLC
+#        http://yandex.com
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#
+
+"""
+Синтетические документы для бенчмарков.
+"""
+
+import timeit
+
+from ofd.protocol import pack_json, unpack_container_message, DOCS_BY_NAME
+
+FISCAL_SIGN = b'\x00' * 8
+
+
+def make_receipt(items_count):
+    """
+    Собрать json-документ кассового чека с указанным количеством позиций.
+    """
+    items = []
+    for i in range(items_count):
+        items.append({
+            'name': 'Тестовый товар {}'.format(i),
+            'barcode': '0000000000000000',
+            'price': 2500 + i,
+            'quantity': 5.0,
+            'sum': (2500 + i) * 5,
+            'nds18': 1640,
+        })
+
+    return {
+        'receipt': {
+            'user': 'РАПКАТ-ЦЕНТР',
+            'userInn': '500100732259',
+            'operator': 'СИС. АДМИНИСТРАТОР',
+            'requestNumber': 3,
+            'dateTime': 1481906640,
+            'shiftNumber': 4,
+            'operationType': 1,
+            'taxationType': 1,
+            'kktRegId': '0000000003038927',
+            'fiscalDriveNumber': '9999078900001366',
+            'fiscalDocumentNumber': 35,
+            'fiscalSign': 1334812543,
+            'items': items,
+            'totalSum': sum(item['sum'] for item in items),
+            'cashTotalSum': sum(item['sum'] for item in items),
+            'ecashTotalSum': 0,
+            'nds18': 1640 * items_count,
+        }
+    }
+
+
+def make_receipt_raw(items_count):
+    """
+    Собрать кассовый чек с указанным количеством позиций в бинарном формате (контейнер без заголовка).
+    """
+    return pack_json(make_receipt(items_count), docs=DOCS_BY_NAME)
+
+
+def make_receipt_doc(items_count):
+    """
+    Распакованный кассовый чек, который проходит валидацию по схеме версии 1.0.
+    """
+    doc, _ = unpack_container_message(make_receipt_raw(items_count), FISCAL_SIGN)
+    doc['receipt']['receiptCode'] = 3
+    return doc
+
+
+def best_of(fn, number, repeat=5):
+    """
+    Лучшее время одного вызова fn в секундах.
+    """
+    return min(timeit.repeat(fn, number=number, repeat=repeat)) / number
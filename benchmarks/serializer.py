@@ -0,0 +1,94 @@
+# coding: utf8
+#
+#        Copyright (C) 2017 Yandex LLC
+#        http://yandex.com
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#
+
+"""
+Документ из контейнера в файл с JSON: unpack_container_message и json.dumps (dumps) или json.dump (dump) против
+dump_container_message (direct). Запись идёт в os.devnull, чтобы память не занимал сам результат. Память - пик
+tracemalloc на один документ. Варианты замеряются по очереди в каждом повторе, в таблицу попадает лучший замер
+каждого.
+
+Запуск: python -m benchmarks.serializer --items 1 10 100
+"""
+
+import argparse
+import functools
+import json
+import os
+import timeit
+import tracemalloc
+
+from ofd.protocol import unpack_container_message
+from ofd.serializer import dump_container_message, dumps_container_message
+from benchmarks.samples import make_receipt_raw, FISCAL_SIGN
+
+
+def via_dumps(raw, fp):
+    fp.write(json.dumps(unpack_container_message(raw, FISCAL_SIGN)[0]))
+
+
+def via_dump(raw, fp):
+    json.dump(unpack_container_message(raw, FISCAL_SIGN)[0], fp)
+
+
+def direct(raw, fp):
+    dump_container_message(raw, FISCAL_SIGN, fp)
+
+
+def peak_memory(fn):
+    fn()
+    tracemalloc.start()
+    fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak
+
+
+def compare(fns, number, repeat):
+    """
+    Лучшее время одного вызова для каждой функции, замеры чередуются.
+    """
+    best = [float('inf')] * len(fns)
+    for _ in range(repeat):
+        for i, fn in enumerate(fns):
+            best[i] = min(best[i], timeit.timeit(fn, number=number) / number)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--items', default=[1, 10, 100], type=int, nargs='+', help='количество позиций в чеке')
+    parser.add_argument('--number', default=200, type=int, help='количество вызовов в одном замере')
+    parser.add_argument('--repeat', default=15, type=int, help='количество замеров')
+    argv = parser.parse_args()
+
+    names = ('dumps', 'dump', 'direct')
+    print('{:>6}'.format('items') + ''.join('{:>12}'.format(name + ', us') for name in names) +
+          ''.join('{:>13}'.format(name + ', KiB') for name in names))
+    with open(os.devnull, 'w') as fp:
+        for count in argv.items:
+            raw = make_receipt_raw(count)
+            assert json.dumps(unpack_container_message(raw, FISCAL_SIGN)[0]) == \
+                dumps_container_message(raw, FISCAL_SIGN)
+            fns = [functools.partial(fn, raw, fp) for fn in (via_dumps, via_dump, direct)]
+            peaks = [peak_memory(fn) / 1024 for fn in fns]
+            times = compare(fns, max(argv.number // count, 5), argv.repeat)
+            print('{:>6}'.format(count) + ''.join('{:>12.1f}'.format(t * 1e6) for t in times) +
+                  ''.join('{:>13.1f}'.format(peak) for peak in peaks))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,148 @@
+# coding: utf8
+#
+#        Copyright (C) 2017 Yandex LLC
+#        http://yandex.com
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#
+
+"""
+Нагрузочный тест ofd.server.Server на localhost: множество касс одновременно держат keep-alive соединения и
+отправляют документы один за другим, дожидаясь подтверждения оператора на каждый.
+
+Запуск: python -m benchmarks.server_load --registers 1000 --messages 20
+
+Смешанная нагрузка, где часть касс присылает большие чеки, а распаковка вынесена в пул процессов:
+python -m benchmarks.server_load --large-registers 20 --executor process
+
+Для тысяч соединений может понадобиться поднять лимит открытых файлов: ulimit -n 65536.
+"""
+
+import argparse
+import asyncio
+import concurrent.futures
+import os
+import time
+
+from ofd.protocol import FrameHeader, SessionHeader
+from ofd.server import Server
+from ofd.stream import SessionStreamParser
+from benchmarks.samples import make_receipt_raw
+
+SCHEMA_PATH = os.path.join(os.path.dirname(__file__), '..', 'schemas')
+
+
+def make_message(body, number, fs_id):
+    header = FrameHeader(length=FrameHeader.STRUCT.size + len(body), crc=0, doctype=3, extra1=b'\x10\t',
+                         devnum=b'\x99\x99\x07\x89\x00\x00T\x88', docnum=number.to_bytes(3, 'big'),
+                         extra2=b'\x00' * 12)
+    container = header.pack() + body
+    session = SessionHeader(pva=256, fs_id=fs_id, length=len(container), flags=SessionHeader.SESSION_FLAGS, crc=0)
+    return session.pack() + container
+
+
+async def register(port, index, bodies, latencies):
+    """
+    Касса: открывает одно соединение и отправляет документы по очереди.
+    """
+    fs_id = '{:016d}'.format(index).encode('ascii')
+    rd, wr = await asyncio.open_connection('127.0.0.1', port)
+    parser = SessionStreamParser()
+    loop = asyncio.get_running_loop()
+    try:
+        for number, body in enumerate(bodies, 1):
+            started = loop.time()
+            wr.write(make_message(body, number, fs_id))
+            await wr.drain()
+            responses = []
+            while not responses:
+                chunk = await rd.read(4096)
+                if not chunk:
+                    raise ConnectionError('connection closed by server')
+                responses = parser.feed(chunk)
+            latencies.append(loop.time() - started)
+    finally:
+        wr.close()
+
+
+def percentile(values, p):
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+def report(title, latencies):
+    latencies.sort()
+    if latencies:
+        print('{} ack latency, ms: p50 {:.1f}, p90 {:.1f}, p99 {:.1f}, max {:.1f}'.format(
+            title, *(percentile(latencies, p) * 1e3 for p in (50, 90, 99, 100))))
+
+
+async def run(argv):
+    async def handler(doc, session, header):
+        pass
+
+    executor = None
+    if argv.executor == 'thread':
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=argv.workers)
+    elif argv.executor == 'process':
+        executor = concurrent.futures.ProcessPoolExecutor(max_workers=argv.workers)
+
+    server = Server(ofd_inn='7704358518', handler=handler, max_concurrency=argv.max_concurrency,
+                    versions=['1.0'] if argv.validate else None, validator_options={'path': SCHEMA_PATH},
+                    executor=executor, inline_threshold=argv.inline_threshold)
+    await server.start(host='127.0.0.1', port=0, backlog=argv.registers + argv.large_registers)
+    port = server._server.sockets[0].getsockname()[1]
+
+    small = [make_receipt_raw(argv.items)] * argv.messages
+    large = [make_receipt_raw(argv.large_items)] * argv.messages
+    latencies, large_latencies = [], []
+    registers = [register(port, i, small, latencies) for i in range(argv.registers)]
+    registers += [register(port, argv.registers + i, large, large_latencies) for i in range(argv.large_registers)]
+
+    started = time.perf_counter()
+    results = await asyncio.gather(*registers, return_exceptions=True)
+    elapsed = time.perf_counter() - started
+
+    server.close()
+    await server.wait_closed()
+    if executor is not None:
+        executor.shutdown()
+
+    errors = [r for r in results if isinstance(r, Exception)]
+    print('{} + {} registers x {} documents: {:.2f} s, {:.0f} documents/s, {} failed registers'.format(
+        argv.registers, argv.large_registers, argv.messages, elapsed,
+        (len(latencies) + len(large_latencies)) / elapsed, len(errors)))
+    report('small', latencies)
+    report('large', large_latencies)
+    if errors:
+        print('first error:', repr(errors[0]))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--registers', default=500, type=int, help='количество одновременно подключенных касс')
+    parser.add_argument('--messages', default=20, type=int, help='количество документов от каждой кассы')
+    parser.add_argument('--items', default=3, type=int, help='количество позиций в чеке')
+    parser.add_argument('--max-concurrency', default=1024, type=int, help='ограничение Server.max_concurrency')
+    parser.add_argument('--large-registers', default=0, type=int, help='количество касс, присылающих большие чеки')
+    parser.add_argument('--large-items', default=300, type=int, help='количество позиций в большом чеке')
+    parser.add_argument('--executor', default='none', choices=['none', 'thread', 'process'],
+                        help='где распаковывать большие документы')
+    parser.add_argument('--workers', default=None, type=int, help='количество потоков или процессов пула')
+    parser.add_argument('--inline-threshold', default=2048, type=int, help='Server.inline_threshold')
+    parser.add_argument('--validate', action='store_true', help='валидировать документы по схеме 1.0')
+    argv = parser.parse_args()
+
+    asyncio.run(run(argv))
+
+
+if __name__ == '__main__':
+    main()
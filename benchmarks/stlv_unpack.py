@@ -0,0 +1,72 @@
+# coding: utf8
+#
+#        Copyright (C) 2017 Yandex LLC
+#        http://yandex.com
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#
+
+"""
+Сравнение распаковки STLV через memoryview со старой распаковкой через срезы bytes.
+
+Запуск: python -m benchmarks.stlv_unpack
+"""
+
+import argparse
+import struct
+
+from ofd.protocol import DOCUMENTS, DocCodes, STLV
+from benchmarks.samples import make_receipt_raw, best_of
+
+
+def unpack_sliced(stlv, data):
+    """
+    Прежняя реализация STLV.unpack: после каждого тега остаток данных копируется заново.
+    """
+    result = {}
+    while len(data) > 0:
+        ty, length = struct.unpack('<HH', data[:4])
+        doc = stlv._select_tag_by_parent(ty)
+        if isinstance(doc, STLV):
+            value = unpack_sliced(doc, data[4:4 + length])
+        else:
+            value = doc.unpack(data[4:4 + length])
+
+        if getattr(doc, 'cardinality', None) in {'*', '+'}:
+            result.setdefault(doc.name, []).append(value)
+        else:
+            result[doc.name] = value
+        data = data[4 + length:]
+
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--items', default=[1, 10, 100, 300], type=int, nargs='+', help='количество позиций в чеке')
+    parser.add_argument('--number', default=200, type=int, help='количество распаковок в одном замере')
+    argv = parser.parse_args()
+
+    receipt = DOCUMENTS[DocCodes.RECEIPT]
+    print('{:>6} {:>8} {:>14} {:>14} {:>8}'.format('items', 'bytes', 'sliced, us', 'memoryview, us', 'speedup'))
+    for count in argv.items:
+        body = make_receipt_raw(count)[4:]
+        assert unpack_sliced(receipt, body) == receipt.unpack(body)
+
+        before = best_of(lambda: unpack_sliced(receipt, body), argv.number)
+        after = best_of(lambda: receipt.unpack(body), argv.number)
+        print('{:>6} {:>8} {:>14.1f} {:>14.1f} {:>7.2f}x'.format(count, len(body), before * 1e6, after * 1e6,
+                                                                 before / after))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+# coding: utf8
+#
+#        Copyright (C) 2017 Yandex LLC
+#        http://yandex.com
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#
+
+"""
+Кодирование строк String и ByteArray: прежняя реализация через struct и кодек cp866 против таблиц charmap.
+
+Запуск: python -m benchmarks.string_codecs
+"""
+
+import argparse
+import struct
+
+from ofd.protocol import DOCUMENTS, ByteArray, DocCodes, String
+from benchmarks.samples import make_receipt_raw, best_of
+
+
+def string_unpack_struct(data):
+    return struct.unpack('{}s'.format(len(data)), data)[0].decode('cp866')
+
+
+def string_pack_struct(value):
+    return struct.pack('{}s'.format(len(value)), value.encode('cp866'))
+
+
+def byte_array_unpack_struct(data):
+    return str(struct.unpack('{}s'.format(len(data)), data)[0])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--number', default=100000, type=int, help='количество операций в одном замере')
+    argv = parser.parse_args()
+
+    name = String('name', 'наименование предмета расчета', 128)
+    fiscal_drive = String('fiscalDriveNumber', 'заводской номер фискального накопителя', 16)
+    fiscal_sign = ByteArray('fiscalSign', 'фискальный признак', 18)
+    text = 'Тестовый товар 12'
+    cyrillic = memoryview(String.pack(text))
+    ascii_ = memoryview(String.pack('9999078900001366'))
+    sign = memoryview(b'\x01\x02\x03\x04\x05\x06')
+
+    rows = [
+        ('unpack cyrillic', lambda: string_unpack_struct(cyrillic), lambda: name.unpack(cyrillic)),
+        ('unpack ascii', lambda: string_unpack_struct(ascii_), lambda: fiscal_drive.unpack(ascii_)),
+        ('pack', lambda: string_pack_struct(text), lambda: String.pack(text)),
+        ('byte array', lambda: byte_array_unpack_struct(sign), lambda: fiscal_sign.unpack(sign)),
+    ]
+    print('{:>16} {:>10} {:>10} {:>8}'.format('', 'old, us', 'new, us', 'speedup'))
+    for title, old, new in rows:
+        assert old() == new()
+        before = best_of(old, argv.number)
+        after = best_of(new, argv.number)
+        print('{:>16} {:>10.3f} {:>10.3f} {:>7.2f}x'.format(title, before * 1e6, after * 1e6, before / after))
+
+    receipt = DOCUMENTS[DocCodes.RECEIPT]
+    body = make_receipt_raw(100)[4:]
+    elapsed = best_of(lambda: receipt.unpack(body), 100)
+    print('receipt with 100 items: {:.1f} us'.format(elapsed * 1e6))
+
+
+if __name__ == '__main__':
+    main()
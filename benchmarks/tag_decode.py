@@ -0,0 +1,147 @@
+# coding: utf8
+#
+#        Copyright (C) 2017 Yandex LLC
+#        http://yandex.com
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#
+
+"""
+Стоимость распаковки одного тега и размер описания тега в памяти: прежние описания тегов с атрибутами в __dict__
+против текущих со слотами.
+
+Прежняя и текущая распаковка замеряются по очереди в каждом повторе, в таблицу попадает лучший замер каждой стороны.
+В столбце code отмечено, отличается ли код распаковки: у тегов с same обе стороны вызывают одну и ту же функцию
+unpack, и разница между ними - только доступ к атрибутам в слотах вместо __dict__ и шум замера.
+
+Запуск: python -m benchmarks.tag_decode
+"""
+
+import argparse
+import struct
+import sys
+import timeit
+
+from ofd.protocol import DOCUMENTS, FVLN, STLV, VLN, Byte, ByteArray, String, U32, UnixTime
+
+SAMPLES = [
+    (Byte('operationType', 'Признак расчета'), b'\x01'),
+    (U32('fiscalDocumentNumber', 'номер фискального документа'), b'\x23\x00\x00\x00'),
+    (UnixTime('dateTime', 'дата, время'), b'\xe0\xe9\x53\x58'),
+    (VLN('totalSum', 'ИТОГ'), b'\x8b\x92'),
+    (FVLN('quantity', 'Количество', maxlen=8), b'\x03\x5d\x2f\x00\x00\x00\x00\x00'),
+    (String('kktRegId', 'Номер ККТ', maxlen=20, strip=True), b'0000000003038927    '),
+    (ByteArray('fiscalSign', 'фискальный признак', 18), b'\x01\x02\x03\x04\x05\x06'),
+    (STLV('items', 'наименование товара (реквизиты)', 328, '*'), b''),
+]
+
+
+class LegacyTag(object):
+    """
+    Прежнее описание тега: те же атрибуты, но в __dict__ экземпляра.
+    """
+    def __init__(self, tag):
+        for name, value in tag.__getstate__().items():
+            setattr(self, name, value)
+
+
+class LegacyU32(LegacyTag):
+    @staticmethod
+    def unpack(data):
+        if len(data) == 0:
+            return 0
+        return struct.unpack('<I', data)[0]
+
+
+class LegacyUnixTime(LegacyTag):
+    @staticmethod
+    def unpack(data):
+        return struct.unpack('<I', data)[0]
+
+
+class LegacyVLN(LegacyTag):
+    def unpack(self, data):
+        if len(data) > self.maxlen:
+            raise ValueError('VLN for "{}" actual size {} is greater than maximum {}'
+                             .format(self.name, len(data), self.maxlen))
+        return struct.unpack('<Q', bytes(data) + b'\x00' * (8 - len(data)))[0]
+
+
+# у остальных видов тегов распаковка не менялась, отличается только хранение атрибутов
+LEGACY_CLASSES = {
+    Byte: type('LegacyByte', (LegacyTag,), {'STRUCT': Byte.STRUCT, 'unpack': Byte.unpack}),
+    U32: LegacyU32,
+    UnixTime: LegacyUnixTime,
+    VLN: LegacyVLN,
+    FVLN: type('LegacyFVLN', (LegacyTag,), {'unpack': FVLN.unpack}),
+    String: type('LegacyString', (LegacyTag,), {'unpack': String.unpack}),
+    ByteArray: type('LegacyByteArray', (LegacyTag,), {'unpack': ByteArray.unpack}),
+    STLV: type('LegacySTLV', (LegacyTag,), {'unpack': STLV.unpack,
+                                            '_select_tag_by_parent': STLV._select_tag_by_parent}),
+}
+
+
+def legacy(tag):
+    return LEGACY_CLASSES[type(tag)](tag)
+
+
+def same_unpack(old, tag):
+    """
+    Вызывают ли прежнее и текущее описания одну и ту же функцию распаковки.
+    """
+    return type(old).unpack is type(tag).unpack
+
+
+def compare(before_fn, after_fn, number, repeat):
+    """
+    Лучшее время одного вызова before_fn и after_fn в секундах. Замеры чередуются, чтобы фоновая нагрузка влияла на
+    обе стороны одинаково.
+    """
+    before = after = float('inf')
+    for _ in range(repeat):
+        before = min(before, timeit.timeit(before_fn, number=number))
+        after = min(after, timeit.timeit(after_fn, number=number))
+    return before / number, after / number
+
+
+def instance_size(obj):
+    size = sys.getsizeof(obj)
+    if hasattr(obj, '__dict__'):
+        size += sys.getsizeof(obj.__dict__)
+    return size
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--number', default=10000, type=int, help='количество распаковок в одном замере')
+    parser.add_argument('--repeat', default=100, type=int, help='количество замеров, берётся лучший')
+    argv = parser.parse_args()
+
+    header = ('tag', 'code', 'before, ns', 'after, ns', 'before, bytes', 'after, bytes')
+    print('{:>10} {:>8} {:>12} {:>12} {:>13} {:>13}'.format(*header))
+    for tag, data in SAMPLES:
+        view = memoryview(data)
+        old = legacy(tag)
+        assert old.unpack(view) == tag.unpack(view)
+        before, after = compare(lambda: old.unpack(view), lambda: tag.unpack(view), argv.number, argv.repeat)
+        print('{:>10} {:>8} {:>12.0f} {:>12.0f} {:>13} {:>13}'.format(
+            type(tag).__name__, 'same' if same_unpack(old, tag) else 'changed', before * 1e9, after * 1e9,
+            instance_size(old), instance_size(tag)))
+
+    tags = [t for value in DOCUMENTS.values() for t in (value if isinstance(value, list) else [value])]
+    before = sum(instance_size(legacy(t)) for t in tags)
+    after = sum(instance_size(t) for t in tags)
+    print('{} descriptors in DOCUMENTS: {} -> {} bytes'.format(len(tags), before, after))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+# coding: utf8
+#
+#        Copyright (C) 2017 Yandex LLC
+#        http://yandex.com
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#
+
+"""
+Распаковка и валидация потока с повторно присланными документами с UnpackCache и без него.
+
+Запуск: python -m benchmarks.unpack_cache --resends 0 1 4
+"""
+
+import argparse
+import os
+import random
+
+from ofd.cache import UnpackCache
+from ofd.protocol import DOCS_BY_NAME, DocumentValidator, pack_json, unpack_message
+from benchmarks.samples import make_receipt, best_of, FISCAL_SIGN
+
+SCHEMA_PATH = os.path.join(os.path.dirname(__file__), '..', 'schemas')
+
+
+def make_stream(documents, resends, items):
+    """
+    Поток, в котором каждый документ приходит 1 + resends раз, повторы перемешаны с другими документами.
+    """
+    stream = []
+    for number in range(documents):
+        doc = make_receipt(items)
+        doc['receipt']['fiscalDocumentNumber'] = number
+        stream += [pack_json(doc, docs=DOCS_BY_NAME)] * (1 + resends)
+    random.Random(0).shuffle(stream)
+    return stream
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--documents', default=1000, type=int, help='количество разных документов')
+    parser.add_argument('--resends', default=[0, 1, 4], type=int, nargs='+', help='количество повторов документа')
+    parser.add_argument('--items', default=3, type=int, help='количество позиций в чеке')
+    argv = parser.parse_args()
+
+    validator = DocumentValidator(['1.0'], SCHEMA_PATH)
+    for resends in argv.resends:
+        stream = make_stream(argv.documents, resends, argv.items)
+
+        def uncached():
+            for raw in stream:
+                unpack_message(raw, FISCAL_SIGN, '1.0', validator)
+
+        def cached():
+            cache = UnpackCache(validator)
+            for raw in stream:
+                cache.unpack(raw, FISCAL_SIGN, '1.0')
+
+        baseline = best_of(uncached, 1, repeat=3)
+        elapsed = best_of(cached, 1, repeat=3)
+        print('{} resends: {:8.1f} -> {:8.1f} us/message, {:.2f}x'.format(
+            resends, baseline / len(stream) * 1e6, elapsed / len(stream) * 1e6, baseline / elapsed))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+# coding: utf8
+#
+#        Copyright (C) 2017 Yandex LLC
+#        http://yandex.com
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#
+
+"""
+Сравнение скорости валидации кассовых чеков: Draft4Validator по всему document.schema.json (выбор типа документа
+через oneOf) и DocumentValidator с Draft4Validator и со скомпилированной схемой для тела документа.
+
+Запуск: python -m benchmarks.validate --items 1 10 100
+"""
+
+import argparse
+import json
+import os
+
+from jsonschema import Draft4Validator, RefResolver
+
+from ofd.protocol import DocumentValidator
+from benchmarks.samples import make_receipt_doc, best_of
+
+SCHEMA_PATH = os.path.join(os.path.dirname(__file__), '..', 'schemas')
+
+
+def document_schema_validator(version):
+    full_path = os.path.abspath(os.path.join(SCHEMA_PATH, version, 'document.schema.json'))
+    with open(full_path, encoding='utf-8') as fh:
+        schema = json.load(fh)
+    return Draft4Validator(schema, resolver=RefResolver('file://' + full_path, schema))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--items', default=[1, 10, 100], type=int, nargs='+', help='количество позиций в чеке')
+    parser.add_argument('--number', default=200, type=int, help='количество проверок в одном замере')
+    argv = parser.parse_args()
+
+    document_schema = document_schema_validator('1.0')
+    validators = [('oneOf', lambda doc: document_schema.validate(doc))]
+    for backend in DocumentValidator.BACKENDS:
+        validator = DocumentValidator(['1.0'], SCHEMA_PATH, backend=backend)
+        validators.append((backend, lambda doc, validator=validator: validator.validate(doc, '1.0')))
+
+    for items in argv.items:
+        doc = make_receipt_doc(items)
+        timings = [(backend, best_of(lambda: validate(doc), argv.number)) for backend, validate in validators]
+        baseline = timings[0][1]
+        for backend, elapsed in timings:
+            print('{:>4} items, {:>10}: {:8.1f} us/document, {:.2f}x'.format(items, backend, elapsed * 1e6,
+                                                                             baseline / elapsed))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,57 @@
+# coding: utf8
+#
+#        Copyright (C) 2017 Yandex LLC
+#        http://yandex.com
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#
+"""
+Стоимость логической проверки документа (DocumentValidator._validate_logic) на один документ.
+
+Запуск: python -m benchmarks.validate_logic
+"""
+
+import datetime
+import os
+
+from ofd.protocol import DocumentValidator
+from benchmarks.samples import make_receipt_doc, best_of
+
+SCHEMA_PATH = os.path.join(os.path.dirname(__file__), '..', 'schemas')
+
+
+def validate_logic_legacy(validator, doc):
+    """
+    Прежняя реализация: границы дат считаются через datetime для каждого документа.
+    """
+    doc_name = next(iter(doc))
+    doc_timestamp = doc[doc_name].get('dateTime')
+    if validator.min_date and validator.min_date.timestamp() > doc_timestamp:
+        raise ValueError(doc_timestamp)
+
+    future = datetime.datetime.utcnow() + datetime.timedelta(hours=validator.future_hours)
+    if doc_timestamp > future.timestamp():
+        raise ValueError(doc_timestamp)
+
+
+def main():
+    validator = DocumentValidator(['1.0'], SCHEMA_PATH)
+    doc = make_receipt_doc(3)
+
+    legacy = best_of(lambda: validate_logic_legacy(validator, doc), 100000)
+    current = best_of(lambda: validator._validate_logic(doc), 100000)
+    print('legacy: {:6.2f} us/document'.format(legacy * 1e6))
+    print('cached: {:6.2f} us/document, {:.1f}x'.format(current * 1e6, legacy / current))
+
+
+if __name__ == '__main__':
+    main()
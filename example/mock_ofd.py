@@ -17,10 +17,11 @@
 
 import asyncio
 import json
-import time
 import argparse
-from ofd.protocol import SessionHeader, FrameHeader, unpack_container_message, pack_json, DOCS_BY_NAME, DocCodes, \
-    String
+from ofd.protocol import SessionHeader, FrameHeader, unpack_container_message
+from ofd.server import create_response
+
+OFD_INN = '7704358518'  # ИНН Яндекс.ОФД
 
 
 async def unpack_incoming_message(rd):
@@ -37,45 +38,6 @@ async def unpack_incoming_message(rd):
     return unpack_container_message(message_raw, b'0')[0], session, header
 
 
-def create_response(doc, in_session, in_header):
-    """
-    Запаковать в протокол "подтверждение оператора" от ОФД к кассе
-    :param doc: полученный документ
-    :param in_header: заголовок контейнера входящего сообщения
-    :param in_session: заголовок сессии входящего сообщения
-    :return: 
-    """
-    doc_body = doc[next(iter(doc))]  # получаем тело документа
-    message = {
-        'operatorAck': {
-            'ofdInn': '7704358518',  # ИНН Яндекс.ОФД
-            'fiscalDriveNumber': doc_body.get('fiscalDriveNumber'),
-            'fiscalDocumentNumber': doc_body.get('fiscalDocumentNumber'),
-            'dateTime': int(time.time()),
-            'messageToFn': {'ofdResponseCode': 0}  # код ответа 0 при успешном получении документа
-            # Теги ФПО и ФПП не указаны, т.к. должны быть добавлены реальным шифровальным комплексом
-        }
-    }
-    message_raw = pack_json(message, docs=DOCS_BY_NAME)
-
-    # в реальных ОФД FrameHeader формируется автоматически шифровальной машиной
-    out_header = FrameHeader(length=FrameHeader.STRUCT.size + len(message_raw),
-                             crc=0,
-                             doctype=DocCodes.OPERATOR_ACK,
-                             devnum=in_header.devnum,
-                             docnum=String.pack(str(doc_body.get('fiscalDocumentNumber'))),
-                             extra1=in_header.extra1,
-                             extra2=String.pack('0'.rjust(12)))
-
-    out_header.recalculate_crc(message_raw)
-    container_raw = out_header.pack() + message_raw
-
-    out_session = SessionHeader(pva=in_session.pva, fs_id=in_session.fs_id, length=len(container_raw), crc=0,
-                                flags=0b0000000000010100)
-
-    return out_session.pack() + container_raw
-
-
 async def handle_connection(rd, wr):
     """
     Пример использования протокола для эмуляции работы ОФД. Сервер принимает входящее сообщение и распаковывает его,
@@ -88,7 +50,7 @@ async def handle_connection(rd, wr):
     try:
         doc, session, header = await unpack_incoming_message(rd)
         print(json.dumps(doc, ensure_ascii=False, indent=4))
-        response = create_response(doc, in_session=session, in_header=header)
+        response = create_response(session, header, OFD_INN)
         print('raw response', response)
         wr.write(response)
     finally:
@@ -16,13 +16,13 @@
 #
 
 from .protocol import Byte, DOCUMENTS, FrameHeader, FVLN, SessionHeader, String, STLV, U32, UnixTime, VLN, SIGNATURE, \
-    pack_json
+    pack_json, unpack_container_message, unpack_container_messages
 from .version import __version__
 
 __all__ = [
     'Byte',
     'FrameHeader',
     'FVLN', 'SessionHeader', 'DOCUMENTS', 'String', 'STLV', 'U32', 'UnixTime', 'VLN',
-    'SIGNATURE', 'pack_json', 'unpack_container_message',
+    'SIGNATURE', 'pack_json', 'unpack_container_message', 'unpack_container_messages',
     '__version__'
 ]
@@ -0,0 +1,120 @@
+# coding: utf8
+#
+#        Copyright (C) 2017 Yandex LLC
+#        http://yandex.com
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#
+
+"""
+Сборка схем версии протокола в один файл (бандл) для DocumentValidator(..., bundle=True).
+
+Запуск: python -m ofd.bundle schemas --output build
+"""
+
+import argparse
+import json
+import os
+from urllib.parse import quote, urldefrag
+
+from .schema import BUNDLE_SUFFIX, ROOT_SCHEMA
+
+
+def _pointer_part(name):
+    return quote(name.replace('~', '~0').replace('/', '~1'), safe='~')
+
+
+def build_bundle(path, root=ROOT_SCHEMA):
+    """
+    Собрать все схемы версии в одну. Корнем остаётся root, остальные файлы, на которые есть ссылки, кладутся в
+    ключ files, а ссылки на другие файлы переписываются в ссылки внутри этой схемы:
+    'dictionary.schema.json#/definitions/sum' -> '#/files/dictionary.schema.json/definitions/sum'.
+    Пути и сообщения ошибок валидации при этом не меняются, а при валидации не нужно читать другие файлы.
+    :param path: директория со схемами версии, например schemas/1.05.
+    :param root: корневой файл схемы.
+    :return: схема-бандл.
+    """
+    files = {}
+    pending = [root]
+    while pending:
+        filename = pending.pop()
+        if filename in files:
+            continue
+        with open(os.path.join(path, filename), encoding='utf-8') as fh:
+            files[filename] = json.loads(fh.read())
+
+        for node in _iter_nodes(files[filename]):
+            ref = node.get('$ref')
+            if not isinstance(ref, str):
+                continue
+            url, fragment = urldefrag(ref)
+            target = os.path.normpath(os.path.join(os.path.dirname(filename), url)) if url else filename
+            pending.append(target)
+            if target == root:
+                node['$ref'] = '#' + fragment
+            else:
+                node['$ref'] = '#/files/' + _pointer_part(target) + fragment
+
+    bundle = files.pop(root)
+    if 'files' in bundle:
+        raise ValueError('Root schema {} already contains "files" key'.format(root))
+    bundle['files'] = files
+    return bundle
+
+
+def _iter_nodes(schema):
+    """Все объекты внутри схемы"""
+    stack = [schema]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, dict):
+            yield node
+            stack.extend(node.values())
+        elif isinstance(node, list):
+            stack.extend(node)
+
+
+def write_bundles(path, output=None, versions=None):
+    """
+    Собрать бандлы для версий протокола.
+    :param path: директория, которая содержит директории со схемами версий.
+    :param output: директория для <version>.bundle.json, по умолчанию - path.
+    :param versions: версии, по умолчанию - все директории в path, в которых есть document.schema.json.
+    :return: list путей до собранных файлов.
+    """
+    output = output or path
+    if versions is None:
+        versions = sorted(name for name in os.listdir(path) if os.path.isfile(os.path.join(path, name, ROOT_SCHEMA)))
+
+    result = []
+    for version in versions:
+        bundle = build_bundle(os.path.join(path, version))
+        bundle_path = os.path.join(output, version + BUNDLE_SUFFIX)
+        with open(bundle_path, 'w', encoding='utf-8') as fh:
+            json.dump(bundle, fh, ensure_ascii=False, separators=(',', ':'))
+        result.append(bundle_path)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Собрать схемы каждой версии протокола в один файл')
+    parser.add_argument('path', help='директория с директориями схем версий, например schemas')
+    parser.add_argument('--output', help='директория для <version>.bundle.json, по умолчанию - path')
+    parser.add_argument('--versions', nargs='+', help='версии протокола, по умолчанию - все')
+    argv = parser.parse_args()
+
+    for bundle_path in write_bundles(argv.path, argv.output, argv.versions):
+        print(bundle_path)
+
+
+if __name__ == '__main__':
+    main()
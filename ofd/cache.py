@@ -0,0 +1,95 @@
+# coding: utf8
+#
+#        Copyright (C) 2017 Yandex LLC
+#        http://yandex.com
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#
+
+"""
+Кэш результатов распаковки и валидации для повторно присланных документов.
+
+Касса, потерявшая связь, отправляет один и тот же документ много раз подряд. Контейнер при этом совпадает байт в
+байт, поэтому результат распаковки и валидации можно взять из кэша по байтам контейнера и фискальному признаку.
+"""
+
+import collections
+import time
+
+from .protocol import unpack_message
+
+
+class UnpackCache(object):
+    def __init__(self, validator=None, maxsize=10000, ttl=600.0, clock=time.monotonic):
+        """
+        LRU-кэш с ограниченным временем жизни записей перед распаковкой и валидацией сообщений.
+        Документ из кэша - тот же объект, что был возвращён при первой распаковке, поэтому изменять его нельзя.
+        Ошибки распаковки и валидации тоже кэшируются. Проверка даты документа зависит от текущего времени, поэтому
+        результат валидации может устареть не раньше, чем через ttl.
+        :param validator: DocumentValidator или NullValidator. Если None, документы не валидируются.
+        :param maxsize: максимальное количество записей, при переполнении вытесняются давно не использованные.
+        :param ttl: время жизни записи в секундах.
+        :param clock: источник монотонного времени в секундах.
+        """
+        self._validator = validator
+        self._maxsize = maxsize
+        self._ttl = ttl
+        self._clock = clock
+        self._entries = collections.OrderedDict()  # ключ -> (время устаревания, результат)
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(container_message_raw, fiscal_sign, version=None):
+        """
+        Ключ кэша: байты контейнера, фискальный признак и версия, по которой выполнялась валидация.
+        Криптостойкий хэш здесь не нужен: dict сам хэширует bytes (siphash, быстрее sha1) и при совпадении хэшей
+        сравнивает байты, поэтому коллизия не вернёт чужой документ. Ключ занимает столько же памяти, сколько
+        контейнер, - меньше, чем rawData того же документа в записи.
+        """
+        return bytes(container_message_raw), bytes(fiscal_sign), version
+
+    def unpack(self, container_message_raw, fiscal_sign, version=None):
+        """
+        Распаковать и провалидировать сообщение или взять результат из кэша.
+        :param container_message_raw: контейнер сообщения в бинарном виде.
+        :param fiscal_sign: фискальный признак документа в бинарном виде.
+        :param version: версия протокола для валидации. Если None, версия определяется по документу.
+        :return: тройка (container_message, stlv_doc, error), как у ofd.protocol.unpack_message.
+        """
+        key = self.make_key(container_message_raw, fiscal_sign, version)
+        now = self._clock()
+
+        entry = self._entries.get(key)
+        if entry is not None:
+            expires, result = entry
+            if expires > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return result
+            del self._entries[key]
+
+        self.misses += 1
+        result = unpack_message(container_message_raw, fiscal_sign, version, self._validator)
+        self._entries[key] = (now + self._ttl, result)
+        if len(self._entries) > self._maxsize:
+            self._entries.popitem(last=False)
+        return result
+
+    def clear(self):
+        """
+        Очистить кэш. Счётчики попаданий и промахов не сбрасываются.
+        """
+        self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
@@ -0,0 +1,283 @@
+# coding: utf8
+#
+#        Copyright (C) 2017 Yandex LLC
+#        http://yandex.com
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#
+
+"""
+Выгрузка документов в столбцы для аналитики.
+
+Контейнеры разбираются сразу в буферы столбцов, без промежуточных dict: числовые реквизиты складываются в
+array.array, строковые - в list. Получается две таблицы: заголовки документов (одна строка на документ) и позиции
+чеков (одна строка на позицию, столбец document - номер строки документа в первой таблице). Таблицы отдаются как
+структурированные массивы NumPy или как pyarrow.Table, если эти пакеты установлены.
+"""
+
+import array
+
+from .protocol import DOCUMENTS, DOCS_BY_NAME, FIELD_FORMATTERS, FVLN, REPEATED_CARDINALITY, STLV, TLV_HEADER, VLN, \
+    Byte, ByteArray, DocCodes, ProtocolError, String, U32, UnixTime
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+try:
+    import pyarrow
+except ImportError:
+    pyarrow = None
+
+ITEMS_TY = 1059  # тег позиции чека (items)
+
+# номера тегов документов, в которых ищутся реквизиты таблицы documents
+DOCUMENT_TYS = tuple(value for name, value in vars(DocCodes).items() if name.isupper())
+
+DOCUMENT_FIELDS = ('code', 'dateTime', 'fiscalDriveNumber', 'fiscalDocumentNumber', 'kktRegId', 'userInn',
+                   'operationType', 'totalSum')
+ITEM_FIELDS = ('name', 'price', 'quantity', 'sum')
+
+# typecode array.array для числовых тегов; он же задаёт dtype столбца в NumPy
+TYPECODES = {Byte: 'B', U32: 'I', UnixTime: 'I', VLN: 'Q', FVLN: 'd'}
+
+# значения, которыми в буферах заполняются отсутствующие в документе реквизиты
+FILL_VALUES = {'B': 0, 'I': 0, 'Q': 0, 'd': float('nan'), None: ''}
+
+
+def _field_typecode(name, parent_tys):
+    """
+    Typecode столбца для реквизита по его имени, None - строковый столбец. Если одно имя есть у нескольких тегов,
+    учитываются теги, которые выбираются при распаковке внутри parent_tys, как в STLV._select_tag_by_parent.
+    :param parent_tys: номера тегов, внутри которых выгружается реквизит: документы или позиция чека.
+    :raise ValueError: если реквизит неизвестен, составной или повторяющийся, или если его теги имеют разные типы.
+    """
+    if name == 'code':
+        return 'I'
+    if name not in DOCS_BY_NAME:
+        raise ValueError('Unknown field {}'.format(name))
+
+    found = DOCS_BY_NAME[name]
+    typecodes = set()
+    for ty, _ in found if isinstance(found, list) else (found,):
+        for parent_ty in parent_tys:
+            try:
+                tag = DOCUMENTS[parent_ty]._select_tag_by_parent(ty)
+            except ProtocolError:
+                continue
+            if tag.name != name:
+                continue
+            if isinstance(tag, STLV) or tag.cardinality in REPEATED_CARDINALITY:
+                raise ValueError('Field {} is not a scalar and can not be exported to a column'.format(name))
+            typecodes.add(None if isinstance(tag, (String, ByteArray)) else TYPECODES[type(tag)])
+
+    if not typecodes:
+        raise ValueError('Field {} can not appear in tags {}'.format(name, parent_tys))
+    if len(typecodes) > 1:
+        raise ValueError('Field {} is decoded from tags of different types'.format(name))
+    return typecodes.pop()
+
+
+class Column(object):
+    def __init__(self, name, typecode):
+        """
+        Столбец таблицы: буфер значений и признаки их наличия в документах.
+        :param name: имя реквизита.
+        :param typecode: typecode array.array для числовых реквизитов, None для строковых.
+        """
+        self.name = name
+        self.typecode = typecode
+        self.values = array.array(typecode) if typecode else []
+        self.valid = bytearray()  # 1 - значение есть в документе, 0 - заполнено FILL_VALUES
+
+    def __len__(self):
+        return len(self.valid)
+
+    def to_numpy(self):
+        """
+        :return: копия буфера в numpy.ndarray для числовых столбцов, для строковых - массив с dtype
+        'U<длина самой длинной строки>'.
+        """
+        if self.typecode:
+            # копия: пока на буфер array.array есть ссылки, в столбец нельзя добавлять значения
+            return numpy.frombuffer(self.values, dtype=self.typecode).copy() if self.values else \
+                numpy.empty(0, self.typecode)
+        return numpy.array(self.values, dtype='U{}'.format(max(map(len, self.values), default=1) or 1))
+
+    def to_arrow(self):
+        """
+        :return: pyarrow.Array, в котором отсутствующие значения равны null.
+        """
+        mask = numpy.frombuffer(bytes(self.valid), dtype=numpy.uint8) == 0
+        return pyarrow.array(self.to_numpy() if self.typecode else self.values, mask=mask)
+
+
+class Table(object):
+    def __init__(self, columns):
+        """
+        :param columns: list of Column одинаковой длины.
+        """
+        self.columns = columns
+        self._by_name = {column.name: column for column in columns}
+
+    def __len__(self):
+        return len(self.columns[0]) if self.columns else 0
+
+    def __getitem__(self, name):
+        return self._by_name[name]
+
+    @property
+    def names(self):
+        return [column.name for column in self.columns]
+
+    def to_numpy(self):
+        """
+        Структурированный массив NumPy: одно поле на столбец. Отсутствующие значения заполнены FILL_VALUES,
+        признаки наличия - в Column.valid.
+        """
+        if numpy is None:
+            raise ImportError('NumPy is required to export columns to numpy')
+        arrays = [column.to_numpy() for column in self.columns]
+        result = numpy.empty(len(self), dtype=[(column.name, a.dtype) for column, a in zip(self.columns, arrays)])
+        for column, a in zip(self.columns, arrays):
+            result[column.name] = a
+        return result
+
+    def to_arrow(self):
+        """
+        :return: pyarrow.Table, в котором отсутствующие значения равны null.
+        """
+        if pyarrow is None:
+            raise ImportError('pyarrow is required to export columns to arrow')
+        return pyarrow.Table.from_arrays([column.to_arrow() for column in self.columns], names=self.names)
+
+
+class ColumnarExporter(object):
+    def __init__(self, document_fields=DOCUMENT_FIELDS, item_fields=ITEM_FIELDS):
+        """
+        Выгрузка документов в две таблицы: documents с реквизитами документа и items с реквизитами позиций чеков.
+        Теги, которых нет среди выгружаемых реквизитов, пропускаются по длине без распаковки.
+        :param document_fields: реквизиты документа верхнего уровня. 'code' - номер тега документа.
+        :param item_fields: реквизиты позиции чека (тега items). К ним добавляется столбец document - номер строки
+        документа в таблице documents.
+        :raise ValueError: если реквизит неизвестен или не может быть столбцом (составной или повторяющийся тег).
+        """
+        self.documents = Table([Column(name, _field_typecode(name, DOCUMENT_TYS)) for name in document_fields])
+        self.items = Table([Column('document', 'Q')] +
+                           [Column(name, _field_typecode(name, (ITEMS_TY,))) for name in item_fields])
+        self._document_index = {name: index for index, name in enumerate(document_fields)}
+        self._item_index = {name: index for index, name in enumerate(item_fields, 1)}
+        # (parent_ty, ty) -> (номер столбца или None, функция распаковки или None, признак позиции чека)
+        self._plans = {}
+
+    def __len__(self):
+        return len(self.documents)
+
+    def add(self, container_message_raw):
+        """
+        Выгрузить один документ. Если документ не удалось разобрать, таблицы не изменяются.
+        :param container_message_raw: тело контейнера в бинарном виде, как для unpack_container_message.
+        :raise ProtocolError, ValueError, struct.error: если документ некорректный.
+        """
+        view = memoryview(container_message_raw)
+        ty, length = TLV_HEADER.unpack_from(view)
+        stlv_doc = DOCUMENTS[ty]
+
+        row = [None] * len(self.documents.columns)
+        if 'code' in self._document_index:
+            row[self._document_index['code']] = ty
+        items = []
+        self._walk(stlv_doc, view[TLV_HEADER.size:TLV_HEADER.size + length], row, items)
+
+        document = len(self.documents)
+        self._append(self.documents, row)
+        for item in items:
+            item[0] = document
+            self._append(self.items, item)
+
+    def extend(self, messages):
+        """
+        Выгрузить пачку документов.
+        :param messages: iterable тел контейнеров в бинарном виде.
+        """
+        for container_message_raw in messages:
+            self.add(container_message_raw)
+
+    def _walk(self, stlv, view, row, items):
+        """
+        Разобрать значение STLV тега в row, позиции чека - в новые строки items.
+        """
+        if len(view) > stlv.maxlen:
+            raise ValueError('STLV actual size is greater than maximum')
+
+        plans = self._plans
+        parent_ty = stlv.ty
+        offset = 0
+        end = len(view)
+        while offset < end:
+            ty, length = TLV_HEADER.unpack_from(view, offset)
+            offset += TLV_HEADER.size
+
+            plan = plans.get((parent_ty, ty))
+            if plan is None:
+                plan = plans[(parent_ty, ty)] = self._plan(stlv, ty)
+            index, decode, is_item = plan
+
+            if is_item:
+                item = [None] * len(self.items.columns)
+                self._walk(DOCUMENTS[ITEMS_TY], view[offset:offset + length], item, None)
+                items.append(item)
+            elif index is not None:
+                row[index] = decode(view[offset:offset + length])
+            offset += length
+
+    def _plan(self, stlv, ty):
+        """
+        Что делать с тегом ty внутри stlv: (номер столбца или None, функция распаковки, признак позиции чека).
+        """
+        tag = stlv._select_tag_by_parent(ty)
+        if ty == ITEMS_TY and stlv.ty != ITEMS_TY:
+            return None, None, len(self.items.columns) > 1
+
+        index = (self._item_index if stlv.ty == ITEMS_TY else self._document_index).get(tag.name)
+        if index is None:
+            return None, None, False
+
+        formatter = FIELD_FORMATTERS.get(tag.name)
+        if formatter is None:
+            return index, tag.unpack, False
+
+        def decode(data):
+            return formatter(tag.unpack(data))
+        return index, decode, False
+
+    @staticmethod
+    def _append(table, row):
+        for column, value in zip(table.columns, row):
+            if value is None:
+                column.values.append(FILL_VALUES[column.typecode])
+                column.valid.append(0)
+            else:
+                column.values.append(value)
+                column.valid.append(1)
+
+
+def export_columns(messages, document_fields=DOCUMENT_FIELDS, item_fields=ITEM_FIELDS):
+    """
+    Выгрузить документы в столбцы.
+    :param messages: iterable тел контейнеров в бинарном виде.
+    :return: пара таблиц (documents, items).
+    """
+    exporter = ColumnarExporter(document_fields, item_fields)
+    exporter.extend(messages)
+    return exporter.documents, exporter.items
@@ -0,0 +1,186 @@
+# coding: utf8
+#
+#        Copyright (C) 2017 Yandex LLC
+#        http://yandex.com
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#
+
+"""
+Ленивая распаковка документов: LazyDocument - отображение поверх бинарного контейнера, которое за один проход
+запоминает положение тегов, а значение распаковывает только при первом обращении к ключу.
+"""
+
+import binascii
+import functools
+from collections.abc import MutableMapping
+
+from .protocol import DOCUMENTS, FIELD_FORMATTERS, FISCAL_SIGN_OPERATOR, REPEATED_CARDINALITY, STLV, TLV_HEADER
+
+# таблицы (parent_ty, ty) -> (name, decoder, is_repeated), как TAG_CODECS, но вложенные STLV распаковываются
+# в LazyDocument. Заполняются при распаковке, отдельно без форматирования и с форматированием реквизитов
+LAZY_CODECS = {False: {}, True: {}}
+
+# значение ещё не распаковано, смещения тега - в LazyDocument._offsets
+_PENDING = object()
+
+
+class _Deferred(object):
+    """
+    Значение, которое вычисляется не из тега, например rawData.
+    """
+    __slots__ = ('func',)
+
+    def __init__(self, func):
+        self.func = func
+
+
+def _formatted(decode, formatter):
+    def decode_formatted(data):
+        return formatter(decode(data))
+    return decode_formatted
+
+
+def _lazy_codec(stlv, ty, formatted):
+    tag = stlv._select_tag_by_parent(ty)
+    if isinstance(tag, STLV):
+        decode = functools.partial(LazyDocument, tag)
+    else:
+        decode = tag.unpack
+    formatter = FIELD_FORMATTERS.get(tag.name) if formatted else None
+    if formatter is not None:
+        decode = _formatted(decode, formatter)
+    return tag.name, decode, tag.cardinality in REPEATED_CARDINALITY
+
+
+class LazyDocument(MutableMapping):
+    __slots__ = ('_view', '_data', '_offsets', '_codecs', '_parent_ty')
+
+    def __init__(self, stlv, data, formatted=False):
+        """
+        Отображение с тем же содержимым, что у dict из STLV.unpack. При создании теги только индексируются: для
+        каждого имени запоминается смещение тега (список смещений для повторяющихся тегов). Значение распаковывается
+        при первом обращении к ключу и запоминается, вложенные STLV тоже становятся LazyDocument. Поэтому ошибки
+        в значениях тегов обнаруживаются при обращении, а не при создании.
+        Для json.dumps и сравнения с эталоном используйте to_dict().
+        :param stlv: STLV тега, значением которого являются данные.
+        :param data: bytes, bytearray или memoryview со значением тега (без заголовка). Не должны изменяться, пока
+        документ используется.
+        :param formatted: форматировать реквизиты как ProtocolPacker.format_message_fields (только на этом уровне,
+        вложенные STLV не форматируются).
+        :raise ValueError, struct.error, ProtocolError: если заголовки тегов некорректны.
+        """
+        view = memoryview(data)
+        if len(view) > stlv.maxlen:
+            raise ValueError('STLV actual size is greater than maximum')
+
+        self._view = view
+        self._data = values = {}
+        self._offsets = offsets = {}
+        self._codecs = codecs = LAZY_CODECS[formatted]
+        self._parent_ty = parent_ty = stlv.ty
+
+        offset = 0
+        end = len(view)
+        while offset < end:
+            ty, length = TLV_HEADER.unpack_from(view, offset)
+
+            codec = codecs.get((parent_ty, ty))
+            if codec is None:
+                codec = codecs[(parent_ty, ty)] = _lazy_codec(stlv, ty, formatted)
+            name, _, is_repeated = codec
+
+            if is_repeated:
+                if name in offsets:
+                    offsets[name].append(offset)
+                else:
+                    offsets[name] = [offset]
+            else:
+                # как и STLV.unpack, из нескольких вхождений неповторяющегося тега берём последнее
+                offsets[name] = offset
+            values[name] = _PENDING
+            offset += TLV_HEADER.size + length
+
+    def __getitem__(self, key):
+        value = self._data[key]
+        if value is _PENDING:
+            # смещение удаляется только после успешной распаковки: при ошибке повторное обращение снова распакует тег
+            value = self._data[key] = self._decode(self._offsets[key])
+            del self._offsets[key]
+        elif isinstance(value, _Deferred):
+            value = self._data[key] = value.func()
+        return value
+
+    def _decode(self, offset):
+        if isinstance(offset, list):
+            return [self._decode(o) for o in offset]
+        ty, length = TLV_HEADER.unpack_from(self._view, offset)
+        offset += TLV_HEADER.size
+        return self._codecs[(self._parent_ty, ty)][1](self._view[offset:offset + length])
+
+    def __setitem__(self, key, value):
+        self._data[key] = value
+        self._offsets.pop(key, None)
+
+    def __delitem__(self, key):
+        del self._data[key]
+        self._offsets.pop(key, None)
+
+    def __iter__(self):
+        return iter(self._data)
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def __repr__(self):
+        return '{}({!r})'.format(type(self).__name__, self.to_dict())
+
+    def to_dict(self):
+        """
+        Распаковать все теги.
+        :return: dict, равный результату STLV.unpack, с вложенными dict вместо LazyDocument.
+        """
+        return {key: _to_dict(value) for key, value in self.items()}
+
+
+def _to_dict(value):
+    if isinstance(value, LazyDocument):
+        return value.to_dict()
+    if isinstance(value, list):
+        return [_to_dict(v) for v in value]
+    return value
+
+
+def unpack_container_message_lazy(container_message_raw, fiscal_sign):
+    """
+    Ленивый аналог unpack_container_message: документ - LazyDocument с теми же ключами, включая rawData, code и
+    messageFiscalSign, и тем же форматированием реквизитов.
+    :param container_message_raw: тело контейнера в бинарном виде.
+    :param fiscal_sign: ФПО в бинарном виде.
+    :return: пара ({имя документа: LazyDocument}, STLV документа).
+    """
+    ty, length = TLV_HEADER.unpack_from(container_message_raw)
+    stlv_doc = DOCUMENTS[ty]
+
+    body = LazyDocument(stlv_doc, memoryview(container_message_raw)[4:4 + length], formatted=True)
+    body._data['rawData'] = _Deferred(
+        lambda: binascii.b2a_base64(container_message_raw + fiscal_sign)[:-1].decode('ascii'))
+    body['code'] = ty
+    body._data['messageFiscalSign'] = _Deferred(lambda: FISCAL_SIGN_OPERATOR.unpack(fiscal_sign))
+
+    # тег 1000 (docName) не включается в док для ФНС
+    body._data.pop('docName', None)
+
+    return {stlv_doc.name: body}, stlv_doc
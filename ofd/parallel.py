@@ -0,0 +1,113 @@
+# coding: utf8
+#
+#        Copyright (C) 2017 Yandex LLC
+#        http://yandex.com
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#
+
+"""
+Параллельная распаковка и валидация контейнеров в пуле процессов.
+
+Распаковка - чистый CPU на Python, поэтому для переобработки архивов сообщения разбиваются на пачки, которые
+распаковываются в отдельных процессах. Порядок результатов совпадает с порядком входных сообщений.
+"""
+
+import collections
+import concurrent.futures
+import itertools
+import os
+
+from .protocol import DOCUMENTS, DocumentValidator, NullValidator, unpack_message
+
+# валидатор текущего процесса и параметры, с которыми он создан
+_validator = None
+_validator_config = None
+
+
+def get_validator(config):
+    """
+    Получить валидатор для текущего процесса. Валидатор создаётся один раз на процесс и переиспользуется для всех
+    последующих пачек с теми же параметрами.
+    :param config: None или пара (versions, options) - аргументы DocumentValidator.
+    """
+    global _validator, _validator_config
+    if _validator is None or _validator_config != config:
+        if config is None:
+            _validator = NullValidator()
+        else:
+            versions, options = config
+            _validator = DocumentValidator(versions, **dict(options))
+        _validator_config = config
+    return _validator
+
+
+def _unpack_chunk(chunk, config):
+    """
+    Распаковать пачку сообщений в процессе пула. Вместо описания документа возвращается номер его тега -
+    в родительском процессе он заменяется на объект из DOCUMENTS.
+    """
+    validator = get_validator(config) if config is not None else None
+    result = []
+    for message in chunk:
+        container_message, stlv_doc, error = unpack_message(*message, validator=validator)
+        result.append((container_message, stlv_doc.ty if stlv_doc is not None else None, error))
+    return result
+
+
+class ParallelUnpacker(object):
+    def __init__(self, workers=None, chunk_size=256, versions=None, **validator_options):
+        """
+        Распаковка и валидация сообщений в пуле процессов.
+        :param workers: количество процессов, по умолчанию - количество ядер.
+        :param chunk_size: количество сообщений в одной пачке, которая отправляется в процесс.
+        :param versions: поддерживаемые версии протокола для DocumentValidator. Если None, валидация не выполняется.
+        Версия для валидации берётся из тройки сообщения, а для пары - определяется по документу.
+        :param validator_options: остальные аргументы DocumentValidator, например path.
+        """
+        self._workers = workers or os.cpu_count() or 1
+        self._executor = concurrent.futures.ProcessPoolExecutor(max_workers=self._workers)
+        self._chunk_size = chunk_size
+        self._config = (tuple(versions), tuple(sorted(validator_options.items()))) if versions else None
+
+    def unpack(self, messages):
+        """
+        Распаковать сообщения. Одновременно в работе находится не больше двух пачек на процесс, поэтому входной
+        iterable может быть сколь угодно большим.
+        :param messages: iterable пар (container_message_raw, fiscal_sign) или троек (container_message_raw,
+        fiscal_sign, version).
+        :return: генератор троек (container_message, stlv_doc, error) в порядке входных сообщений.
+        """
+        messages = iter(messages)
+        pending = collections.deque()
+
+        while True:
+            while len(pending) < 2 * self._workers:
+                chunk = list(itertools.islice(messages, self._chunk_size))
+                if not chunk:
+                    break
+                pending.append(self._executor.submit(_unpack_chunk, chunk, self._config))
+
+            if not pending:
+                return
+
+            for container_message, ty, error in pending.popleft().result():
+                yield container_message, DOCUMENTS[ty] if ty is not None else None, error
+
+    def close(self):
+        self._executor.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
@@ -18,15 +18,20 @@
 import array
 import json
 import os
+import codecs
 import crcmod
 import crcmod.predefined
-import decimal
 import struct
 import jsonschema
 import base64
+import binascii
 import datetime
+import math
 import re
+import time
 from jsonschema import ValidationError, Draft4Validator
+from .schema import BUNDLE_SUFFIX, ROOT_SCHEMA, CompiledValidator, MappingDraft4Validator, SchemaCompiler, is_object, \
+    load_bundle
 
 VERSION = (1, 1, 0, 'ATOL-3')
 
@@ -36,6 +41,14 @@ FLK_ERROR = 14  # Ошибка форматно-логического конт
 
 JSON_VERSION = 13  # version of json format (OFD to FNS protocol) which is used to unpack document
 
+TLV_HEADER = struct.Struct('<HH')  # заголовок тега: номер тега и длина значения
+
+_EMPTY_TLV_HEADER = bytes(TLV_HEADER.size)
+
+REPEATED_CARDINALITY = {'*', '+'}  # значения cardinality, при которых тег распаковывается в список
+
+crc_ccitt = crcmod.predefined.mkPredefinedCrcFun('crc-ccitt-false')  # таблица CRC строится один раз
+
 
 class ProtocolError(RuntimeError):
     pass
@@ -46,10 +59,55 @@ class InvalidProtocolDocument(ProtocolError):
         super(InvalidProtocolDocument, self).__init__('invalid document')
 
 
-class Byte(object):
+class InvalidCrc(ProtocolError):
+    pass
+
+
+class Tag(object):
+    """
+    Описание тега: имя, максимальная длина значения и правила упаковки. Описания неизменяемые и хранят атрибуты в
+    слотах, без __dict__. Номер тега ty записывается один раз при инициализации DOCUMENTS.
+    """
+    __slots__ = ('name', 'desc', 'maxlen', 'cardinality', 'parents', 'ty')
+
+    def __init__(self, name, desc, maxlen, cardinality=None, parents=None):
+        """
+        :param name: name as it is encoded in Federal Tax Service.
+        :param desc: description as it is specified in OFD protocol.
+        :param maxlen: максимальная длина значения тега в байтах.
+        :param cardinality: specifies how many times the given document item should appear in the parent document.
+               Possible values: number as a string meaning exact number, '+' meaning one or more, '*' meaning zero or
+               more, None meaning that the cardinality is undefined.
+        :param parents: номера родительских тегов, если одному номеру соответствует несколько тегов.
+        """
+        _init = object.__setattr__
+        _init(self, 'name', name)
+        _init(self, 'desc', desc)
+        _init(self, 'maxlen', maxlen)
+        _init(self, 'cardinality', cardinality)
+        _init(self, 'parents', parents)
+        _init(self, 'ty', None)
+
+    def __setattr__(self, key, value):
+        raise AttributeError('{} tag description is immutable'.format(type(self).__name__))
+
+    def __delattr__(self, key):
+        raise AttributeError('{} tag description is immutable'.format(type(self).__name__))
+
+    def __getstate__(self):
+        # для pickle и copy: по умолчанию слоты восстанавливаются через setattr, который запрещён
+        return {name: getattr(self, name) for cls in type(self).__mro__ for name in getattr(cls, '__slots__', ())}
+
+    def __setstate__(self, state):
+        for name, value in state.items():
+            object.__setattr__(self, name, value)
+
+
+class Byte(Tag):
     """
     Represents a single-byte document item packer/unpacker.
     """
+    __slots__ = ()
     STRUCT = struct.Struct('B')
 
     def __init__(self, name, desc, cardinality=None, parents=None):
@@ -61,12 +119,7 @@ class Byte(object):
                Possible values: number as a string meaning exact number, '+' meaning one or more, '*' meaning zero or
                more, None meaning that the cardinality is undefined.
         """
-        self.name = name
-        self.desc = desc
-        self.cardinality = cardinality
-        self.maxlen = self.STRUCT.size
-        self.parents = parents
-        self.ty = None
+        super(Byte, self).__init__(name, desc, self.STRUCT.size, cardinality, parents)
 
     def pack(self, data):
         """
@@ -94,98 +147,94 @@ class Byte(object):
         return self.STRUCT.unpack(data)[0]
 
 
-class U32(object):
+class U32(Tag):
+    __slots__ = ()
+    STRUCT = struct.Struct('<I')
+
     def __init__(self, name, desc, cardinality=None, parents=None):
-        self.name = name
-        self.desc = desc
-        self.maxlen = 4,
-        self.cardinality = cardinality,
-        self.parents = parents
-        self.ty = None
+        super(U32, self).__init__(name, desc, self.STRUCT.size, cardinality, parents)
 
     @staticmethod
     def pack(data):
-        return struct.pack('<I', data)
+        return U32.STRUCT.pack(data)
 
     @staticmethod
     def unpack(data):
         # for zero-length tag value
         if len(data) == 0:
             return 0
-        return struct.unpack('<I', data)[0]
+        return U32.STRUCT.unpack(data)[0]
 
 
-class String(object):
+# таблицы cp866 для codecs.charmap_decode/charmap_encode: строки кодируются без поиска кодека по имени на каждый вызов
+_CP866_DECODING_TABLE = bytes(range(256)).decode('cp866')
+_CP866_ENCODING_MAP = codecs.charmap_build(_CP866_DECODING_TABLE)
+
+
+class String(Tag):
+    __slots__ = ('strip',)
+
     def __init__(self, name, desc, maxlen, cardinality=None, parents=None, strip=False):
-        self.name = name
-        self.desc = desc
-        self.maxlen = maxlen
-        self.parents = parents
-        self.strip = strip
-        self.cardinality = cardinality
-        self.ty = None
+        super(String, self).__init__(name, desc, maxlen, cardinality, parents)
+        object.__setattr__(self, 'strip', strip)
 
     @staticmethod
     def pack(value):
-        return struct.pack('{}s'.format(len(value)), value.encode('cp866'))
+        return codecs.charmap_encode(value, 'strict', _CP866_ENCODING_MAP)[0]
 
     def unpack(self, data):
         if len(data) == 0:
             return ''
         if len(data) > self.maxlen:
             raise ValueError('String tag {ty} actual size {actual} is greater than maximum {max}. Data: {data}'
-                             .format(ty=self.ty, actual=len(data), max=self.maxlen, data=data))
+                             .format(ty=self.ty, actual=len(data), max=self.maxlen, data=bytes(data)))
 
-        result = struct.unpack('{}s'.format(len(data)), data)[0].decode('cp866')
+        # charmap_decode читает memoryview напрямую, без копирования в bytes
+        result = codecs.charmap_decode(data, 'strict', _CP866_DECODING_TABLE)[0]
         if self.strip:
             result = result.strip()
         return result
 
 
-class ByteArray(object):
+class ByteArray(Tag):
+    __slots__ = ()
+
     def __init__(self, name, desc, maxlen, parents=None):
-        self.name = name
-        self.desc = desc
-        self.maxlen = maxlen
-        self.parents = parents
-        self.ty = None
+        super(ByteArray, self).__init__(name, desc, maxlen, parents=parents)
 
     @staticmethod
     def pack(value):
-        return struct.pack('{}s'.format(len(value)), value)
+        return memoryview(value).tobytes()
 
     def unpack(self, data):
         if len(data) == 0:
             return ''
         if len(data) > self.maxlen:
             raise ValueError('ByteArray actual size {} is greater than maximum {}'.format(len(data), self.maxlen))
-        return str(struct.unpack('{}s'.format(len(data)), data)[0])
+        return str(bytes(data))
 
 
-class UnixTime(object):
+class UnixTime(Tag):
+    __slots__ = ()
+    STRUCT = struct.Struct('<I')
+
     def __init__(self, name, desc, parents=None):
-        self.name = name
-        self.desc = desc
-        self.maxlen = 4
-        self.parents = parents
-        self.ty = None
+        super(UnixTime, self).__init__(name, desc, self.STRUCT.size, parents=parents)
 
     @staticmethod
     def pack(time):
-        return struct.pack('<I', int(time))
+        return UnixTime.STRUCT.pack(int(time))
 
     @staticmethod
     def unpack(data):
-        return struct.unpack('<I', data)[0]
+        return UnixTime.STRUCT.unpack(data)[0]
+
 
+class VLN(Tag):
+    __slots__ = ()
 
-class VLN(object):
     def __init__(self, name, desc, maxlen=8, parents=None):
-        self.name = name
-        self.desc = desc
-        self.maxlen = maxlen
-        self.parents = parents
-        self.ty = None
+        super(VLN, self).__init__(name, desc, maxlen, parents=parents)
 
     def pack(self, data):
         packed = struct.pack('<Q', data)
@@ -205,83 +254,122 @@ class VLN(object):
         if len(data) > self.maxlen:
             raise ValueError('VLN for "{}" actual size {} is greater than maximum {}'
                              .format(self.name, len(data), self.maxlen))
-        return struct.unpack('<Q', data + b'\x00' * (8 - len(data)))[0]
+        return int.from_bytes(data, 'little')
 
 
-class FVLN(object):
-    def __init__(self, name, desc, maxlen, parents=None):
-        self.name = name
-        self.desc = desc
-        self.maxlen = maxlen
-        self.parents = parents
-        self.ty = None
+# степени десяти для FVLN: положение точки - знаковый байт, поэтому хватает 10 ** 128
+_POW10 = [10 ** i for i in range(129)]
 
-    def pack(self, data):
-        str_data = str(data)
-        point = str_data.index('.')
-        prepared = int(str_data[0:point] + str_data[point + 1:])
 
-        # первый байт, который указывает положение точки в числе относительно правого края
-        point_position = len(str_data) - 1 - point
-        packed = struct.pack('<bQ', point_position, prepared)
+class FVLN(Tag):
+    __slots__ = ()
+    STRUCT = struct.Struct('<bQ')  # положение точки относительно правого края и мантисса
 
-        # Если длина полученного массива больше maxlen, то у массива будут обрезаны нули справа до maxlen,
-        # т.к. они не влияют на итоговое значение числа
-        if len(packed) > self.maxlen:
-            trim_part = packed[self.maxlen: len(packed)]
-            # Если отбрасываемая часть содержит не только нули, значит переданное число больше чем maxlen и
-            # оно не может быть корректно упаковано
-            if trim_part != b'\x00' * len(trim_part):
-                raise ValueError('FVLN cant pack {} because is greater than maximum {}'.format(data, self.maxlen))
-            return packed[:self.maxlen]
+    def __init__(self, name, desc, maxlen, parents=None):
+        super(FVLN, self).__init__(name, desc, maxlen, parents=parents)
 
-        return packed
+    def pack(self, data):
+        """
+        Упаковать число с плавающей точкой. Цифры числа берутся из его десятичной записи str(data), поэтому 0.1
+        упаковывается как 1 с точкой в первой позиции, а не как ближайшее двоичное значение.
+        :param data: float (или строка с точкой) либо пара (mantissa, point) из unpack_fixed_point.
+        :raise ValueError: если в записи числа нет точки или мантисса не помещается в maxlen.
+        """
+        if type(data) is tuple:
+            mantissa, point_position = data
+        else:
+            whole, point, fraction = str(data).partition('.')
+            if not point:
+                raise ValueError('FVLN cant pack {} because it has no decimal point'.format(data))
+            mantissa = int(whole + fraction)
+            point_position = len(fraction)
+
+        # мантисса занимает все байты до maxlen, но не больше 8: лишние нулевые байты справа не пишутся
+        size = min(self.maxlen, self.STRUCT.size)
+        if mantissa >> (8 * (size - 1)):
+            raise ValueError('FVLN cant pack {} because is greater than maximum {}'.format(data, self.maxlen))
+        return self.STRUCT.pack(point_position, mantissa)[:size]
 
     def unpack(self, data):
         if len(data) > self.maxlen:
             raise ValueError('FVLN actual size is greater than maximum')
+        if not data:
+            return 0.0
+
+        point_position = data[0]
+        mantissa = int.from_bytes(data[1:], 'little')
+        # деление целых в Python округляется корректно, поэтому результат совпадает с точным десятичным значением,
+        # приведённым к float
+        if point_position < 128:
+            return mantissa / _POW10[point_position]
+        return float(mantissa * _POW10[256 - point_position])
+
+    def unpack_fixed_point(self, data):
+        """
+        Распаковать число без округления до float.
+        :return: пара (mantissa, point): значение равно mantissa / 10 ** point.
+        """
+        if len(data) > self.maxlen:
+            raise ValueError('FVLN actual size is greater than maximum')
+        if not data:
+            return 0, 0
 
-        pad = b'\x00' * (9 - len(data))
-        pos, num = struct.unpack('<bQ', data + pad)
-        d = decimal.Decimal(10) ** +pos
-        q = decimal.Decimal(10) ** -pos
-        return float((decimal.Decimal(num) / d).quantize(q))
+        point_position = data[0]
+        if point_position > 127:
+            point_position -= 256
+        return int.from_bytes(data[1:], 'little'), point_position
 
 
-class STLV(object):
+class STLV(Tag):
+    __slots__ = ()
+
     def __init__(self, name, desc, maxlen, cardinality='1', parents=None):
-        self.name = name
-        self.desc = desc
-        self.maxlen = maxlen
-        self.cardinality = cardinality
-        self.parents = parents
-        self.ty = None
+        super(STLV, self).__init__(name, desc, maxlen, cardinality, parents)
 
     @staticmethod
     def pack(data):
         return data
 
-    def unpack(self, data):
+    def unpack(self, data, fields=None):
+        """
+        Распаковать значение STLV тега. Данные не копируются: тело обходится одним memoryview со сдвигающимся
+        смещением, вложенные STLV получают срезы того же memoryview.
+        :param data: bytes, bytearray или memoryview со значением тега (без заголовка).
+        :param fields: None или множество имён тегов, которые нужно распаковать. Остальные теги, в том числе
+        вложенные STLV целиком, пропускаются по длине без распаковки. Запрошенный STLV распаковывается полностью.
+        :return: dict с распакованными вложенными тегами.
+        """
         if len(data) > self.maxlen:
             raise ValueError('STLV actual size is greater than maximum')
 
         result = {}
-
-        while len(data) > 0:
-            ty, length = struct.unpack('<HH', data[:4])
-            doc = self._select_tag_by_parent(ty)
-            value = doc.unpack(data[4:4 + length])
-
-            if hasattr(doc, 'cardinality'):
-                if doc.cardinality in {'*', '+'}:
-                    if doc.name not in result:
-                        result[doc.name] = []
-                    result[doc.name].append(value)
-                else:
-                    result[doc.name] = value
+        view = memoryview(data)
+        offset = 0
+        end = len(view)
+
+        tag_codecs = TAG_CODECS
+        parent_ty = self.ty
+
+        while offset < end:
+            ty, length = TLV_HEADER.unpack_from(view, offset)
+            offset += TLV_HEADER.size
+
+            codec = tag_codecs.get((parent_ty, ty))
+            if codec is None:
+                codec = tag_codecs[(parent_ty, ty)] = _tag_codec(self._select_tag_by_parent(ty))
+            name, decode, is_repeated = codec
+            if fields is not None and name not in fields:
+                offset += length
+                continue
+            value = decode(view[offset:offset + length])
+
+            if is_repeated:
+                if name not in result:
+                    result[name] = []
+                result[name].append(value)
             else:
-                result[doc.name] = value
-            data = data[4 + length:]
+                result[name] = value
+            offset += length
 
         return result
 
@@ -329,6 +417,12 @@ class SessionHeader(object):
 
     INCLUDE_CONTAINER_FLAG = 0b0100  # флаг указывает, что сообщение содержит контейнер
 
+    # биты 0-1 флагов: для какой части сообщения посчитан CRC сеансового уровня
+    CRC_FLAGS_MASK = 0b0011
+    CRC_NONE = 0b00  # CRC не вычисляется
+    CRC_HEADER = 0b01  # CRC вычисляется по заголовку
+    CRC_HEADER_AND_BODY = 0b10  # CRC вычисляется по заголовку и контейнеру
+
     def __init__(self, pva, fs_id, length, flags, crc):
         self.pva = pva
         # Номер ФН.
@@ -348,6 +442,21 @@ class SessionHeader(object):
             self.crc
         )
 
+    @property
+    def crc_flags(self):
+        """Для какой части сообщения посчитан CRC: CRC_NONE, CRC_HEADER или CRC_HEADER_AND_BODY"""
+        return self.flags & self.CRC_FLAGS_MASK
+
+    def calculate_crc(self, container=b''):
+        """
+        Посчитать CRC сеансового уровня согласно флагам: по заголовку без поля CRC и, если указано, по контейнеру.
+        :param container: контейнер сообщения - bytes или memoryview.
+        """
+        crc = crc_ccitt(memoryview(self.pack())[:-2])
+        if self.crc_flags == self.CRC_HEADER_AND_BODY:
+            crc = crc_ccitt(container, crc)
+        return crc
+
     @property
     def pva_hex(self):
         """Get hex string of application protocol version"""
@@ -394,17 +503,17 @@ class FrameHeader(object):
     STRUCT = struct.Struct('<HHBBB2s8s3s12s')
     STRUCT_TINY = struct.Struct('<BBB2s8s3s12s')
 
-    def __init__(self, length, crc, doctype, extra1, devnum, docnum, extra2):
+    def __init__(self, length, crc, doctype, extra1, devnum, docnum, extra2, msgtype=MSGTYPE, version=VERSION):
         # Длина.
         self.length = length
         # Проверочный код.
         self.crc = crc
         # Тип сообщения протокола.
-        self.msgtype = self.MSGTYPE
+        self.msgtype = msgtype
         # Тип фискального документа.
         self.doctype = doctype
         # Версия протокола.
-        self.version = self.VERSION
+        self.version = version
         # Номер ФН.
         self.devnum = devnum
         # Номер ФД.
@@ -418,7 +527,7 @@ class FrameHeader(object):
         return self.STRUCT.pack(
             self.length,
             self.crc,
-            self.MSGTYPE,
+            self.msgtype,
             self.doctype,
             self.version,
             self.extra1,
@@ -438,7 +547,7 @@ class FrameHeader(object):
         if pack[cls.VERSION_ID] != cls.VERSION:
             raise ValueError('invalid protocol version')
 
-        return FrameHeader(pack[0], pack[1], pack[3], *pack[5:])
+        return FrameHeader(pack[0], pack[1], pack[3], *pack[5:], msgtype=pack[2], version=pack[4])
 
     @classmethod
     def unpack_from_raw(cls, data, msg_type=None):
@@ -460,7 +569,7 @@ class FrameHeader(object):
         if pack[cls.VERSION_ID - 2] != cls.VERSION:
             raise ValueError('invalid protocol version')
 
-        return FrameHeader(0, 0, pack[1], *pack[3:])
+        return FrameHeader(0, 0, pack[1], *pack[3:], msgtype=pack[0], version=pack[2])
 
     @classmethod
     def unpack_receipt_from_raw(cls, data):
@@ -479,15 +588,25 @@ class FrameHeader(object):
         if pack[cls.VERSION_ID - 2] != cls.VERSION:
             raise ValueError('invalid protocol version')
 
-        return FrameHeader(0, 0, pack[1], *pack[3:])
+        return FrameHeader(0, 0, pack[1], *pack[3:], msgtype=pack[0], version=pack[2])
 
     def docnum(self):
         return struct.unpack('>I', b'\0' + self._docnum)[0]
 
+    def calculate_crc(self, body):
+        """
+        Посчитать проверочный код контейнера: по заголовку без поля CRC и по телу. Части передаются в функцию CRC
+        по очереди, без склеивания в один буфер.
+        :param body: тело контейнера - bytes или memoryview.
+        :return: CRC16-CCITT.
+        """
+        pack = memoryview(self.pack())
+        crc = crc_ccitt(pack[:2])
+        crc = crc_ccitt(pack[4:], crc)
+        return crc_ccitt(body, crc)
+
     def recalculate_crc(self, body):
-        f = crcmod.predefined.mkPredefinedCrcFun('crc-ccitt-false')
-        pack = self.pack()
-        self.crc = f(pack[:2] + pack[4:] + body)
+        self.crc = self.calculate_crc(body)
 
     def __str__(self):
         return 'Заголовок Контейнера\n' \
@@ -502,7 +621,7 @@ class FrameHeader(object):
                '{:26}: {}'.format(
                                 'Длина', self.length,
                                 'Проверочный код', self.crc,
-                                'Тип сообщения протокола', self.MSGTYPE,
+                                'Тип сообщения протокола', self.msgtype,
                                 'Тип фискального документа', self.doctype,
                                 'Версия протокола', self.version,
                                 'Служебные данные 1', self.extra1,
@@ -511,6 +630,44 @@ class FrameHeader(object):
                                 'Служебные данные 2', self.extra2)
 
 
+def verify_session_crc(session, container):
+    """
+    Проверить CRC сеансового уровня, если согласно флагам он посчитан.
+    :param session: SessionHeader входящего сообщения.
+    :param container: контейнер сообщения - bytes или memoryview.
+    :raise InvalidCrc: если флаги CRC имеют зарезервированное значение.
+    :return: True, если CRC не посчитан или совпадает с посчитанным.
+    """
+    crc_flags = session.crc_flags
+    if crc_flags == SessionHeader.CRC_NONE:
+        return True
+    if crc_flags not in (SessionHeader.CRC_HEADER, SessionHeader.CRC_HEADER_AND_BODY):
+        raise InvalidCrc('Reserved CRC flags {:#04b}'.format(crc_flags))
+    return session.crc == session.calculate_crc(container)
+
+
+def verify_crc(header, body):
+    """
+    Проверить проверочный код входящего контейнера.
+    :param header: FrameHeader входящего сообщения. Тип сообщения и версия протокола берутся из заголовка, как они
+    были получены.
+    :param body: тело контейнера - bytes или memoryview.
+    :return: True, если CRC из заголовка совпадает с посчитанным.
+    """
+    return header.crc == header.calculate_crc(body)
+
+
+def verify_container_crc(header, container):
+    """
+    Проверить проверочный код входящего контейнера по байтам, как они получены: заголовку без поля CRC и телу.
+    :param header: FrameHeader, разобранный из начала контейнера.
+    :param container: контейнер целиком - bytes или memoryview.
+    :return: True, если CRC из заголовка совпадает с посчитанным.
+    """
+    container = memoryview(container)
+    return header.crc == crc_ccitt(container[4:], crc_ccitt(container[:2]))
+
+
 PAYMENT_DOCUMENTS = {'receipt', 'receiptCorrection', 'bso', 'bsoCorrection'}
 
 
@@ -796,17 +953,26 @@ def _update_tag_value(doc):
     Выполняется при инициализации
     """
     for ty, val in doc.items():
-        if isinstance(val, list):
-            for i in val:
-                i.ty = ty
-        else:
-            val.ty = ty
+        for tag in val if isinstance(val, list) else (val,):
+            # описания тегов неизменяемые, номер тега - единственный атрибут, который записывается после создания
+            object.__setattr__(tag, 'ty', ty)
+
+
+def _tag_codec(doc):
+    """
+    Правило распаковки тега: (name, функция распаковки, признак повторяющегося тега)
+    """
+    return doc.name, doc.unpack, doc.cardinality in REPEATED_CARDINALITY
 
 
 DOCS_BY_DESC = _group_tags(DOCUMENTS, group_by='desc')
 DOCS_BY_NAME = _group_tags(DOCUMENTS, group_by='name')
 _update_tag_value(DOCUMENTS)  # инициализация тегов
 
+# таблица распаковки тегов (parent_ty, ty) -> (name, decoder, is_repeated). Заполняется при распаковке: тег
+# выбирается по родителю один раз для каждой встреченной пары, а не при импорте для всех возможных
+TAG_CODECS = {}
+
 
 class NullValidator(object):
     def validate(self, doc: dict, version: str):
@@ -814,63 +980,164 @@ class NullValidator(object):
 
 
 class DocumentValidator(object):
-    def __init__(self, versions, path, skip_unknown=False, min_date='2016.09.01', future_hours=24):
+    BACKENDS = ('jsonschema', 'compiled')
+
+    def __init__(self, versions, path, skip_unknown=False, min_date='2016.09.01', future_hours=24,
+                 backend='jsonschema', check_schema=True, bundle=False, rules=()):
         """
-        Класс для валидации документов от ККТ по json-схеме.
+        Класс для валидации документов от ККТ по json-схеме. Схемы версии загружаются при валидации первого
+        документа этой версии.
         :param versions: поддерживаемые версии протокола, например ['1.0', '1.05'].
         :param path: путь до директории, которая содержит все директории со схемами, разбитым по версиям,
         например, схемы для протокола 1.0 должны лежать в <path>/1.0/
         :param skip_unknown: если номер версии отличается от поддерживаемых пропускать валидацию
+        :param backend: 'jsonschema' - Draft4Validator, 'compiled' - схема заранее компилируется в функции проверки
+        (ofd.schema.CompiledValidator). Ошибки валидации у обоих вариантов одинаковые.
+        :param check_schema: проверять, что сама схема валидна. Проверку можно отключить для уже проверенных схем,
+        чтобы быстрее запускаться.
+        :param bundle: загружать схемы из бандлов <path>/<version>.bundle.json, собранных python -m ofd.bundle,
+        вместо директорий со схемами. Бандл читается одним файлом и один раз на процесс.
+        :param rules: дополнительные логические проверки - функции rule(doc_name, body), которые бросают
+        ValidationError. Выполняются после проверки по схеме и проверки даты документа, например
+        ofd.rules.check_payment_totals.
         """
+        if backend not in self.BACKENDS:
+            raise ValueError('Unknown validator backend {}, expected one of {}'.format(backend, self.BACKENDS))
+        self._versions = frozenset(versions)
         self._validators = {}
         self._skip_unknown = skip_unknown
-        schema_dir = os.path.expanduser(path)
-        schema_dir = os.path.abspath(schema_dir)
+        self._schema_dir = os.path.abspath(os.path.expanduser(path))
+        self._backend = backend
+        self._check_schema = check_schema
+        self._bundle = bundle
 
         self.min_date = datetime.datetime.strptime(min_date, '%Y.%m.%d') if min_date else None
         self.future_hours = future_hours
+        self.rules = list(rules)
 
-        for version in versions:
-            full_path = os.path.join(schema_dir, version, 'document.schema.json')
+    @property
+    def min_date(self):
+        return self._min_date
+
+    @min_date.setter
+    def min_date(self, value):
+        self._min_date = value
+        # dateTime документа - целое число секунд, поэтому граница тоже целая: наименьшая допустимая секунда
+        self._min_timestamp = math.ceil(value.timestamp()) if value else None
+
+    @property
+    def future_hours(self):
+        return self._future_hours
+
+    @future_hours.setter
+    def future_hours(self, value):
+        self._future_hours = value
+        self._future_expires = 0  # граница пересчитается при следующей проверке
+
+    def _future_timestamp(self):
+        """
+        Максимально допустимое время документа, целое число секунд. Считается так же, как раньше считалось для
+        каждого документа, но не чаще раза в секунду, поэтому граница может отставать от текущего времени не больше
+        чем на секунду.
+        """
+        now = time.monotonic()
+        if now >= self._future_expires:
+            future = datetime.datetime.utcnow() + datetime.timedelta(hours=self._future_hours)
+            self._future_timestamp_value = math.floor(future.timestamp())
+            self._future_expires = now + 1
+        return self._future_timestamp_value
+
+    def _load(self, version):
+        """
+        Загрузить схемы версии и создать валидаторы тел документов.
+        :return: dict имя документа -> валидатор.
+        """
+        if self._bundle:
+            full_path = os.path.join(self._schema_dir, version + BUNDLE_SUFFIX)
+            schema = load_bundle(full_path)
+        else:
+            full_path = os.path.join(self._schema_dir, version, ROOT_SCHEMA)
             with open(full_path, encoding='utf-8') as fh:
                 schema = json.loads(fh.read())
-                resolver = jsonschema.RefResolver('file://' + full_path, None)
-                validator = Draft4Validator(schema=schema, resolver=resolver)
-                validator.check_schema(schema)  # проверяем, что сама схема - валидная
-                self._validators[version] = validator
+        if self._check_schema:
+            Draft4Validator.check_schema(schema)  # проверяем, что сама схема - валидная
+
+        # document.schema.json выбирает тип документа через oneOf, но имя документа и так известно - это
+        # единственный ключ документа. Поэтому для каждого документа заводим свой валидатор его тела.
+        resolver = jsonschema.RefResolver('file://' + full_path, schema)
+        compiler = None
+        if self._backend == 'compiled':
+            compiler = SchemaCompiler(os.path.dirname(full_path), {os.path.basename(full_path): schema})
+        validators = {}
+        for doc_name, doc_schema in schema['properties'].items():
+            if compiler is not None:
+                validators[doc_name] = CompiledValidator(full_path, doc_schema['$ref'], compiler)
+            else:
+                validators[doc_name] = MappingDraft4Validator(schema=doc_schema, resolver=resolver)
+        self._validators[version] = validators
+        return validators
 
     def validate(self, doc: dict, version: str):
         """
         Валидация документа на соответствие json схеме протокола
-        :param doc:
+        :param doc: документ - dict или другой Mapping, например из ofd.lazy.unpack_container_message_lazy
         :param version: номер версии, например '1.0' или '1.05'
         :return: Exception в случае ошибки валидации
         """
-        validator = self._validators.get(version)
-        if validator:
-            validator.validate(doc)
+        validators = self._validators.get(version)
+        if validators is None and version in self._versions:
+            validators = self._load(version)
+
+        if validators:
+            self._validate_body(doc, validators)
         elif not self._skip_unknown:
             raise ValidationError('Version ' + version + ' is unsupported')
 
         self._validate_logic(doc)
 
+    @staticmethod
+    def _validate_body(doc, validators):
+        if not is_object(doc):
+            raise ValidationError('Document must be an object, not {}'.format(type(doc).__name__))
+
+        doc_names = [name for name in doc if name in validators]
+        if len(doc_names) != 1:
+            if doc_names:
+                message = 'Document contains several documents: {}'.format(', '.join(doc_names))
+            else:
+                message = 'Document must contain one of {}, got {}'.format(', '.join(validators),
+                                                                           ', '.join(doc) or 'nothing')
+            raise ValidationError(message, validator='oneOf')
+
+        doc_name = doc_names[0]
+        try:
+            validators[doc_name].validate(doc[doc_name])
+        except ValidationError as e:
+            # путь к ошибке - от корня документа, как при валидации по document.schema.json
+            e.path.appendleft(doc_name)
+            e.schema_path.extendleft((doc_name, 'properties'))
+            raise
+
     def _validate_logic(self, doc):
         doc_name = next(iter(doc))
+        body = doc[doc_name]
         # проверка, что дата чека не меньше указанной даты
-        doc_timestamp = doc[doc_name].get('dateTime')
-        if self.min_date and self.min_date.timestamp() > doc_timestamp:
+        doc_timestamp = body.get('dateTime')
+        if self._min_timestamp is not None and self._min_timestamp > doc_timestamp:
             doc_date = datetime.datetime.fromtimestamp(doc_timestamp)
             raise ValidationError('Document timestamp ' + str(doc_date) + ' is less than min. allowed date ' +
                                   str(self.min_date))
 
         # проверка, что чек может быть "из будущего" только на 24 часа больше UTC
-        future = datetime.datetime.utcnow() + datetime.timedelta(hours=self.future_hours)
-        if doc_timestamp > future.timestamp():
+        if doc_timestamp > self._future_timestamp():
             doc_date = datetime.datetime.fromtimestamp(doc_timestamp)
 
             raise ValidationError('Document timestamp {} is greater than now for {} hours'
                                   .format(str(doc_date), str(self.future_hours)))
 
+        for rule in self.rules:
+            rule(doc_name, body)
+
 
 def _select_tag_by_key(key, docs, parent_ty):
     """
@@ -905,30 +1172,47 @@ def pack_json(doc: dict, docs: dict = DOCS_BY_DESC, parent_ty=None) -> bytes:
     :param parent_ty: value of parent tag. None for root element
     :return: packed document representation as a bytearray.
     """
-    wr = b''
-    for name, value in doc.items():
-        ty, cls = _select_tag_by_key(key=name, docs=docs, parent_ty=parent_ty)
-        if isinstance(value, list):
-            # в случае массива записываем все элементы массива одним за другим
-            # без родительского тега
-            list_tags = b''
-            for item in value:
-                if isinstance(item, dict):
-                    item_data = pack_json(item, docs=docs, parent_ty=ty)
-                else:
-                    item_data = cls.pack(item)
-                list_tags += struct.pack('<HH', ty, len(item_data)) + item_data
+    buf = bytearray()
+    _pack_json_into(buf, doc, docs, parent_ty)
+    return bytes(buf)
 
-            wr += list_tags
-        else:
-            if isinstance(value, dict):
-                data = pack_json(value, docs=docs, parent_ty=ty)
+
+def _pack_json_into(buf: bytearray, doc: dict, docs: dict, parent_ty):
+    """
+    Упаковать документ в конец буфера buf. Значение вложенного STLV пишется прямо в буфер: сначала резервируется
+    заголовок тега, а после упаковки дочерних тегов в него дописывается итоговая длина.
+    """
+    pack_codecs = _PACK_CODECS.get(id(docs))
+    pack_header = TLV_HEADER.pack
+    header_size = TLV_HEADER.size
+    for name, value in doc.items():
+        codec = pack_codecs.get((parent_ty, name)) if pack_codecs is not None else None
+        if codec is None:
+            ty, cls = _select_tag_by_key(key=name, docs=docs, parent_ty=parent_ty)
+            codec = ty, cls.pack
+            if pack_codecs is not None:
+                pack_codecs[(parent_ty, name)] = codec
+        ty, encode = codec
+
+        # в случае массива записываем все элементы массива одним за другим
+        # без родительского тега
+        for item in value if isinstance(value, list) else (value,):
+            if isinstance(item, dict):
+                start = len(buf)
+                buf += _EMPTY_TLV_HEADER
+                _pack_json_into(buf, item, docs, ty)
+                TLV_HEADER.pack_into(buf, start, ty, len(buf) - start - header_size)
             else:
-                data = cls.pack(value)
-            wr += struct.pack('<HH', ty, len(data)) + data
+                data = encode(item)
+                buf += pack_header(ty, len(data))
+                buf += data
 
-    return wr
 
+# таблицы упаковки (parent_ty, key) -> (ty, encoder) для стандартных контейнеров тегов, заполняются при упаковке
+_PACK_CODECS = {
+    id(DOCS_BY_DESC): {},
+    id(DOCS_BY_NAME): {},
+}
 
 MAX_UINT_32 = 2 ** 32 - 1  # максимальное значение 4-байтового uint
 
@@ -946,18 +1230,42 @@ def extract_fiscal_sign_for_print(full_sign):
     return struct.unpack('<Q', data + b'\x00' * (8 - len(data)))[0]
 
 
+FISCAL_SIGN_OPERATOR = VLN('fiscalSignOperator', 'фпс для оператора')
+
+
 class ProtocolPacker:
+    INN_FIELDS = ('userInn', 'ofdInn', 'operatorInn', 'operatorTransportInn')
+    PHONE_FIELDS = ('paymentAgentPhone', 'operatorToReceivePhone', 'operatorPhoneToTransfer',
+                    'bankSubagentPhone', 'paymentSubagentPhone')
+    # в json-схемах протокола 10-значный ИНН дополнен пробелами до 12 символов, как в самом теге
+    SCHEMA_INN_FIELDS = ('userInn', 'ofdInn', 'operatorInn', 'operatorTransferInn')
+    SCHEMA_INN_LENGTH = 12
+    # код документа json-схемы протокола ждут в реквизите <имя документа>Code, распаковщик кладёт его в code
+    SCHEMA_CODE_FIELDS = {'receipt': 'receiptCode', 'receiptCorrection': 'receiptCorrectionCode', 'bso': 'bsoCode',
+                          'bsoCorrection': 'bsoCorrectionCode'}
+
     @classmethod
-    def unpack_container_message(cls, container_message_raw, fiscal_sign):
-        ty, length = struct.unpack('<HH', container_message_raw[:4])
+    def unpack_container_message(cls, container_message_raw, fiscal_sign, fields=None):
+        """
+        Распаковать документ из контейнера.
+        :param container_message_raw: тело контейнера в бинарном виде.
+        :param fiscal_sign: ФПО в бинарном виде.
+        :param fields: None или множество реквизитов документа, которые нужно распаковать, например
+        {'fiscalDriveNumber', 'fiscalDocumentNumber'}. Остальные теги пропускаются без распаковки, а rawData, code и
+        messageFiscalSign добавляются, только если они тоже указаны.
+        :return: пара (документ, STLV документа).
+        """
+        ty, length = TLV_HEADER.unpack_from(container_message_raw)
         stlv_doc = DOCUMENTS[ty]
 
-        fps = VLN('fiscalSignOperator', 'фпс для оператора')
-
-        container_message = stlv_doc.unpack(container_message_raw[4:4 + length])
-        container_message['rawData'] = base64.b64encode(container_message_raw + fiscal_sign).decode('utf8')
-        container_message['code'] = ty
-        container_message['messageFiscalSign'] = fps.unpack(fiscal_sign)
+        container_message = stlv_doc.unpack(memoryview(container_message_raw)[4:4 + length], fields)
+        if fields is None or 'rawData' in fields:
+            container_message['rawData'] = binascii.b2a_base64(container_message_raw + fiscal_sign)[:-1] \
+                .decode('ascii')
+        if fields is None or 'code' in fields:
+            container_message['code'] = ty
+        if fields is None or 'messageFiscalSign' in fields:
+            container_message['messageFiscalSign'] = FISCAL_SIGN_OPERATOR.unpack(fiscal_sign)
 
         # тег 1000 (docName) не включается в док для ФНС
         if 'docName' in container_message:
@@ -971,6 +1279,25 @@ class ProtocolPacker:
 
         return container_message, stlv_doc
 
+    @classmethod
+    def unpack_container_messages(cls, messages, fields=None):
+        """
+        Распаковать пачку сообщений. Ошибка распаковки одного сообщения не прерывает обработку остальных - она
+        возвращается вместе с результатом для этого сообщения.
+        :param messages: iterable пар (container_message_raw, fiscal_sign).
+        :param fields: распаковываемые реквизиты, как в unpack_container_message.
+        :return: генератор троек (container_message, stlv_doc, error) в порядке входных сообщений. Для успешно
+        распакованного сообщения error равен None, иначе container_message и stlv_doc равны None.
+        """
+        unpack = cls.unpack_container_message
+        for container_message_raw, fiscal_sign in messages:
+            try:
+                container_message, stlv_doc = unpack(container_message_raw, fiscal_sign, fields)
+            except Exception as e:
+                yield None, None, e
+            else:
+                yield container_message, stlv_doc, None
+
     @classmethod
     def format_message_fields(cls, container_message):
         if 'fiscalSign' in container_message:
@@ -980,15 +1307,11 @@ class ProtocolPacker:
         if kkt_reg_id:
             container_message['kktRegId'] = kkt_reg_id.strip()
 
-        inn_fields = ['userInn', 'ofdInn', 'operatorInn', 'operatorTransportInn']
-        for field in inn_fields:
+        for field in cls.INN_FIELDS:
             if field in container_message:
                 container_message[field] = cls._format_inn(container_message[field])
 
-        phone_fields = ['paymentAgentPhone', 'operatorToReceivePhone', 'operatorPhoneToTransfer',
-                        'bankSubagentPhone', 'paymentSubagentPhone']
-
-        for field in phone_fields:
+        for field in cls.PHONE_FIELDS:
             if field in container_message:
                 if isinstance(container_message[field], list):
                     container_message[field] = [cls._format_phone(i) for i in container_message[field]]
@@ -997,6 +1320,26 @@ class ProtocolPacker:
 
         return container_message
 
+    @classmethod
+    def prepare_for_validation(cls, container_message):
+        """
+        Привести документ из unpack_container_message к виду, который проверяют json-схемы протокола: вернуть ИНН
+        ширину 12 символов, которую они теряют при распаковке и форматировании, и добавить код документа.
+        :param container_message: документ из unpack_container_message, не изменяется.
+        :return: документ с копией тела.
+        """
+        doc_name = get_doc_name(container_message)
+        body = dict(container_message[doc_name])
+        for field in cls.SCHEMA_INN_FIELDS:
+            inn = body.get(field)
+            if inn:
+                body[field] = inn.ljust(cls.SCHEMA_INN_LENGTH)
+
+        code_field = cls.SCHEMA_CODE_FIELDS.get(doc_name)
+        if code_field is not None and code_field not in body and 'code' in body:
+            body[code_field] = body['code']
+        return {doc_name: body}
+
     @classmethod
     def _format_inn(cls, inn):
         if not inn:
@@ -1022,13 +1365,50 @@ class ProtocolPacker:
         return '+' + phone
 
 
-def unpack_container_message(container_message_raw, fiscal_sign):
-    return ProtocolPacker.unpack_container_message(container_message_raw, fiscal_sign)
+# преобразования ProtocolPacker.format_message_fields для отдельного значения по имени реквизита - для распаковки
+# без промежуточного dict. Повторяющиеся реквизиты (телефоны) преобразуются поэлементно
+FIELD_FORMATTERS = {'fiscalSign': extract_fiscal_sign_for_print, 'kktRegId': str.strip}
+FIELD_FORMATTERS.update((field, ProtocolPacker._format_inn) for field in ProtocolPacker.INN_FIELDS)
+FIELD_FORMATTERS.update((field, ProtocolPacker._format_phone) for field in ProtocolPacker.PHONE_FIELDS)
+
+
+def unpack_container_message(container_message_raw, fiscal_sign, fields=None):
+    return ProtocolPacker.unpack_container_message(container_message_raw, fiscal_sign, fields)
+
 
+def unpack_container_messages(messages, fields=None):
+    return ProtocolPacker.unpack_container_messages(messages, fields)
+
+
+def unpack_message(container_message_raw, fiscal_sign, version=None, validator=None):
+    """
+    Распаковать и провалидировать одно сообщение - общий шаг ofd.parallel, ofd.cache и ofd.server. Валидируется
+    документ в виде, который ждут json-схемы (ProtocolPacker.prepare_for_validation), а возвращается распакованный.
+    :param container_message_raw: контейнер сообщения в бинарном виде.
+    :param fiscal_sign: фискальный признак документа в бинарном виде.
+    :param version: версия протокола для валидации, например '1.05'. Если None, версия определяется по документу.
+    :param validator: DocumentValidator или NullValidator. Если None, валидация не выполняется.
+    :return: тройка (container_message, stlv_doc, error). Если документ распакован, но не прошёл валидацию, то
+    возвращается распакованный документ вместе с ошибкой валидации.
+    """
+    try:
+        container_message, stlv_doc = unpack_container_message(container_message_raw, fiscal_sign)
+    except Exception as e:
+        return None, None, e
 
-def unpack_container_from_base64(container_message_b64, fiscal_sign):
+    if validator is not None:
+        try:
+            validator.validate(ProtocolPacker.prepare_for_validation(container_message),
+                               version or get_doc_version(container_message))
+        except Exception as e:
+            return container_message, stlv_doc, e
+
+    return container_message, stlv_doc, None
+
+
+def unpack_container_from_base64(container_message_b64, fiscal_sign, fields=None):
     raw = base64.b64decode(container_message_b64)
-    return unpack_container_message(raw, fiscal_sign)
+    return unpack_container_message(raw, fiscal_sign, fields)
 
 
 def get_doc_name(doc):
@@ -1054,6 +1434,16 @@ def get_doc_body(doc):
     return doc[doc_name]
 
 
+def get_doc_version(doc, default='1.0'):
+    """
+    Get protocol version of the document from its fiscalDocumentFormatVer field (tag 1209)
+    :param doc: dict like {'doc_name': {//actual body//}}
+    :param default: version for documents without fiscalDocumentFormatVer
+    :return: version like '1.05'
+    """
+    return VERSIONS.get(get_body_field(doc, 'fiscalDocumentFormatVer'), default)
+
+
 def get_body_field(doc, field, default=None):
     """
     Get field from document body which is like {'receipt': {//actual body//}}
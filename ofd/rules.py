@@ -0,0 +1,183 @@
+# coding: utf8
+#
+#        Copyright (C) 2017 Yandex LLC
+#        http://yandex.com
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#
+"""
+Дополнительные логические проверки документов для DocumentValidator(..., rules=[...]).
+
+Правило - функция rule(doc_name, body), которая получает имя документа и его тело и бросает
+jsonschema.ValidationError, если документ не проходит проверку.
+"""
+
+from jsonschema import ValidationError
+
+from .protocol import PAYMENT_DOCUMENTS
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# суммы по видам оплаты, которые в сумме дают итог чека (totalSum)
+PAYMENT_SUM_FIELDS = ('cashTotalSum', 'ecashTotalSum', 'prepaidSum', 'creditSum', 'provisionSum')
+
+# реквизиты НДС итога чека: суммы НДС по ставкам и суммы расчёта с НДС 0% и без НДС. В ФФД 1.0 позиция содержит
+# те же реквизиты, в ФФД 1.05 и 1.1 - ставку (nds) и сумму НДС (ndsSum)
+VAT_FIELDS = ('nds18', 'nds10', 'nds0', 'ndsNo', 'ndsCalculated18', 'ndsCalculated10')
+
+# ставка НДС позиции (тег 1199) -> реквизит итога чека, в который входит сумма НДС позиции (ndsSum)
+VAT_SUM_FIELDS = {1: 'nds18', 2: 'nds10', 3: 'ndsCalculated18', 4: 'ndsCalculated10'}
+
+# ставка НДС позиции -> реквизит итога чека, в который входит сумма позиции (sum)
+VAT_TURNOVER_FIELDS = {5: 'nds0', 6: 'ndsNo'}
+
+# с какого количества позиций подсчёт по столбцам в NumPy быстрее цикла на Python: перенос значений из dict
+# в массивы стоит почти столько же, сколько сама проверка (см. benchmarks/items_rule.py)
+NUMPY_MIN_ITEMS = 1000
+
+
+def check_payment_totals(doc_name, body):
+    """
+    Проверить, что суммы по видам оплаты дают итог чека. Документы без итога или без сумм по видам оплаты
+    не проверяются.
+    """
+    if doc_name not in PAYMENT_DOCUMENTS or 'totalSum' not in body:
+        return
+
+    paid = [body[field] for field in PAYMENT_SUM_FIELDS if field in body]
+    if paid and sum(paid) != body['totalSum']:
+        raise ValidationError('Sum of payments {} is not equal to totalSum {}'.format(sum(paid), body['totalSum']),
+                              path=(doc_name, 'totalSum'))
+
+
+class ItemsConsistency(object):
+    def __init__(self, tolerance=1, use_numpy=None, check_vat=True):
+        """
+        Проверка позиций чека: сумма позиции равна цене, умноженной на количество, сумма всех позиций равна итогу
+        чека (totalSum), а НДС позиций по каждой ставке - реквизиту НДС итога чека (VAT_FIELDS). Позиции без цены или
+        количества не сверяются с суммой, итог не проверяется, если хотя бы у одной позиции нет суммы. НДС не
+        проверяется, если хотя бы у одной позиции нет данных об НДС, и для реквизитов НДС, которых нет в чеке.
+        :param tolerance: допустимое расхождение price * quantity и sum в копейках - касса округляет сумму позиции.
+        Для сумм НДС допускается такое расхождение на каждую позицию с этой ставкой.
+        :param use_numpy: считать суммы позиций по столбцам в NumPy. None - если NumPy установлен и в чеке не меньше
+        NUMPY_MIN_ITEMS позиций. НДС всегда считается на Python: реквизиты НДС есть не у всех позиций.
+        :param check_vat: сверять НДС позиций с реквизитами НДС итога чека.
+        """
+        if use_numpy and numpy is None:
+            raise ImportError('NumPy is required for use_numpy=True')
+        self.tolerance = tolerance
+        self.check_vat = check_vat
+        if use_numpy is None:
+            self._numpy_min_items = NUMPY_MIN_ITEMS if numpy is not None else None
+        else:
+            self._numpy_min_items = 0 if use_numpy else None
+
+    def __call__(self, doc_name, body):
+        items = body.get('items')
+        if doc_name not in PAYMENT_DOCUMENTS or not items:
+            return
+
+        if self._numpy_min_items is not None and len(items) >= self._numpy_min_items:
+            index, total = self._check_numpy(items)
+        else:
+            index, total = self._check_python(items)
+
+        if index is not None:
+            item = items[index]
+            raise ValidationError('Item sum {} is not equal to price {} * quantity {}'.format(
+                item['sum'], item['price'], item['quantity']), path=(doc_name, 'items', index, 'sum'))
+        if total is not None and 'totalSum' in body and total != body['totalSum']:
+            raise ValidationError('Sum of items {} is not equal to totalSum {}'.format(total, body['totalSum']),
+                                  path=(doc_name, 'totalSum'))
+
+        vat = self._vat_totals(items) if self.check_vat else None
+        if vat is not None:
+            for field in VAT_FIELDS:
+                if field not in body:
+                    continue
+                value, count = vat.get(field, (0, 0))
+                if abs(value - body[field]) > self.tolerance * count:
+                    raise ValidationError('Sum of items {} {} is not equal to {} {}'.format(
+                        field, value, field, body[field]), path=(doc_name, field))
+
+    def _check_python(self, items):
+        """
+        :return: пара (номер первой позиции с неверной суммой или None, сумма позиций или None).
+        """
+        tolerance = self.tolerance
+        total = 0
+        for index, item in enumerate(items):
+            item_sum = item.get('sum')
+            if item_sum is None:
+                total = None
+                continue
+            if total is not None:
+                total += item_sum
+
+            price = item.get('price')
+            quantity = item.get('quantity')
+            if price is not None and quantity is not None and abs(price * quantity - item_sum) > tolerance:
+                return index, None
+        return None, total
+
+    @staticmethod
+    def _vat_totals(items):
+        """
+        :return: dict реквизит НДС итога чека -> (сумма по позициям, количество позиций) или None, если хотя бы у
+        одной позиции нет данных об НДС.
+        """
+        totals = {}
+
+        def add(field, value):
+            total, count = totals.get(field, (0, 0))
+            totals[field] = (total + value, count + 1)
+
+        for item in items:
+            found = False
+            rate = item.get('nds')
+            if rate in VAT_SUM_FIELDS and 'ndsSum' in item:
+                add(VAT_SUM_FIELDS[rate], item['ndsSum'])
+                found = True
+            elif rate in VAT_TURNOVER_FIELDS and 'sum' in item:
+                add(VAT_TURNOVER_FIELDS[rate], item['sum'])
+                found = True
+            for field in VAT_FIELDS:
+                if field in item:
+                    add(field, item[field])
+                    found = True
+            if not found:
+                return None
+        return totals
+
+    def _check_numpy(self, items):
+        """
+        То же, что _check_python, но по столбцам: отсутствующие значения становятся NaN и не участвуют в сверке.
+        """
+        nan = float('nan')
+        count = len(items)
+        price = numpy.fromiter((item.get('price', nan) for item in items), numpy.float64, count)
+        quantity = numpy.fromiter((item.get('quantity', nan) for item in items), numpy.float64, count)
+        item_sum = numpy.fromiter((item.get('sum', nan) for item in items), numpy.float64, count)
+
+        # сравнение с NaN всегда ложно, поэтому позиции без цены, количества или суммы не считаются ошибочными
+        with numpy.errstate(invalid='ignore'):
+            wrong = numpy.abs(price * quantity - item_sum) > self.tolerance
+        if wrong.any():
+            return int(numpy.argmax(wrong)), None
+
+        if numpy.isnan(item_sum).any():
+            return None, None
+        # суммы в копейках - целые числа, float64 хранит их точно до 2^53
+        return None, int(item_sum.sum())
@@ -0,0 +1,529 @@
+# coding: utf8
+#
+#        Copyright (C) 2017 Yandex LLC
+#        http://yandex.com
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#
+
+"""
+Компиляция json-схем документов в функции проверки.
+
+Draft4Validator при каждой проверке обходит дерево схемы, ищет обработчик для каждого ключевого слова и разрешает
+$ref через RefResolver. Здесь схема один раз превращается в дерево замыканий: ссылки разрешены заранее, для каждого
+узла остаются только проверки его ключевых слов в том же порядке, в котором их выполняет jsonschema.
+
+Каждая проверка возвращает первую ошибку в виде jsonschema.ValidationError (с тем же сообщением, ключевым словом,
+path и schema_path, что и у Draft4Validator.validate) или None, если документ валиден.
+"""
+
+import json
+import numbers
+import os
+import re
+from collections.abc import Mapping
+from urllib.parse import unquote, urldefrag
+
+from jsonschema import Draft4Validator, SchemaError, ValidationError, validators
+
+ROOT_SCHEMA = 'document.schema.json'
+
+BUNDLE_SUFFIX = '.bundle.json'  # файл со всеми схемами версии: <version>.bundle.json
+
+# ключевые слова Draft 4, которые компилятор не поддерживает: схема с ними не компилируется
+UNSUPPORTED_KEYWORDS = {'additionalItems', 'additionalProperties', 'dependencies', 'patternProperties'}
+
+
+def _is_integer(instance):
+    return isinstance(instance, int) and not isinstance(instance, bool)
+
+
+def _is_number(instance):
+    return isinstance(instance, numbers.Number) and not isinstance(instance, bool)
+
+
+# классы документов, которые проверяются как json-объекты. Проверкам схемы у объекта нужны только in, [], len и обход
+# ключей, поэтому кроме dict подходят любые Mapping, например ofd.lazy.LazyDocument, и классы, добавленные
+# register_object_type. dict стоит первым - это быстрый путь для обычных документов
+_object_types = (dict, Mapping)
+
+
+def register_object_type(cls):
+    """
+    Проверять экземпляры cls как json-объекты. Нужно для отображений, которые не наследуют Mapping, например
+    ofd.records.Record. Можно использовать как декоратор класса.
+    """
+    global _object_types
+    _object_types += (cls,)
+    return cls
+
+
+def is_object(instance):
+    return isinstance(instance, _object_types)
+
+
+TYPE_CHECKERS = {
+    'array': lambda instance: isinstance(instance, list),
+    'boolean': lambda instance: isinstance(instance, bool),
+    'integer': _is_integer,
+    'null': lambda instance: instance is None,
+    'number': _is_number,
+    'object': is_object,
+    'string': lambda instance: isinstance(instance, str),
+}
+
+
+def _is_object_type(checker, instance):
+    return is_object(instance)
+
+
+# Draft4Validator, который проверяет как объекты те же документы, что и TYPE_CHECKERS['object']. Функция проверки
+# типа - не lambda, чтобы ошибки валидации, которые ссылаются на неё, можно было передать между процессами
+MappingDraft4Validator = validators.extend(Draft4Validator, type_checker=Draft4Validator.TYPE_CHECKER.redefine(
+    'object', _is_object_type))
+
+
+def _unbool(element, true=object(), false=object()):
+    """True и 1, False и 0 считаются разными значениями - как в jsonschema"""
+    if element is True:
+        return true
+    elif element is False:
+        return false
+    return element
+
+
+def _uniq(container):
+    try:
+        return len(set(_unbool(i) for i in container)) == len(container)
+    except TypeError:
+        seen = []
+        for element in container:
+            element = _unbool(element)
+            if element in seen:
+                return False
+            seen.append(element)
+    return True
+
+
+def _error(message, keyword, value, instance, schema):
+    return ValidationError(message, validator=keyword, validator_value=value, instance=instance, schema=schema,
+                           schema_path=(keyword,))
+
+
+# сообщения minLength, maxLength, minItems и maxItems различаются между версиями jsonschema: в 4.x для граничного
+# значения ("should be non-empty" при minLength 1 вместо "is too short"). Ключевое слово -> (граничное значение,
+# схема и экземпляр с ошибкой для граничного значения, схема и экземпляр с ошибкой для остальных значений)
+_SIZE_MESSAGE_PROBES = {
+    'minLength': (1, ({'minLength': 1}, ''), ({'minLength': 2}, '')),
+    'maxLength': (0, ({'maxLength': 0}, 'x'), ({'maxLength': 1}, 'xx')),
+    'minItems': (1, ({'minItems': 1}, []), ({'minItems': 2}, [])),
+    'maxItems': (0, ({'maxItems': 0}, [0]), ({'maxItems': 1}, [0, 0])),
+}
+
+# ключевое слово -> (граничное значение, текст ошибки для него, текст ошибки для остальных значений)
+_size_messages = {}
+
+
+def _probe_message(schema, instance):
+    """Текст ошибки установленного jsonschema после repr(instance)"""
+    error = next(Draft4Validator(schema).iter_errors(instance))
+    return error.message[len(repr(instance)):]
+
+
+def _keyword_error(keyword, value, instance, schema):
+    """
+    Ошибка minLength, maxLength, minItems или maxItems с тем же текстом, что у установленного jsonschema. Текст
+    один раз на процесс берётся из ошибок Draft4Validator на маленьких схемах.
+    """
+    messages = _size_messages.get(keyword)
+    if messages is None:
+        special_value, special_probe, probe = _SIZE_MESSAGE_PROBES[keyword]
+        messages = _size_messages[keyword] = special_value, _probe_message(*special_probe), _probe_message(*probe)
+    special_value, special_message, message = messages
+    return _error('%r' % (instance,) + (special_message if value == special_value else message), keyword, value,
+                  instance, schema)
+
+
+def _descended(error, path, keyword, schema_path):
+    """Дописать в начало путей ошибки шаг, на котором проверка спустилась в дочернюю схему"""
+    if path is not None:
+        error.path.appendleft(path)
+    error.schema_path.appendleft(schema_path)
+    error.schema_path.appendleft(keyword)
+    return error
+
+
+class SchemaCompiler(object):
+    def __init__(self, path, files=None):
+        """
+        Компилятор схем одной версии протокола.
+        :param path: директория со схемами, относительно которой разрешаются ссылки на файлы.
+        :param files: уже загруженные схемы, dict имя файла -> схема. Такие файлы не читаются с диска.
+        """
+        self._path = path
+        self._files = {}
+        self._nodes = {}  # (файл, json pointer) -> скомпилированная проверка
+        for filename, schema in (files or {}).items():
+            self._files[os.path.normpath(os.path.join(path, filename))] = schema
+
+    def load(self, filename):
+        """
+        Загрузить файл схемы. Каждый файл читается один раз.
+        """
+        full_path = os.path.normpath(os.path.join(self._path, filename))
+        schema = self._files.get(full_path)
+        if schema is None:
+            with open(full_path, encoding='utf-8') as fh:
+                schema = self._files[full_path] = json.loads(fh.read())
+        return schema
+
+    def compile_ref(self, ref, filename):
+        """
+        Скомпилировать схему по ссылке, например '#' - корневая схема файла.
+        :param ref: значение $ref.
+        :param filename: файл, относительно которого разрешается ссылка.
+        :return: функция check(instance), которая возвращает первую ошибку или None.
+        """
+        filename, fragment, node = self._resolve(ref, filename)
+        key = (filename, fragment)
+        compiled = self._nodes.get(key)
+        if compiled is None:
+            # на время компиляции оставляем косвенную ссылку, чтобы рекурсивные схемы не зацикливались
+            self._nodes[key] = lambda instance: self._nodes[key](instance)
+            compiled = self._nodes[key] = self.compile(node, filename)
+        return compiled
+
+    def compile(self, schema, filename):
+        """
+        Скомпилировать узел схемы.
+        :param schema: узел схемы.
+        :param filename: файл, в котором находится узел, - относительно него разрешаются ссылки.
+        :return: функция check(instance), которая возвращает первую ошибку или None.
+        """
+        if '$ref' in schema:
+            # как и в jsonschema, остальные ключевые слова рядом с $ref игнорируются
+            return self.compile_ref(schema['$ref'], filename)
+
+        checks = []
+        for keyword, value in schema.items():
+            if keyword in UNSUPPORTED_KEYWORDS:
+                raise SchemaError('Keyword {} is not supported by compiled validator'.format(keyword))
+            compile_keyword = getattr(self, '_compile_' + keyword, None)
+            if compile_keyword is not None:
+                checks.append(compile_keyword(value, schema, filename))
+
+        if not checks:
+            return lambda instance: None
+        if len(checks) == 1:
+            return checks[0]
+
+        def check(instance):
+            for check_keyword in checks:
+                error = check_keyword(instance)
+                if error is not None:
+                    return error
+            return None
+        return check
+
+    def _resolve(self, ref, filename):
+        url, fragment = urldefrag(ref)
+        if url:
+            filename = os.path.join(os.path.dirname(filename), url)
+        node = self.load(filename)
+        for part in unquote(fragment).split('/')[1:]:
+            part = part.replace('~1', '/').replace('~0', '~')
+            if isinstance(node, list):
+                part = int(part)
+            try:
+                node = node[part]
+            except (KeyError, IndexError):
+                raise SchemaError('Unresolvable JSON pointer: {}'.format(ref))
+        return os.path.normpath(filename), fragment, node
+
+    def _compile_type(self, value, schema, filename):
+        types = value if isinstance(value, list) else [value]
+        try:
+            checkers = [TYPE_CHECKERS[ty] for ty in types]
+        except KeyError as e:
+            raise SchemaError('Unknown type {}'.format(e))
+        message = '%r is not of type ' + ', '.join(repr(ty) for ty in types)
+
+        if len(checkers) == 1:
+            is_type = checkers[0]
+
+            def check(instance):
+                if not is_type(instance):
+                    return _error(message % (instance,), 'type', value, instance, schema)
+            return check
+
+        def check(instance):
+            if not any(is_type(instance) for is_type in checkers):
+                return _error(message % (instance,), 'type', value, instance, schema)
+        return check
+
+    def _compile_enum(self, value, schema, filename):
+        def check(instance):
+            if instance == 0 or instance == 1:
+                unbooled = _unbool(instance)
+                if all(unbooled != _unbool(each) for each in value):
+                    return _error('%r is not one of %r' % (instance, value), 'enum', value, instance, schema)
+            elif instance not in value:
+                return _error('%r is not one of %r' % (instance, value), 'enum', value, instance, schema)
+        return check
+
+    def _compile_minimum(self, value, schema, filename):
+        exclusive = schema.get('exclusiveMinimum', False)
+        cmp = 'less than or equal to' if exclusive else 'less than'
+
+        def check(instance):
+            if _is_number(instance) and (instance <= value if exclusive else instance < value):
+                return _error('%r is %s the minimum of %r' % (instance, cmp, value), 'minimum', value, instance,
+                              schema)
+        return check
+
+    def _compile_maximum(self, value, schema, filename):
+        exclusive = schema.get('exclusiveMaximum', False)
+        cmp = 'greater than or equal to' if exclusive else 'greater than'
+
+        def check(instance):
+            if _is_number(instance) and (instance >= value if exclusive else instance > value):
+                return _error('%r is %s the maximum of %r' % (instance, cmp, value), 'maximum', value, instance,
+                              schema)
+        return check
+
+    def _compile_multipleOf(self, value, schema, filename):
+        def check(instance):
+            if not _is_number(instance):
+                return None
+            if isinstance(value, float):
+                quotient = instance / value
+                failed = int(quotient) != quotient
+            else:
+                failed = instance % value
+            if failed:
+                return _error('%r is not a multiple of %r' % (instance, value), 'multipleOf', value, instance,
+                              schema)
+        return check
+
+    def _compile_minLength(self, value, schema, filename):
+        def check(instance):
+            if isinstance(instance, str) and len(instance) < value:
+                return _keyword_error('minLength', value, instance, schema)
+        return check
+
+    def _compile_maxLength(self, value, schema, filename):
+        def check(instance):
+            if isinstance(instance, str) and len(instance) > value:
+                return _keyword_error('maxLength', value, instance, schema)
+        return check
+
+    def _compile_pattern(self, value, schema, filename):
+        search = re.compile(value).search
+
+        def check(instance):
+            if isinstance(instance, str) and not search(instance):
+                return _error('%r does not match %r' % (instance, value), 'pattern', value, instance, schema)
+        return check
+
+    def _compile_minItems(self, value, schema, filename):
+        def check(instance):
+            if isinstance(instance, list) and len(instance) < value:
+                return _keyword_error('minItems', value, instance, schema)
+        return check
+
+    def _compile_maxItems(self, value, schema, filename):
+        def check(instance):
+            if isinstance(instance, list) and len(instance) > value:
+                return _keyword_error('maxItems', value, instance, schema)
+        return check
+
+    def _compile_uniqueItems(self, value, schema, filename):
+        if not value:
+            return lambda instance: None
+
+        def check(instance):
+            if isinstance(instance, list) and not _uniq(instance):
+                return _error('%r has non-unique elements' % (instance,), 'uniqueItems', value, instance, schema)
+        return check
+
+    def _compile_minProperties(self, value, schema, filename):
+        def check(instance):
+            if is_object(instance) and len(instance) < value:
+                return _error('%r does not have enough properties' % (instance,), 'minProperties', value, instance,
+                              schema)
+        return check
+
+    def _compile_maxProperties(self, value, schema, filename):
+        def check(instance):
+            if is_object(instance) and len(instance) > value:
+                return _error('%r has too many properties' % (instance,), 'maxProperties', value, instance, schema)
+        return check
+
+    def _compile_required(self, value, schema, filename):
+        def check(instance):
+            if is_object(instance):
+                for name in value:
+                    if name not in instance:
+                        return _error('%r is a required property' % name, 'required', value, instance, schema)
+        return check
+
+    def _compile_properties(self, value, schema, filename):
+        properties = [(name, self.compile(subschema, filename)) for name, subschema in value.items()]
+
+        def check(instance):
+            if is_object(instance):
+                for name, check_property in properties:
+                    if name in instance:
+                        error = check_property(instance[name])
+                        if error is not None:
+                            return _descended(error, name, 'properties', name)
+        return check
+
+    def _compile_items(self, value, schema, filename):
+        if isinstance(value, dict):
+            check_item = self.compile(value, filename)
+
+            def check(instance):
+                if isinstance(instance, list):
+                    for index, item in enumerate(instance):
+                        error = check_item(item)
+                        if error is not None:
+                            error.path.appendleft(index)
+                            error.schema_path.appendleft('items')
+                            return error
+            return check
+
+        items = [self.compile(subschema, filename) for subschema in value]
+
+        def check(instance):
+            if isinstance(instance, list):
+                for index, (item, check_item) in enumerate(zip(instance, items)):
+                    error = check_item(item)
+                    if error is not None:
+                        return _descended(error, index, 'items', index)
+        return check
+
+    def _compile_allOf(self, value, schema, filename):
+        subschemas = [self.compile(subschema, filename) for subschema in value]
+
+        def check(instance):
+            for index, check_subschema in enumerate(subschemas):
+                error = check_subschema(instance)
+                if error is not None:
+                    return _descended(error, None, 'allOf', index)
+        return check
+
+    def _failed_subschemas(self, subschemas, instance):
+        """
+        Ошибки всех подсхем anyOf/oneOf - они попадают в context итоговой ошибки. В отличие от jsonschema, который
+        кладёт в context все ошибки каждой подсхемы, здесь от подсхемы берётся только первая ошибка: для подсхем
+        с несколькими ошибками context и jsonschema.exceptions.best_match могут отличаться от Draft4Validator.
+        """
+        errors = []
+        for index, check_subschema in enumerate(subschemas):
+            error = check_subschema(instance)
+            if error is None:
+                return index, errors
+            error.schema_path.appendleft(index)
+            errors.append(error)
+        return None, errors
+
+    def _compile_anyOf(self, value, schema, filename):
+        subschemas = [self.compile(subschema, filename) for subschema in value]
+
+        def check(instance):
+            index, errors = self._failed_subschemas(subschemas, instance)
+            if index is None:
+                error = _error('%r is not valid under any of the given schemas' % (instance,), 'anyOf', value,
+                               instance, schema)
+                error.context = errors
+                for context_error in errors:
+                    context_error.parent = error
+                return error
+        return check
+
+    def _compile_oneOf(self, value, schema, filename):
+        subschemas = [self.compile(subschema, filename) for subschema in value]
+
+        def check(instance):
+            first_valid, errors = self._failed_subschemas(subschemas, instance)
+            if first_valid is None:
+                error = _error('%r is not valid under any of the given schemas' % (instance,), 'oneOf', value,
+                               instance, schema)
+                error.context = errors
+                for context_error in errors:
+                    context_error.parent = error
+                return error
+
+            more_valid = [value[index] for index in range(first_valid + 1, len(subschemas))
+                          if subschemas[index](instance) is None]
+            if more_valid:
+                more_valid.append(value[first_valid])
+                reprs = ', '.join(repr(subschema) for subschema in more_valid)
+                return _error('%r is valid under each of %s' % (instance, reprs), 'oneOf', value, instance, schema)
+        return check
+
+    def _compile_not(self, value, schema, filename):
+        check_subschema = self.compile(value, filename)
+
+        def check(instance):
+            if check_subschema(instance) is None:
+                return _error('%r is not allowed for %r' % (value, instance), 'not', value, instance, schema)
+        return check
+
+
+class CompiledValidator(object):
+    def __init__(self, path, ref='#', compiler=None):
+        """
+        Валидатор документов по скомпилированной схеме, совместимый с Draft4Validator.validate.
+        :param path: путь до файла схемы, например <path>/1.05/document.schema.json.
+        :param ref: ссылка на проверяемую схему относительно файла, по умолчанию - корневая схема файла.
+        :param compiler: SchemaCompiler для директории схемы, если нужно переиспользовать уже загруженные и
+        скомпилированные файлы.
+        """
+        self.compiler = compiler or SchemaCompiler(os.path.dirname(path))
+        self._check = self.compiler.compile_ref(ref, os.path.basename(path))
+
+    def validate(self, instance):
+        """
+        :raise ValidationError: первая ошибка валидации - та же, что бросает Draft4Validator.validate.
+        """
+        error = self._check(instance)
+        if error is not None:
+            raise error
+
+    def is_valid(self, instance):
+        return self._check(instance) is None
+
+    def first_error(self, instance):
+        """
+        :return: первая ошибка валидации или None.
+        """
+        return self._check(instance)
+
+
+# загруженные бандлы: один разбор файла на процесс, при fork дочерние процессы получают уже разобранные схемы
+_bundles = {}
+
+
+def load_bundle(path):
+    """
+    Загрузить бандл схем, собранный ofd.bundle. Каждый файл читается и разбирается один раз на процесс.
+    Загруженную схему изменять нельзя - она общая для всех валидаторов.
+    :param path: путь до файла <version>.bundle.json.
+    """
+    path = os.path.abspath(path)
+    bundle = _bundles.get(path)
+    if bundle is None:
+        with open(path, 'rb') as fh:
+            bundle = _bundles[path] = json.loads(fh.read().decode('utf-8'))
+    return bundle
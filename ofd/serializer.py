@@ -0,0 +1,187 @@
+# coding: utf8
+#
+#        Copyright (C) 2017 Yandex LLC
+#        http://yandex.com
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#
+"""
+Потоковая сериализация документов из бинарного контейнера в JSON для ФНС, без промежуточного dict документа. На
+каждом уровне STLV сначала индексируются заголовки тегов (как в LazyDocument), затем значения распаковываются по
+одному и сразу пишутся в файлоподобный объект. Результат совпадает с json.dumps(unpack_container_message(...)[0]).
+"""
+
+import binascii
+import json.encoder
+
+from .protocol import DOCUMENTS, FIELD_FORMATTERS, FISCAL_SIGN_OPERATOR, FVLN, REPEATED_CARDINALITY, STLV, \
+    TLV_HEADER, ByteArray, String
+
+encode_string = json.encoder.encode_basestring_ascii
+
+# таблицы (parent_ty, ty) -> (ключ JSON вместе с ': ', stlv или None, кодировщик значения, is_repeated). Заполняются
+# при сериализации, отдельно без форматирования и с форматированием реквизитов
+JSON_CODECS = {False: {}, True: {}}
+
+DOC_NAME_KEY = encode_string('docName') + ': '
+RAW_DATA_KEY = encode_string('rawData') + ': '
+CODE_KEY = encode_string('code') + ': '
+MESSAGE_FISCAL_SIGN_KEY = encode_string('messageFiscalSign') + ': '
+
+
+def _encode_scalar(value):
+    """
+    Закодировать значение тега так же, как json.dumps.
+    """
+    if isinstance(value, str):
+        return encode_string(value)
+    if isinstance(value, int):
+        return int.__repr__(value)
+    return json.dumps(value)
+
+
+def _value_encoder(unpack, encode, formatter=None):
+    """
+    Кодировщик значения тега: распаковка, форматирование реквизита (если есть) и кодирование в JSON.
+    """
+    if formatter is None:
+        def encode_value(data):
+            return encode(unpack(data))
+    else:
+        def encode_value(data):
+            return encode(formatter(unpack(data)))
+    return encode_value
+
+
+def _json_codec(stlv, ty, formatted):
+    tag = stlv._select_tag_by_parent(ty)
+    formatter = FIELD_FORMATTERS.get(tag.name) if formatted else None
+    if isinstance(tag, STLV):
+        # вложенные STLV не форматируются, как и в format_message_fields
+        nested, encode = tag, None
+    elif formatter is not None:
+        # форматирование может изменить тип значения
+        nested, encode = None, _value_encoder(tag.unpack, _encode_scalar, formatter)
+    elif isinstance(tag, (String, ByteArray)):
+        nested, encode = None, _value_encoder(tag.unpack, encode_string)
+    elif isinstance(tag, FVLN):
+        nested, encode = None, _value_encoder(tag.unpack, float.__repr__)
+    else:
+        nested, encode = None, _value_encoder(tag.unpack, _encode_scalar)
+    return encode_string(tag.name) + ': ', nested, encode, tag.cardinality in REPEATED_CARDINALITY
+
+
+def _index_members(stlv, view, formatted):
+    """
+    Проиндексировать теги из значения STLV тега, ничего не распаковывая.
+    :return: dict ключ JSON -> (кодек, срез значения или список срезов для повторяющихся тегов). Порядок ключей и
+    выбор значения для нескольких вхождений неповторяющегося тега - как в STLV.unpack.
+    """
+    if len(view) > stlv.maxlen:
+        raise ValueError('STLV actual size is greater than maximum')
+
+    members = {}
+    codecs = JSON_CODECS[formatted]
+    parent_ty = stlv.ty
+    offset = 0
+    end = len(view)
+    while offset < end:
+        ty, length = TLV_HEADER.unpack_from(view, offset)
+        offset += TLV_HEADER.size
+
+        codec = codecs.get((parent_ty, ty))
+        if codec is None:
+            codec = codecs[(parent_ty, ty)] = _json_codec(stlv, ty, formatted)
+        key = codec[0]
+        value = view[offset:offset + length]
+
+        if codec[3]:
+            if key in members:
+                members[key][1].append(value)
+            else:
+                members[key] = (codec, [value])
+        else:
+            members[key] = (codec, value)
+        offset += length
+
+    return members
+
+
+def _write_value(codec, value, write):
+    if codec[1] is None:
+        write(codec[2](value))
+    else:
+        _write_members(_index_members(codec[1], value, False), write)
+
+
+def _write_members(members, write, tail=()):
+    """
+    Записать объект JSON: теги по одному, затем готовые пары (ключ, значение) из tail.
+    """
+    separator = '{'
+    for key, (codec, value) in members.items():
+        write(separator + key)
+        separator = ', '
+        if codec[3]:
+            write('[')
+            _write_value(codec, value[0], write)
+            for item in value[1:]:
+                write(', ')
+                _write_value(codec, item, write)
+            write(']')
+        else:
+            _write_value(codec, value, write)
+    for key, text in tail:
+        write(separator + key + text)
+        separator = ', '
+    write('{}' if separator == '{' else '}')
+
+
+def _write_container_message(container_message_raw, fiscal_sign, write):
+    ty, length = TLV_HEADER.unpack_from(container_message_raw)
+    stlv_doc = DOCUMENTS[ty]
+
+    # заголовки всего документа проверяются до первой записи, ошибки в значениях тегов - по ходу записи
+    members = _index_members(stlv_doc, memoryview(container_message_raw)[4:4 + length], True)
+    # тег 1000 (docName) не включается в док для ФНС
+    members.pop(DOC_NAME_KEY, None)
+    tail = ((RAW_DATA_KEY, encode_string(binascii.b2a_base64(container_message_raw + fiscal_sign)[:-1]
+                                         .decode('ascii'))),
+            (CODE_KEY, int.__repr__(ty)),
+            (MESSAGE_FISCAL_SIGN_KEY, _encode_scalar(FISCAL_SIGN_OPERATOR.unpack(fiscal_sign))))
+
+    write('{' + encode_string(stlv_doc.name) + ': ')
+    _write_members(members, write, tail)
+    write('}')
+
+
+def dump_container_message(container_message_raw, fiscal_sign, fp):
+    """
+    Распаковать документ из контейнера и записать его JSON в файлоподобный объект, как json.dump. Значения пишутся
+    по одному, по мере распаковки тегов, поэтому документ целиком в памяти не собирается. Реквизиты, rawData, code
+    и messageFiscalSign и их форматирование такие же, как у unpack_container_message.
+    :param container_message_raw: тело контейнера в бинарном виде.
+    :param fiscal_sign: ФПО в бинарном виде.
+    :param fp: объект с методом write, принимающим str (только ASCII символы). Если значение тега не распаковалось,
+    исключение выбрасывается после частичной записи документа.
+    """
+    _write_container_message(container_message_raw, fiscal_sign, fp.write)
+
+
+def dumps_container_message(container_message_raw, fiscal_sign):
+    """
+    То же, что dump_container_message, но возвращает строку.
+    :return: str с JSON вида {"<имя документа>": {...}}, только ASCII символы.
+    """
+    parts = []
+    _write_container_message(container_message_raw, fiscal_sign, parts.append)
+    return ''.join(parts)
@@ -0,0 +1,243 @@
+# coding: utf8
+#
+#        Copyright (C) 2017 Yandex LLC
+#        http://yandex.com
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#
+
+"""
+Asyncio сервер ОФД: принимает сообщения от касс, распаковывает документы, передаёт их обработчику и отвечает
+"подтверждением оператора".
+
+Как и эмулятор из ./example, сервер работает без шифровальной машины: входящие сообщения должны быть
+незашифрованными, а ФПО в подтверждение не добавляется.
+"""
+
+import asyncio
+import logging
+import time
+
+from .parallel import get_validator
+from .protocol import DOCS_BY_NAME, FLK_ERROR, DocCodes, FrameHeader, InvalidCrc, SessionHeader, String, pack_json, \
+    unpack_message
+from .stream import SessionStreamParser
+
+logger = logging.getLogger(__name__)
+
+READ_SIZE = 64 * 1024  # размер куска, читаемого из сокета за раз
+
+RESPONSE_OK = 0  # код ответа ОФД при успешном получении документа
+
+
+def create_response(in_session, in_header, ofd_inn, response_code=RESPONSE_OK):
+    """
+    Запаковать в протокол "подтверждение оператора" от ОФД к кассе. Номер ФН и номер ФД берутся из заголовков
+    входящего сообщения, поэтому подтверждение можно сформировать и для документа, который не удалось распаковать.
+    :param in_session: заголовок сессии входящего сообщения
+    :param in_header: заголовок контейнера входящего сообщения
+    :param ofd_inn: ИНН ОФД
+    :param response_code: код ответа ОФД
+    :return: сообщение в бинарном виде
+    """
+    message = {
+        'operatorAck': {
+            'ofdInn': ofd_inn,
+            'fiscalDriveNumber': in_session.fs_id.decode('ascii').strip(),
+            'fiscalDocumentNumber': in_header.docnum(),
+            'dateTime': int(time.time()),
+            'messageToFn': {'ofdResponseCode': response_code}
+            # Теги ФПО и ФПП не указаны, т.к. должны быть добавлены реальным шифровальным комплексом
+        }
+    }
+    message_raw = pack_json(message, docs=DOCS_BY_NAME)
+
+    # в реальных ОФД FrameHeader формируется автоматически шифровальной машиной
+    out_header = FrameHeader(length=FrameHeader.STRUCT.size + len(message_raw),
+                             crc=0,
+                             doctype=DocCodes.OPERATOR_ACK,
+                             devnum=in_header.devnum,
+                             docnum=in_header._docnum,
+                             extra1=in_header.extra1,
+                             extra2=String.pack('0'.rjust(12)))
+
+    out_header.recalculate_crc(message_raw)
+    container_raw = out_header.pack() + message_raw
+
+    out_session = SessionHeader(pva=in_session.pva, fs_id=in_session.fs_id, length=len(container_raw), crc=0,
+                                flags=SessionHeader.SESSION_FLAGS)
+
+    return out_session.pack() + container_raw
+
+
+def decode_message(body, config):
+    """
+    Распаковать и провалидировать тело сообщения. Функция выполняется в том числе в пуле потоков или процессов,
+    валидатор создаётся один раз на процесс.
+    :param body: тело контейнера в бинарном виде.
+    :param config: None или пара (versions, options) - аргументы DocumentValidator. Версия для валидации
+    определяется по документу.
+    :return: пара (doc, error).
+    """
+    validator = get_validator(config) if config is not None else None
+    doc, _, error = unpack_message(body, b'', validator=validator)
+    return doc, error
+
+
+class Server(object):
+    def __init__(self, ofd_inn, handler=None, max_concurrency=1024, read_timeout=60.0,
+                 max_len=SessionHeader.MAX_LEN, versions=None, validator_options=None, executor=None,
+                 inline_threshold=2048, max_pending=64, check_crc=False):
+        """
+        Сервер ОФД. Соединения поддерживают keep-alive: касса может отправлять несколько сообщений подряд, не
+        дожидаясь ответов, ответы отправляются в порядке получения сообщений.
+        :param ofd_inn: ИНН ОФД для "подтверждения оператора".
+        :param handler: корутина handler(doc, session, header), которая вызывается для каждого распакованного
+        документа. Может вернуть код ответа ОФД, None означает успешное получение документа. Если обработчик
+        бросает исключение, касса получает код ответа FLK_ERROR.
+        :param max_concurrency: максимальное количество сообщений, которые обрабатываются одновременно во всех
+        соединениях. Остальные сообщения ждут своей очереди, не вычитывая новые данные из сокета.
+        :param read_timeout: время в секундах, за которое касса должна прислать очередную порцию данных, иначе
+        соединение закрывается. None - без ограничения.
+        :param max_len: максимальная длина контейнера.
+        :param versions: поддерживаемые версии протокола для DocumentValidator. Если None, документы не валидируются.
+        Документ, не прошедший валидацию, не передаётся обработчику, касса получает код ответа FLK_ERROR.
+        :param validator_options: остальные аргументы DocumentValidator, например {'path': 'schemas'}.
+        :param executor: concurrent.futures.Executor (пул потоков или процессов) для распаковки и валидации
+        документов. Если None, документы обрабатываются прямо в event loop.
+        :param inline_threshold: документы, у которых длина контейнера по заголовку сессии не больше этого
+        значения, распаковываются прямо в event loop - передача в пул для них дороже самой распаковки.
+        :param max_pending: максимальное количество документов в очереди пула. Когда очередь заполнена,
+        соединения с большими документами ждут, а маленькие документы продолжают обрабатываться.
+        :param check_crc: проверять CRC входящих сообщений до распаковки документа. При неверном CRC соединение
+        закрывается без ответа, и касса отправит документ повторно.
+        """
+        self._ofd_inn = ofd_inn
+        self._handler = handler
+        self._max_concurrency = max_concurrency
+        self._read_timeout = read_timeout
+        self._max_len = max_len
+        self._check_crc = check_crc
+        self._config = (tuple(versions), tuple(sorted((validator_options or {}).items()))) if versions else None
+        self._executor = executor
+        self._inline_threshold = inline_threshold
+        self._max_pending = max_pending
+        self._server = None
+        self._connections = set()
+        # примитивы синхронизации до Python 3.10 привязываются к текущему event loop при создании, поэтому
+        # создаются в start() - в том loop, где работает сервер
+        self._semaphore = None
+        self._pending = None
+        self._idle = None
+
+    async def start(self, host=None, port=0, **kwargs):
+        """
+        Запустить сервер.
+        :return: asyncio.AbstractServer.
+        """
+        self._semaphore = asyncio.Semaphore(self._max_concurrency)
+        self._pending = asyncio.Semaphore(self._max_pending)
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._server = await asyncio.start_server(self.handle_connection, host=host, port=port, **kwargs)
+        return self._server
+
+    def close(self):
+        """
+        Перестать принимать новые соединения и закрыть открытые.
+        """
+        if self._server is not None:
+            self._server.close()
+        for wr in self._connections:
+            wr.close()
+
+    async def wait_closed(self):
+        """
+        Дождаться закрытия сервера и завершения обработки всех соединений.
+        """
+        if self._server is not None:
+            await self._server.wait_closed()
+        if self._idle is not None:
+            await self._idle.wait()
+
+    async def handle_connection(self, rd, wr):
+        """
+        Обработать соединение с кассой.
+        :param rd: readable stream.
+        :param wr: writable stream.
+        """
+        parser = SessionStreamParser(max_len=self._max_len, check_crc=self._check_crc)
+        self._connections.add(wr)
+        self._idle.clear()
+        try:
+            while True:
+                chunk = await asyncio.wait_for(rd.read(READ_SIZE), self._read_timeout)
+                if not chunk:
+                    parser.close()
+                    break
+
+                for session, header, body in parser.feed(chunk):
+                    async with self._semaphore:
+                        response = await self.process_message(session, header, body)
+                    if response:
+                        wr.write(response)
+                        await wr.drain()
+        except asyncio.TimeoutError:
+            logger.info('connection closed by read timeout')
+        except (ConnectionError, asyncio.IncompleteReadError):
+            logger.info('connection closed by client')
+        except InvalidCrc as e:
+            logger.warning('closing connection: %s', e)
+        except Exception:
+            logger.exception('failed to read incoming message, closing connection')
+        finally:
+            wr.close()
+            self._connections.discard(wr)
+            if not self._connections:
+                self._idle.set()
+
+    async def process_message(self, session, header, body):
+        """
+        Распаковать и обработать одно сообщение.
+        :return: ответ кассе в бинарном виде или None, если отвечать не нужно.
+        """
+        if header is None:
+            return None
+
+        doc, error = await self.decode(session, body)
+        if error is not None:
+            logger.error('failed to unpack document %d from %s: %r', header.docnum(), session.fs_id, error)
+            return create_response(session, header, self._ofd_inn, FLK_ERROR)
+
+        response_code = RESPONSE_OK
+        if self._handler is not None:
+            try:
+                result = await self._handler(doc, session, header)
+            except Exception:
+                logger.exception('failed to handle document %d from %s', header.docnum(), session.fs_id)
+                result = FLK_ERROR
+            if result is not None:
+                response_code = result
+
+        return create_response(session, header, self._ofd_inn, response_code)
+
+    async def decode(self, session, body):
+        """
+        Распаковать и провалидировать документ: маленькие документы - прямо в event loop, большие - в пуле.
+        :return: пара (doc, error).
+        """
+        if self._executor is None or session.length <= self._inline_threshold:
+            return decode_message(bytes(body), self._config)
+
+        async with self._pending:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, decode_message, bytes(body), self._config)
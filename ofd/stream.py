@@ -0,0 +1,157 @@
+# coding: utf8
+#
+#        Copyright (C) 2017 Yandex LLC
+#        http://yandex.com
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#
+
+"""
+Разбор потока сообщений сеансового уровня.
+
+Поток - это сообщения, записанные одно за другим: заголовок сессии (SessionHeader), за которым следует контейнер
+длиной SessionHeader.length - заголовок контейнера (FrameHeader) и тело. Поток может приходить из сокета, из дампа
+трафика или из файла и нарезаться на куски произвольной длины.
+"""
+
+from .protocol import FrameHeader, InvalidCrc, ProtocolError, SessionHeader, verify_container_crc, \
+    verify_session_crc
+
+SESSION_HEADER_SIZE = SessionHeader.STRUCT.size
+FRAME_HEADER_SIZE = FrameHeader.STRUCT.size
+
+
+class SessionStreamParser(object):
+    def __init__(self, max_len=SessionHeader.MAX_LEN, check_crc=False):
+        """
+        Инкрементальный разборщик потока сообщений. Тело сообщения возвращается как memoryview на переданные данные
+        без копирования, поэтому переданные в feed буферы не должны изменяться после вызова. Копируются только
+        сообщения, разрезанные между двумя кусками потока.
+        После ошибки разбора поток считается рассинхронизированным, и разборщик использовать больше нельзя.
+        :param max_len: максимальная длина контейнера, по умолчанию SessionHeader.MAX_LEN.
+        :param check_crc: проверять CRC контейнера сразу после разбора его заголовка, а также CRC сеансового уровня,
+        если согласно флагам заголовка сессии он посчитан. Сообщение с неверным CRC вызывает InvalidCrc.
+        """
+        self._max_len = max_len
+        self._check_crc = check_crc
+        self._pending = bytearray()  # начало сообщения, которое не уместилось в предыдущий кусок
+        self._pending_size = SESSION_HEADER_SIZE  # сколько байт нужно для разбора начала сообщения
+
+    @property
+    def buffered(self):
+        """Количество байт недочитанного сообщения"""
+        return len(self._pending)
+
+    def feed(self, data):
+        """
+        Передать очередной кусок потока.
+        :param data: bytes или memoryview произвольной длины.
+        :raise ValueError: если заголовок сообщения некорректный.
+        :raise ProtocolError: если длина контейнера больше максимальной или меньше заголовка контейнера.
+        :raise InvalidCrc: если включена проверка CRC и CRC сообщения не совпадает.
+        :return: list троек (SessionHeader, FrameHeader, body) для всех сообщений, полностью полученных к этому
+        моменту. Для сообщения без контейнера FrameHeader равен None, а body пустой.
+        """
+        view = memoryview(data)
+        messages = []
+
+        # сначала дописываем сообщение, начало которого пришло в предыдущих кусках
+        while self._pending and view:
+            take = self._pending_size - len(self._pending)
+            self._pending += view[:take]
+            view = view[take:]
+            if len(self._pending) < self._pending_size:
+                break
+
+            if len(self._pending) == SESSION_HEADER_SIZE:
+                self._pending_size = SESSION_HEADER_SIZE + self._parse_session(self._pending).length
+            if len(self._pending) == self._pending_size:
+                messages.append(self._parse_message(memoryview(bytes(self._pending)), 0))
+                self._pending = bytearray()
+                self._pending_size = SESSION_HEADER_SIZE
+
+        if self._pending:
+            return messages
+
+        # остальные сообщения разбираем прямо в переданном куске
+        offset = 0
+        end = len(view)
+        while end - offset >= SESSION_HEADER_SIZE:
+            session = self._parse_session(view[offset:offset + SESSION_HEADER_SIZE])
+            size = SESSION_HEADER_SIZE + session.length
+            if end - offset < size:
+                break
+            messages.append(self._parse_message(view, offset, session))
+            offset += size
+
+        if offset < end:
+            self._pending = bytearray(view[offset:])
+            if len(self._pending) >= SESSION_HEADER_SIZE:
+                self._pending_size = SESSION_HEADER_SIZE + self._parse_session(
+                    self._pending[:SESSION_HEADER_SIZE]).length
+
+        return messages
+
+    def close(self):
+        """
+        Завершить разбор потока.
+        :raise ProtocolError: если в потоке осталось недочитанное сообщение.
+        """
+        if self._pending:
+            raise ProtocolError('Stream ends with incomplete message: {} of {} bytes received'
+                                .format(len(self._pending), self._pending_size))
+
+    def _parse_session(self, data):
+        session = SessionHeader.unpack_from(data)
+        if session.length > self._max_len:
+            raise ProtocolError('Container size {} is greater than maximum {}'.format(session.length, self._max_len))
+        if 0 < session.length < FRAME_HEADER_SIZE:
+            raise ProtocolError('Container size {} is less than container header size {}'
+                                .format(session.length, FRAME_HEADER_SIZE))
+        return session
+
+    def _parse_message(self, view, offset, session=None):
+        if session is None:
+            session = self._parse_session(view[offset:offset + SESSION_HEADER_SIZE])
+
+        offset += SESSION_HEADER_SIZE
+        container = view[offset:offset + session.length]
+        if self._check_crc and not verify_session_crc(session, container):
+            raise InvalidCrc('Invalid session CRC {} from {}'.format(session.crc, session.fs_id))
+        if session.length == 0:
+            return session, None, container
+
+        header = FrameHeader.unpack_from(container[:FRAME_HEADER_SIZE])
+        body = container[FRAME_HEADER_SIZE:]
+        if self._check_crc and not verify_container_crc(header, container):
+            raise InvalidCrc('Invalid container CRC {} for document {} from {}'
+                             .format(header.crc, header.docnum(), session.fs_id))
+        return session, header, body
+
+
+def iter_messages(fh, chunk_size=64 * 1024, max_len=SessionHeader.MAX_LEN, check_crc=False):
+    """
+    Прочитать все сообщения из файлового объекта, например дампа трафика.
+    :param fh: файловый объект, открытый в бинарном режиме.
+    :param chunk_size: размер читаемого за раз куска.
+    :param max_len: максимальная длина контейнера.
+    :param check_crc: проверять CRC сообщений.
+    :return: генератор троек (SessionHeader, FrameHeader, body).
+    """
+    parser = SessionStreamParser(max_len=max_len, check_crc=check_crc)
+    while True:
+        chunk = fh.read(chunk_size)
+        if not chunk:
+            break
+        for message in parser.feed(chunk):
+            yield message
+    parser.close()
@@ -24,9 +24,12 @@ setup(
     platforms=["Linux", "BSD", "MacOS"],
     license='APACHE 2.0',
     install_requires=[
-        'jsonschema',
+        'jsonschema>=3.0',
         'crcmod'
     ],
+    extras_require={
+        'numpy': ['numpy'],
+    },
     test_suite='tests',
     setup_requires=[
         'pytest-runner',
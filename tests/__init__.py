@@ -14,3 +14,78 @@
 #    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 #    See the License for the specific language governing permissions and
 #
+
+"""
+Общие данные и функции для тестов: путь к схемам, тестовые документы и сборка сообщений протокола.
+"""
+
+import os
+
+from ofd.protocol import DOCS_BY_NAME, FrameHeader, SessionHeader, pack_json
+
+SCHEMA_PATH = os.path.join(os.path.dirname(__file__), '..', 'schemas')
+
+FISCAL_SIGN = b'\x00\x00\x04\xd2\x16\x2e\x00\x00'
+
+FS_ID = b'9999078900005488'
+
+# чек с реквизитами, которые распаковщик форматирует: ИНН с ведущими нулями, kktRegId с пробелами, телефоны
+RECEIPT = {
+    'receipt': {
+        'dateTime': 1481906640,
+        'userInn': '005001007322',
+        'kktRegId': '0000000003038927  ',
+        'fiscalSign': 1334812543,
+        'paymentAgentPhone': ['8 (495) 123-45-67', '+7 916 000 00 00'],
+        'items': [
+            {'name': 'Хлеб', 'price': 2500, 'quantity': 2.0, 'sum': 5000, 'propertiesItem': 'свойство'},
+            {'name': 'Молоко', 'price': 7990, 'quantity': 0.5, 'sum': 3995},
+        ],
+        'totalSum': 8995,
+    }
+}
+
+# чек со всеми обязательными по схеме 1.0 реквизитами, кроме receiptCode - его нет среди тегов
+VALID_RECEIPT = {
+    'receipt': {
+        'user': 'РАПКАТ-ЦЕНТР',
+        'userInn': '500100732259',
+        'requestNumber': 3,
+        'dateTime': 1481906640,
+        'shiftNumber': 4,
+        'operationType': 1,
+        'taxationType': 1,
+        'kktRegId': '0000000003038927',
+        'fiscalDriveNumber': '9999078900001366',
+        'fiscalDocumentNumber': 35,
+        'fiscalSign': 1334812543,
+        'items': [{'name': 'Хлеб', 'price': 2500, 'quantity': 2.0, 'sum': 5000}],
+        'totalSum': 5000,
+    }
+}
+
+# тот же чек организации с 10-значным ИНН: в теге ИНН дополнен пробелами до 12 символов
+VALID_RECEIPT_INN10 = {'receipt': dict(VALID_RECEIPT['receipt'], userInn='7702203276  ')}
+
+
+def make_container(number, **fields):
+    """
+    Тело контейнера с кассовым чеком - то, что распаковывает unpack_container_message.
+    """
+    return pack_json({'receipt': dict({'fiscalDocumentNumber': number, 'dateTime': 1481906640}, **fields)},
+                     docs=DOCS_BY_NAME)
+
+
+def make_session_message(number, body=None, flags=SessionHeader.SESSION_FLAGS):
+    """
+    Сообщение сессионного уровня с документом number, как его отправляет касса.
+    :param body: тело контейнера, по умолчанию - make_container(number).
+    """
+    if body is None:
+        body = make_container(number)
+    header = FrameHeader(length=FrameHeader.STRUCT.size + len(body), crc=0, doctype=3, extra1=b'\x10\t',
+                         devnum=b'\x99\x99\x07\x89\x00\x00T\x88', docnum=number.to_bytes(3, 'big'),
+                         extra2=b'\x00' * 12)
+    container = header.pack() + body
+    session = SessionHeader(pva=256, fs_id=FS_ID, length=len(container), flags=flags, crc=0)
+    return session.pack() + container
@@ -0,0 +1,109 @@
+# coding: utf8
+#
+#        Copyright (C) 2017 Yandex LLC
+#        http://yandex.com
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#
+
+import struct
+import unittest
+
+import jsonschema
+
+from ofd.cache import UnpackCache
+from ofd.protocol import DOCS_BY_NAME, DocumentValidator, pack_json
+from tests import FISCAL_SIGN, SCHEMA_PATH, VALID_RECEIPT_INN10, make_container
+
+
+class FakeClock(object):
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestUnpackCache(unittest.TestCase):
+    def test_resent_document(self):
+        cache = UnpackCache()
+
+        doc, stlv_doc, error = cache.unpack(make_container(1), FISCAL_SIGN)
+        cached = cache.unpack(make_container(1), FISCAL_SIGN)
+
+        self.assertIs(doc, cached[0])
+        self.assertIs(stlv_doc, cached[1])
+        self.assertIsNone(error)
+        self.assertEqual((1, 1), (cache.hits, cache.misses))
+
+        cache.unpack(make_container(1), b'\x01' * 8)
+        self.assertEqual((1, 2), (cache.hits, cache.misses))
+
+    def test_errors_are_cached(self):
+        cache = UnpackCache(validator=DocumentValidator(['1.0'], SCHEMA_PATH))
+        broken = struct.pack('<HH', 3, 6) + struct.pack('<HHH', 1040, 4, 35)
+
+        _, _, unpack_error = cache.unpack(broken, FISCAL_SIGN)
+        doc, _, validation_error = cache.unpack(make_container(1), FISCAL_SIGN, '1.0')
+
+        self.assertIs(unpack_error, cache.unpack(broken, FISCAL_SIGN)[2])
+        self.assertIsInstance(validation_error, jsonschema.ValidationError)
+        self.assertIs(validation_error, cache.unpack(make_container(1), FISCAL_SIGN, '1.0')[2])
+        self.assertEqual((2, 2), (cache.hits, cache.misses))
+
+    def test_valid_document_with_short_inn(self):
+        cache = UnpackCache(validator=DocumentValidator(['1.0'], SCHEMA_PATH))
+        raw = pack_json(VALID_RECEIPT_INN10, docs=DOCS_BY_NAME)
+
+        for _ in range(2):
+            doc, _, error = cache.unpack(raw, FISCAL_SIGN)
+            self.assertIsNone(error)
+            self.assertEqual('7702203276', doc['receipt']['userInn'])
+        self.assertEqual((1, 1), (cache.hits, cache.misses))
+
+    def test_key_is_container_bytes(self):
+        cache = UnpackCache()
+        raw = make_container(1)
+
+        self.assertEqual((raw, FISCAL_SIGN, None), cache.make_key(bytearray(raw), memoryview(FISCAL_SIGN)))
+        cache.unpack(raw, FISCAL_SIGN)
+        cache.unpack(bytearray(raw), FISCAL_SIGN)
+        cache.unpack(raw[:-1] + b'\x01', FISCAL_SIGN)
+        self.assertEqual((1, 2), (cache.hits, cache.misses))
+
+    def test_ttl(self):
+        clock = FakeClock()
+        cache = UnpackCache(ttl=10, clock=clock)
+
+        first, _, _ = cache.unpack(make_container(1), FISCAL_SIGN)
+        clock.now = 9.9
+        self.assertIs(first, cache.unpack(make_container(1), FISCAL_SIGN)[0])
+        clock.now = 10
+        self.assertIsNot(first, cache.unpack(make_container(1), FISCAL_SIGN)[0])
+        self.assertEqual((1, 2), (cache.hits, cache.misses))
+
+    def test_lru_eviction(self):
+        cache = UnpackCache(maxsize=2)
+
+        cache.unpack(make_container(1), FISCAL_SIGN)
+        cache.unpack(make_container(2), FISCAL_SIGN)
+        cache.unpack(make_container(1), FISCAL_SIGN)
+        cache.unpack(make_container(3), FISCAL_SIGN)  # вытесняет сообщение 2
+
+        self.assertEqual(2, len(cache))
+        cache.unpack(make_container(1), FISCAL_SIGN)
+        cache.unpack(make_container(2), FISCAL_SIGN)
+        self.assertEqual((2, 4), (cache.hits, cache.misses))
+
+
+if __name__ == '__main__':
+    unittest.main()
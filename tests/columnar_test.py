@@ -0,0 +1,130 @@
+# coding: utf8
+#
+#        Copyright (C) 2017 Yandex LLC
+#        http://yandex.com
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#
+
+
+import struct
+import unittest
+from unittest import mock
+
+from ofd import columnar
+from ofd.columnar import DOCUMENT_TYS, ColumnarExporter, export_columns
+from ofd.protocol import DOCS_BY_NAME, DOCUMENTS, VLN, String, pack_json, unpack_container_message
+from tests import FISCAL_SIGN
+
+RECEIPT = {
+    'receipt': {
+        'dateTime': 1481906640,
+        'userInn': '005001007322',
+        'kktRegId': '0000000003038927  ',
+        'fiscalDriveNumber': '9999078900001366',
+        'fiscalDocumentNumber': 35,
+        'operationType': 1,
+        'items': [
+            {'name': 'Хлеб', 'price': 2500, 'quantity': 2.0, 'sum': 5000},
+            {'name': 'Молоко', 'price': 7990, 'quantity': 0.5, 'sum': 3995},
+        ],
+        'totalSum': 8995,
+    }
+}
+
+OPEN_SHIFT = {'openShift': {'dateTime': 1481906000, 'fiscalDocumentNumber': 34, 'shiftNumber': 4}}
+
+
+def make_messages():
+    return [pack_json(RECEIPT, docs=DOCS_BY_NAME), pack_json(OPEN_SHIFT, docs=DOCS_BY_NAME)]
+
+
+class TestColumnarExporter(unittest.TestCase):
+    def test_matches_unpack_container_message(self):
+        messages = make_messages()
+        documents, items = export_columns(messages)
+
+        self.assertEqual(2, len(documents))
+        self.assertEqual(2, len(items))
+        for row, raw in enumerate(messages):
+            doc, _ = unpack_container_message(raw, FISCAL_SIGN)
+            body = next(iter(doc.values()))
+            for column in documents.columns:
+                if column.name in body:
+                    self.assertEqual(body[column.name], column.values[row])
+                    self.assertEqual(1, column.valid[row])
+                else:
+                    self.assertEqual(0, column.valid[row])
+
+        body = unpack_container_message(messages[0], FISCAL_SIGN)[0]['receipt']
+        self.assertEqual([0, 0], list(items['document'].values))
+        for name in ['name', 'price', 'quantity', 'sum']:
+            self.assertEqual([item[name] for item in body['items']], list(items[name].values))
+
+    def test_fields(self):
+        exporter = ColumnarExporter(document_fields=['fiscalDocumentNumber'], item_fields=[])
+        exporter.extend(make_messages())
+
+        self.assertEqual(['fiscalDocumentNumber'], exporter.documents.names)
+        self.assertEqual([35, 34], list(exporter.documents['fiscalDocumentNumber'].values))
+        self.assertEqual(0, len(exporter.items))
+
+        for fields in [['items'], ['unknownField'], ['paymentAgentPhone']]:
+            with self.assertRaises(ValueError):
+                ColumnarExporter(document_fields=fields)
+
+    def test_field_type_depends_on_parent(self):
+        # одно имя у двух тегов разного типа: тип столбца - у тега, который распаковывается внутри документа
+        receipt_tag = VLN('testSum', 'сумма в чеке', parents=[3])
+        report_tag = String('testSum', 'сумма в отчёте', maxlen=16, parents=[1])
+        tags = {9998: [receipt_tag], 9999: [report_tag]}
+        with mock.patch.dict(DOCUMENTS, tags), \
+                mock.patch.dict(DOCS_BY_NAME, {'testSum': [(9998, receipt_tag), (9999, report_tag)]}):
+            self.assertEqual('Q', columnar._field_typecode('testSum', (3,)))
+            self.assertIsNone(columnar._field_typecode('testSum', (1,)))
+            with self.assertRaisesRegex(ValueError, 'different types'):
+                columnar._field_typecode('testSum', DOCUMENT_TYS)
+            with self.assertRaisesRegex(ValueError, 'can not appear'):
+                columnar._field_typecode('testSum', (columnar.ITEMS_TY,))
+
+    def test_broken_document_is_not_added(self):
+        exporter = ColumnarExporter()
+        raw = pack_json(RECEIPT, docs=DOCS_BY_NAME)
+        # позиции уже разобраны, когда встречается слишком длинный номер ККТ
+        body = raw[4:] + struct.pack('<HH', 1037, 30) + b'1' * 30
+        broken = struct.pack('<HH', 3, len(body)) + body
+
+        with self.assertRaises(ValueError):
+            exporter.add(broken)
+        self.assertEqual(0, len(exporter))
+        self.assertEqual(0, len(exporter.items))
+        self.assertTrue(all(len(column) == 0 for column in exporter.documents.columns + exporter.items.columns))
+
+    @unittest.skipIf(columnar.numpy is None, 'NumPy is not installed')
+    def test_to_numpy(self):
+        documents, items = export_columns(make_messages())
+
+        array = documents.to_numpy()
+        self.assertEqual([3, 2], array['code'].tolist())
+        self.assertEqual([8995, 0], array['totalSum'].tolist())
+        self.assertEqual(['0000000003038927', ''], array['kktRegId'].tolist())
+        self.assertEqual(['5001007322', ''], array['userInn'].tolist())
+        self.assertEqual([2.0, 0.5], items.to_numpy()['quantity'].tolist())
+
+    @unittest.skipIf(columnar.pyarrow is None, 'pyarrow is not installed')
+    def test_to_arrow(self):
+        documents, _ = export_columns(make_messages())
+        self.assertEqual([8995, None], documents.to_arrow().column('totalSum').to_pylist())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,97 @@
+# coding: utf8
+#
+#        Copyright (C) 2017 Yandex LLC
+#        http://yandex.com
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#
+
+
+import json
+import struct
+import unittest
+
+from jsonschema import ValidationError
+
+from ofd.lazy import LazyDocument, unpack_container_message_lazy
+from ofd.protocol import DOCS_BY_NAME, DOCUMENTS, DocCodes, DocumentValidator, get_body_field, pack_json, \
+    unpack_container_message
+from tests import FISCAL_SIGN, RECEIPT, SCHEMA_PATH, VALID_RECEIPT
+
+
+class TestLazyDocument(unittest.TestCase):
+    def test_same_as_unpack_container_message(self):
+        raw = pack_json(RECEIPT, docs=DOCS_BY_NAME)
+        full, stlv_doc = unpack_container_message(raw, FISCAL_SIGN)
+        lazy, lazy_stlv_doc = unpack_container_message_lazy(raw, FISCAL_SIGN)
+
+        self.assertIs(stlv_doc, lazy_stlv_doc)
+        self.assertEqual(full, lazy)
+        self.assertEqual(list(full['receipt']), list(lazy['receipt']))
+        self.assertEqual(json.dumps(full), json.dumps({'receipt': lazy['receipt'].to_dict()}))
+        self.assertEqual(8995, get_body_field(lazy, 'totalSum'))
+        self.assertEqual(['+84951234567', '+79160000000'], lazy['receipt']['paymentAgentPhone'])
+
+    def test_decodes_on_access(self):
+        raw = pack_json(RECEIPT, docs=DOCS_BY_NAME)
+        body = unpack_container_message_lazy(raw, FISCAL_SIGN)[0]['receipt']
+
+        items = body['items']
+        self.assertIsInstance(items[0], LazyDocument)
+        self.assertIs(items, body['items'])
+        self.assertEqual({'name': 'Молоко', 'price': 7990, 'quantity': 0.5, 'sum': 3995}, items[1])
+
+    def test_mutable(self):
+        body = LazyDocument(DOCUMENTS[DocCodes.RECEIPT], pack_json(RECEIPT, docs=DOCS_BY_NAME)[4:])
+
+        body['receiptCode'] = 3
+        del body['items']
+        self.assertEqual(3, body.pop('receiptCode'))
+        self.assertNotIn('items', body)
+        self.assertEqual('0000000003038927  ', body['kktRegId'])
+
+    def test_broken_value(self):
+        data = struct.pack('<HH', 1037, 30) + b'1' * 30 + struct.pack('<HHI', 1012, 4, 1481906640)
+        body = LazyDocument(DOCUMENTS[DocCodes.RECEIPT], data)
+
+        self.assertEqual(1481906640, body['dateTime'])
+        with self.assertRaises(ValueError):
+            body['kktRegId']
+
+        with self.assertRaises(struct.error):
+            LazyDocument(DOCUMENTS[DocCodes.RECEIPT], data[:2])
+
+    def test_repeated_access_after_error(self):
+        data = struct.pack('<HHH', 1012, 2, 1) + struct.pack('<HHI', 1040, 4, 35)
+        body = LazyDocument(DOCUMENTS[DocCodes.RECEIPT], data)
+
+        for _ in range(2):
+            with self.assertRaises(struct.error):
+                body['dateTime']
+        self.assertIn('dateTime', body)
+        self.assertEqual(['dateTime', 'fiscalDocumentNumber'], list(body))
+        self.assertEqual(35, body['fiscalDocumentNumber'])
+
+    def test_validate(self):
+        raw = pack_json(VALID_RECEIPT, docs=DOCS_BY_NAME)
+        for backend in DocumentValidator.BACKENDS:
+            validator = DocumentValidator(['1.0'], SCHEMA_PATH, backend=backend)
+            lazy = unpack_container_message_lazy(raw, FISCAL_SIGN)[0]
+
+            with self.assertRaisesRegex(ValidationError, "'receiptCode' is a required property"):
+                validator.validate(lazy, '1.0')
+            lazy['receipt']['receiptCode'] = 3
+            validator.validate(lazy, '1.0')
+
+
+if __name__ == '__main__':
+    unittest.main()
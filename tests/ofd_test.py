@@ -16,10 +16,14 @@
 #
 
 import array
+import decimal
 import ofd
+import pickle
+import random
 import struct
 import unittest
-from ofd.protocol import ProtocolPacker, pack_json, DOCS_BY_NAME, unpack_container_message
+from ofd.protocol import ByteArray, ProtocolPacker, pack_json, DOCS_BY_NAME, unpack_container_message, \
+    unpack_container_messages
 
 
 class TestU32(unittest.TestCase):
@@ -27,6 +31,35 @@ class TestU32(unittest.TestCase):
         actual = ofd.U32(name='', desc='').unpack(b'\x01\x00\x00\x00')
         self.assertEqual(1, actual)
 
+    def test_attributes(self):
+        tag = ofd.U32(name='correctionKktReasonCode', desc='', cardinality='+')
+        self.assertEqual(4, tag.maxlen)
+        self.assertEqual('+', tag.cardinality)
+
+    def test_repeated(self):
+        body = struct.pack('<HHI', 1205, 4, 1) + struct.pack('<HHI', 1205, 4, 3)
+        actual = ofd.DOCUMENTS[ofd.protocol.DocCodes.FISCAL_REPORT_CORRECTION].unpack(body)
+        self.assertEqual({'correctionKktReasonCode': [1, 3]}, actual)
+
+
+class TestTag(unittest.TestCase):
+    def test_immutable(self):
+        tag = ofd.DOCUMENTS[1041]
+        self.assertEqual(1041, tag.ty)
+        self.assertFalse(hasattr(tag, '__dict__'))
+        with self.assertRaises(AttributeError):
+            tag.maxlen = 100
+        with self.assertRaises(AttributeError):
+            del tag.name
+        with self.assertRaises(AttributeError):
+            tag.extra = 1
+
+    def test_pickle(self):
+        for tag in [ofd.DOCUMENTS[ofd.protocol.DocCodes.RECEIPT], ofd.DOCUMENTS[1037]]:
+            copy = pickle.loads(pickle.dumps(tag))
+            self.assertIs(type(tag), type(copy))
+            self.assertEqual(tag.__getstate__(), copy.__getstate__())
+
 
 class TestVLN(unittest.TestCase):
     def test_unpack(self):
@@ -75,6 +108,60 @@ class TestFVLN(unittest.TestCase):
         with self.assertRaises(ValueError):
             fvln.pack(number)
 
+    @staticmethod
+    def unpack_decimal(data):
+        pad = b'\x00' * (9 - len(data))
+        pos, num = struct.unpack('<bQ', bytes(data) + pad)
+        # прежняя реализация; точности 28 знаков по умолчанию не хватало при большой мантиссе и отрицательной точке
+        with decimal.localcontext() as ctx:
+            ctx.prec = 300
+            return float((decimal.Decimal(num) / decimal.Decimal(10) ** pos).quantize(decimal.Decimal(10) ** -pos))
+
+    @staticmethod
+    def pack_str(data, maxlen):
+        str_data = str(data)
+        point = str_data.index('.')
+        packed = struct.pack('<bQ', len(str_data) - 1 - point, int(str_data[0:point] + str_data[point + 1:]))
+        assert packed[maxlen:] == b'\x00' * len(packed[maxlen:])
+        return packed[:maxlen]
+
+    def test_unpack_matches_decimal(self):
+        rnd = random.Random(0)
+        for maxlen in [2, 5, 8, 9]:
+            fvln = ofd.FVLN(name='', desc='', maxlen=maxlen)
+            bits = 8 * (maxlen - 1)
+            for _ in range(5000):
+                pos = rnd.randint(-128, 127) if rnd.random() < 0.5 else rnd.randint(0, 8)
+                num = rnd.getrandbits(rnd.randint(1, bits))
+                data = struct.pack('<bQ', pos, num)[:maxlen]
+                self.assertEqual(self.unpack_decimal(data), fvln.unpack(data), data)
+                self.assertEqual((num, pos), fvln.unpack_fixed_point(data))
+                self.assertEqual(data, fvln.pack((num, pos)))
+
+            self.assertEqual(0.0, fvln.unpack(b''))
+
+    def test_unpack_boundaries_match_decimal(self):
+        for maxlen in [2, 5, 8, 9]:
+            fvln = ofd.FVLN(name='', desc='', maxlen=maxlen)
+            max_mantissa = 2 ** (8 * (maxlen - 1)) - 1
+            for pos in range(-128, 128):
+                for num in [0, 1, max_mantissa]:
+                    data = struct.pack('<bQ', pos, num)[:maxlen]
+                    self.assertEqual(self.unpack_decimal(data), fvln.unpack(data), data)
+                    self.assertEqual((num, pos), fvln.unpack_fixed_point(data))
+                    self.assertEqual(data, fvln.pack((num, pos)))
+
+    def test_pack_matches_str(self):
+        rnd = random.Random(0)
+        fvln = ofd.FVLN(name='', desc='', maxlen=8)
+        for _ in range(5000):
+            number = round(rnd.uniform(0, 10 ** rnd.randint(0, 12)), rnd.randint(1, 6))
+            if 'e' in str(number):
+                continue
+            packed = fvln.pack(number)
+            self.assertEqual(self.pack_str(number, 8), packed, number)
+            self.assertEqual(number, fvln.unpack(packed))
+
 
 class TestString(unittest.TestCase):
     def test_unpack_zero_string(self):
@@ -85,6 +172,27 @@ class TestString(unittest.TestCase):
         actual = ofd.String(name='', desc='', maxlen=4).unpack(b'\x92\xa5\xe1\xe2')
         self.assertEqual(u'Тест', actual)
 
+    def test_cp866_table(self):
+        data = bytes(range(256))
+        text = ofd.String(name='', desc='', maxlen=256).unpack(memoryview(data)[1:])
+        self.assertEqual(data[1:].decode('cp866'), text)
+        self.assertEqual(data[1:], ofd.String.pack(text))
+        self.assertEqual(b'\x92\xa5\xe1\xe2 1', ofd.String.pack(u'Тест 1'))
+
+        with self.assertRaises(UnicodeEncodeError):
+            ofd.String.pack(u'€')
+
+
+class TestByteArray(unittest.TestCase):
+    def test_pack_unpack(self):
+        byte_array = ByteArray(name='', desc='', maxlen=4)
+        self.assertEqual(b'\x00\x01\xff', byte_array.pack(bytearray(b'\x00\x01\xff')))
+        self.assertEqual("b'\\x00\\x01\\xff'", byte_array.unpack(memoryview(b'\x00\x01\xff')))
+        self.assertEqual('', byte_array.unpack(b''))
+
+        with self.assertRaises(ValueError):
+            byte_array.unpack(b'12345')
+
 
 class TestUnix(unittest.TestCase):
     def test_unpack(self):
@@ -108,6 +216,45 @@ class TestByte(unittest.TestCase):
             ofd.Byte(name='', desc='').unpack('\x03\x04')
 
 
+class TestSTLV(unittest.TestCase):
+    def test_unpack_from_any_buffer(self):
+        doc = {
+            'receipt': {
+                'fiscalDocumentNumber': 35,
+                'items': [
+                    {'name': 'Тестовый товар', 'quantity': 5.0, 'price': 2500, 'sum': 12500},
+                    {'name': 'Тестовый товар 2', 'quantity': 1.0, 'price': 100, 'sum': 100},
+                ],
+                'totalSum': 12600,
+            }
+        }
+        body = pack_json(doc, docs=DOCS_BY_NAME)[4:]
+        receipt = ofd.DOCUMENTS[3]
+
+        expected = receipt.unpack(body)
+        self.assertEqual(doc['receipt'], expected)
+        self.assertEqual(expected, receipt.unpack(bytearray(body)))
+        self.assertEqual(expected, receipt.unpack(memoryview(b'\xff' + body)[1:]))
+
+    def test_compiled_codecs_match_tag_selection(self):
+        doc = {'receipt': {'fiscalDocumentNumber': 35, 'items': [{'name': 'Тестовый товар', 'quantity': 5.0}]}}
+        ofd.DOCUMENTS[3].unpack(pack_json(doc, docs=DOCS_BY_NAME)[4:])
+
+        self.assertIn((1059, 1030), ofd.protocol.TAG_CODECS)
+        self.assertIn((3, 1059), ofd.protocol.TAG_CODECS)
+        for (parent_ty, ty), (name, decode, is_repeated) in ofd.protocol.TAG_CODECS.items():
+            doc = ofd.DOCUMENTS[parent_ty]._select_tag_by_parent(ty)
+            self.assertEqual(doc.name, name)
+            self.assertEqual(doc.unpack, decode)
+
+        with self.assertRaises(ofd.protocol.ProtocolError):
+            ofd.DOCUMENTS[3].unpack(struct.pack('<HH', 1059, 8) + struct.pack('<HH', 1005, 4) + b'test')
+
+    def test_unpack_truncated_header(self):
+        with self.assertRaises(struct.error):
+            ofd.DOCUMENTS[3].unpack(b'\x28\x04\x04')
+
+
 class TestSessionHeader(unittest.TestCase):
     def test_unpack(self):
         expected = ofd.SessionHeader(256, b'9999078950      ', 305, 0b10100, crc=0)
@@ -232,6 +379,27 @@ class TestFrameHeader(unittest.TestCase):
         head.recalculate_crc(data)
         self.assertEqual(60419, head.crc)
 
+        self.assertTrue(ofd.protocol.verify_crc(head, data))
+        self.assertTrue(ofd.protocol.verify_crc(head, memoryview(b'\x00' + data)[1:]))
+        self.assertFalse(ofd.protocol.verify_crc(head, data[:-1] + b'\x01'))
+
+    def test_verify_crc_keeps_received_msgtype(self):
+        data = bytearray([
+            0x31, 0x01, 0x00, 0x00, 0xa6, 0x01, 0x01, 0x10,
+            0x09, 0x99, 0x99, 0x07, 0x89, 0x12, 0x34, 0x56,
+            0x7f, 0x00, 0x00, 0x01, 0x00, 0x23, 0x09, 0x82,
+            0xc4, 0x00, 0x00, 0x01, 0x00, 0x02, 0x01, 0x07
+        ])
+        body = b'\x01\x00\x03\x01\x11'
+        crc = ofd.protocol.crc_ccitt(bytes(data[:2] + data[4:]) + body)
+        data[2:4] = struct.pack('<H', crc)
+
+        head = ofd.FrameHeader.unpack_from(bytes(data))
+
+        self.assertEqual(0xa6, head.msgtype)
+        self.assertEqual(bytes(data), head.pack())
+        self.assertTrue(ofd.protocol.verify_crc(head, body))
+
 
 class TestProtocolPack(unittest.TestCase):
     def test_pack_array_of_ints_from_json(self):
@@ -391,6 +559,40 @@ class TestProtocolPack(unittest.TestCase):
 
 class TestProtocolUnpack:
 
+    def test_unpack_container_messages(self):
+        good = pack_json({'receipt': {'fiscalDocumentNumber': 35, 'userInn': '7702203276  '}}, docs=DOCS_BY_NAME)
+        bad = struct.pack('<HH', 3, 6) + struct.pack('<HHH', 1040, 4, 35)
+        messages = [(good, b'\x00' * 8), (bad, b'\x00' * 8), (good, b'\x01\x00')]
+
+        results = list(unpack_container_messages(messages))
+
+        assert 3 == len(results)
+        assert (unpack_container_message(good, b'\x00' * 8)[0], ofd.DOCUMENTS[3], None) == results[0]
+        assert results[1][0] is None and results[1][1] is None
+        assert isinstance(results[1][2], struct.error)
+        assert 1 == results[2][0]['receipt']['messageFiscalSign']
+        assert '7702203276' == results[2][0]['receipt']['userInn']
+        assert results[2][2] is None
+
+    def test_unpack_fields(self):
+        raw = pack_json({'receipt': {
+            'fiscalDocumentNumber': 35,
+            'userInn': '005001007322',
+            'items': [{'name': 'Хлеб', 'price': 2500, 'quantity': 2.0, 'sum': 5000}],
+            'totalSum': 5000,
+        }}, docs=DOCS_BY_NAME)
+        full = unpack_container_message(raw, b'\x00' * 8)[0]['receipt']
+
+        doc, stlv_doc = unpack_container_message(raw, b'\x00' * 8, fields={'userInn', 'totalSum', 'code'})
+        assert ofd.DOCUMENTS[3] is stlv_doc
+        assert {'receipt': {'userInn': '5001007322', 'totalSum': 5000, 'code': 3}} == doc
+
+        doc = unpack_container_message(raw, b'\x00' * 8, fields={'items', 'rawData', 'unknownField'})[0]
+        assert {'receipt': {'items': full['items'], 'rawData': full['rawData']}} == doc
+
+        results = list(unpack_container_messages([(raw, b'\x00' * 8)], fields=frozenset()))
+        assert [({'receipt': {}}, stlv_doc, None)] == results
+
     def test_trim_inn_lead_zeros(self):
         doc = {
             'userInn': '0234523423  ',
@@ -0,0 +1,77 @@
+# coding: utf8
+#
+#        Copyright (C) 2017 Yandex LLC
+#        http://yandex.com
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#
+
+import struct
+import unittest
+
+import jsonschema
+
+from ofd.parallel import ParallelUnpacker
+from ofd.protocol import DOCS_BY_NAME, DOCUMENTS, pack_json, unpack_container_messages
+from tests import FISCAL_SIGN, SCHEMA_PATH, VALID_RECEIPT_INN10, make_container
+
+
+class TestParallelUnpacker(unittest.TestCase):
+    def test_unpack_preserves_order(self):
+        messages = [(make_container(i), FISCAL_SIGN) for i in range(50)]
+        messages[17] = (struct.pack('<HH', 3, 6) + struct.pack('<HHH', 1040, 4, 35), FISCAL_SIGN)
+
+        with ParallelUnpacker(workers=2, chunk_size=4) as unpacker:
+            actual = list(unpacker.unpack(messages))
+
+        expected = list(unpack_container_messages(messages))
+        self.assertEqual(len(expected), len(actual))
+        for (doc, stlv_doc, error), (expected_doc, expected_stlv_doc, expected_error) in zip(actual, expected):
+            self.assertEqual(expected_doc, doc)
+            self.assertIs(expected_stlv_doc, stlv_doc)
+            self.assertEqual(type(expected_error), type(error))
+        self.assertIs(DOCUMENTS[3], actual[0][1])
+
+    def test_unpack_with_validation(self):
+        messages = [(make_container(1), FISCAL_SIGN, '1.0'), (make_container(2), FISCAL_SIGN)]
+
+        with ParallelUnpacker(workers=1, versions=['1.0'], path=SCHEMA_PATH) as unpacker:
+            (doc, _, error), (_, _, pair_error) = unpacker.unpack(messages)
+
+        self.assertEqual(1, doc['receipt']['fiscalDocumentNumber'])
+        self.assertIsInstance(error, jsonschema.ValidationError)
+        self.assertIsInstance(pair_error, jsonschema.ValidationError)
+
+    def test_unpack_valid_receipt_with_short_inn(self):
+        raw = pack_json(VALID_RECEIPT_INN10, docs=DOCS_BY_NAME)
+        messages = [(raw, FISCAL_SIGN, '1.0'), (raw, FISCAL_SIGN)]
+
+        with ParallelUnpacker(workers=1, versions=['1.0'], path=SCHEMA_PATH) as unpacker:
+            actual = list(unpacker.unpack(messages))
+
+        self.assertEqual([None, None], [error for _, _, error in actual])
+        self.assertEqual('7702203276', actual[0][0]['receipt']['userInn'])
+        self.assertNotIn('receiptCode', actual[0][0]['receipt'])
+
+    def test_version_of_pair_is_taken_from_document(self):
+        doc = {'receipt': dict(VALID_RECEIPT_INN10['receipt'], fiscalDocumentFormatVer=2)}
+        messages = [(pack_json(doc, docs=DOCS_BY_NAME), FISCAL_SIGN)]
+
+        with ParallelUnpacker(workers=1, versions=['1.0'], path=SCHEMA_PATH) as unpacker:
+            (_, _, error), = unpacker.unpack(messages)
+
+        self.assertIsInstance(error, jsonschema.ValidationError)
+        self.assertEqual('Version 1.05 is unsupported', error.message)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,132 @@
+# coding: utf8
+#
+#        Copyright (C) 2017 Yandex LLC
+#        http://yandex.com
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#
+
+
+import json
+import pickle
+import unittest
+
+from jsonschema import ValidationError
+
+from ofd.protocol import DOCS_BY_NAME, DocumentValidator, get_body_field, pack_json, unpack_container_message
+from ofd.records import RECORD_CLASSES, ItemRecord, ReceiptRecord, make_record_class, \
+    unpack_container_message_record
+from tests import FISCAL_SIGN, RECEIPT, SCHEMA_PATH, VALID_RECEIPT
+
+DOCUMENTS = [
+    RECEIPT,
+    {'openShift': {'dateTime': 1481906000, 'fiscalDocumentNumber': 34, 'shiftNumber': 4}},
+    {'closeShift': {'dateTime': 1481909000, 'fiscalDocumentNumber': 36, 'shiftNumber': 4, 'receiptsQuantity': 1}},
+    {'operatorAck': {'fiscalDocumentNumber': 36, 'dateTime': 1481909000}},
+]
+
+
+class TestRecords(unittest.TestCase):
+    def test_same_as_unpack_container_message(self):
+        for doc in DOCUMENTS:
+            raw = pack_json(doc, docs=DOCS_BY_NAME)
+            expected, stlv_doc = unpack_container_message(raw, FISCAL_SIGN)
+            actual, actual_stlv_doc = unpack_container_message_record(raw, FISCAL_SIGN)
+
+            self.assertIs(stlv_doc, actual_stlv_doc)
+            self.assertEqual(expected, actual)
+            name = stlv_doc.name
+            if name in RECORD_CLASSES:
+                self.assertIsInstance(actual[name], RECORD_CLASSES[name])
+                self.assertEqual(json.dumps(expected, sort_keys=True),
+                                 json.dumps({name: actual[name].to_dict()}, sort_keys=True))
+            else:
+                self.assertIsInstance(actual[name], dict)
+
+    def test_record(self):
+        raw = pack_json(RECEIPT, docs=DOCS_BY_NAME)
+        doc = unpack_container_message_record(raw, FISCAL_SIGN)[0]
+        receipt = doc['receipt']
+
+        self.assertEqual(8995, receipt.totalSum)
+        self.assertEqual(8995, get_body_field(doc, 'totalSum'))
+        self.assertEqual('5001007322', receipt['userInn'])
+        self.assertEqual({'paymentAgentPhone': ['+84951234567', '+79160000000']}, receipt._extra)
+        self.assertIsInstance(receipt.items[0], ItemRecord)
+        self.assertEqual({'propertiesItem': 'свойство'}, receipt.items[0]._extra)
+        self.assertIsNone(receipt.items[1]._extra)
+        self.assertNotIn('cashTotalSum', receipt)
+        self.assertIsNone(receipt.get('cashTotalSum'))
+        with self.assertRaises(AttributeError):
+            receipt.cashTotalSum
+        with self.assertRaises(KeyError):
+            receipt['cashTotalSum']
+
+        receipt['receiptCode'] = 3
+        receipt['cashTotalSum'] = 8995
+        del receipt['userInn']
+        self.assertEqual(3, receipt._extra['receiptCode'])
+        self.assertEqual(8995, receipt.cashTotalSum)
+        self.assertNotIn('userInn', receipt.keys())
+        self.assertFalse(hasattr(receipt, '__dict__'))
+
+        self.assertEqual(receipt, pickle.loads(pickle.dumps(receipt)))
+
+    def test_fields_are_tags(self):
+        record = ReceiptRecord(totalSum=1, unknownField=2)
+        self.assertEqual({'totalSum': 1, 'unknownField': 2}, record.to_dict())
+
+        with self.assertRaises(ValueError):
+            make_record_class('BrokenRecord', 3, [1020, 65000])
+        with self.assertRaises(ValueError):
+            make_record_class('BrokenRecord', 2, [1191])  # в отчёте об открытии смены тега 1191 нет
+
+    def test_slots_are_decoded_names(self):
+        self.assertEqual(('name', 'price', 'quantity', 'sum'), ItemRecord.__slots__[:4])
+        self.assertIn('totalSum', ReceiptRecord.FIELDS)
+        self.assertIn('rawData', ReceiptRecord.FIELDS)
+
+    def test_key_order(self):
+        doc = {'receipt': dict(RECEIPT['receipt'], docName='Кассовый чек', cashTotalSum=8995)}
+        raw = pack_json(doc, docs=DOCS_BY_NAME)
+        expected = unpack_container_message(raw, FISCAL_SIGN)[0]['receipt']
+        actual = unpack_container_message_record(raw, FISCAL_SIGN)[0]['receipt']
+
+        self.assertEqual(list(expected), list(actual))
+        self.assertEqual(json.dumps(expected), json.dumps(actual.to_dict()))
+        self.assertEqual(list(expected['items'][0]), list(actual['items'][0]))
+
+        actual['receiptCode'] = 3
+        actual['totalSum'] = 1
+        del actual['userInn']
+        expected['receiptCode'] = 3
+        expected['totalSum'] = 1
+        del expected['userInn']
+        self.assertEqual(list(expected), actual.keys())
+
+    def test_validate(self):
+        raw = pack_json(VALID_RECEIPT, docs=DOCS_BY_NAME)
+        for backend in DocumentValidator.BACKENDS:
+            validator = DocumentValidator(['1.0'], SCHEMA_PATH, backend=backend)
+            record = unpack_container_message_record(raw, FISCAL_SIGN)[0]
+
+            with self.assertRaisesRegex(ValidationError, "'receiptCode' is a required property"):
+                validator.validate(record, '1.0')
+            record['receipt']['receiptCode'] = 3
+            validator.validate(record, '1.0')
+            record['receipt']['items'][0]['price'] = -1
+            with self.assertRaisesRegex(ValidationError, '-1 is less than the minimum of 0'):
+                validator.validate(record, '1.0')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,125 @@
+# coding: utf8
+#
+#        Copyright (C) 2017 Yandex LLC
+#        http://yandex.com
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#
+import random
+import unittest
+
+from jsonschema import ValidationError
+
+from ofd import rules
+from ofd.protocol import DocumentValidator
+from ofd.rules import ItemsConsistency, check_payment_totals
+from tests import SCHEMA_PATH
+
+
+def make_items(count, seed=0):
+    rnd = random.Random(seed)
+    items = []
+    for _ in range(count):
+        price = rnd.randint(1, 100000)
+        quantity = rnd.choice([1.0, 2.0, 0.5, 0.333, 12.125])
+        items.append({'name': 'товар', 'price': price, 'quantity': quantity, 'sum': int(round(price * quantity))})
+    return items
+
+
+class TestPaymentTotals(unittest.TestCase):
+    def test_payment_totals(self):
+        check_payment_totals('receipt', {'totalSum': 300, 'cashTotalSum': 100, 'ecashTotalSum': 200})
+        check_payment_totals('receipt', {'totalSum': 300, 'cashTotalSum': 0, 'ecashTotalSum': 0, 'prepaidSum': 300})
+        check_payment_totals('receipt', {'totalSum': 300})
+        check_payment_totals('closeShift', {'totalSum': 300, 'cashTotalSum': 100})
+
+        with self.assertRaises(ValidationError) as cm:
+            check_payment_totals('bso', {'totalSum': 300, 'cashTotalSum': 100, 'ecashTotalSum': 100})
+        self.assertEqual(['bso', 'totalSum'], list(cm.exception.path))
+
+
+class TestItemsConsistency(unittest.TestCase):
+    def checkers(self):
+        yield ItemsConsistency(use_numpy=False)
+        if rules.numpy is not None:
+            yield ItemsConsistency(use_numpy=True)
+
+    def test_consistent_items(self):
+        items = make_items(1000)
+        body = {'items': items, 'totalSum': sum(item['sum'] for item in items)}
+        for check in self.checkers():
+            check('receipt', body)
+            check('receipt', {'items': items[:1] + [{'name': 'без цены', 'sum': 5}], 'totalSum': items[0]['sum'] + 5})
+            check('receipt', {'items': [{'name': 'без суммы'}] + items, 'totalSum': 1})
+            check('closeShift', {'items': [{'price': 1, 'quantity': 1.0, 'sum': 2}]})
+
+    def test_wrong_item_sum(self):
+        items = make_items(100)
+        items[42]['sum'] += 2
+        items[70]['sum'] += 2
+        for check in self.checkers():
+            with self.assertRaises(ValidationError) as cm:
+                check('receipt', {'items': items, 'totalSum': sum(item['sum'] for item in items)})
+            self.assertEqual(['receipt', 'items', 42, 'sum'], list(cm.exception.path))
+
+    def test_wrong_total(self):
+        items = make_items(100)
+        for check in self.checkers():
+            with self.assertRaises(ValidationError) as cm:
+                check('bso', {'items': items, 'totalSum': sum(item['sum'] for item in items) + 1})
+            self.assertEqual(['bso', 'totalSum'], list(cm.exception.path))
+
+    def test_vat(self):
+        items = [
+            {'name': '1.05', 'price': 11800, 'quantity': 1.0, 'sum': 11800, 'nds': 1, 'ndsSum': 1800},
+            {'name': '1.05', 'price': 5900, 'quantity': 1.0, 'sum': 5900, 'nds': 1, 'ndsSum': 900},
+            {'name': '1.05', 'price': 1100, 'quantity': 1.0, 'sum': 1100, 'nds': 4, 'ndsSum': 100},
+            {'name': '1.05', 'price': 500, 'quantity': 1.0, 'sum': 500, 'nds': 6},
+            {'name': '1.0', 'price': 1000, 'quantity': 1.0, 'sum': 1000, 'nds0': 1000},
+        ]
+        body = {'items': items, 'totalSum': 20300, 'nds18': 2701, 'ndsCalculated10': 100, 'ndsNo': 500, 'nds0': 1000,
+                'nds10': 0}
+        for check in self.checkers():
+            check('receipt', body)
+            # у позиции нет данных об НДС - итоги НДС не проверяются
+            check('receipt', {'items': items + [{'name': 'без НДС', 'sum': 0}], 'nds18': 1})
+
+            for field, value in [('nds18', 2704), ('ndsNo', 0), ('nds10', 100)]:
+                with self.assertRaises(ValidationError) as cm:
+                    check('receipt', dict(body, **{field: value}))
+                self.assertEqual(['receipt', field], list(cm.exception.path))
+        ItemsConsistency(check_vat=False)('receipt', dict(body, nds18=1))
+
+    @unittest.skipIf(rules.numpy is None, 'NumPy is not installed')
+    def test_numpy_matches_python(self):
+        python, vectorized = ItemsConsistency(use_numpy=False), ItemsConsistency(use_numpy=True)
+        for seed in range(50):
+            items = make_items(20, seed)
+            rnd = random.Random(seed)
+            for item in rnd.sample(items, 3):
+                key = rnd.choice(['price', 'quantity', 'sum'])
+                if rnd.random() < 0.5:
+                    del item[key]
+                else:
+                    item[key] += 1
+            self.assertEqual(python._check_python(items), vectorized._check_numpy(items))
+
+    def test_document_validator_rule(self):
+        doc = {'receipt': {'dateTime': 1481906640, 'items': make_items(3), 'totalSum': 1}}
+        validator = DocumentValidator(['1.0'], SCHEMA_PATH, skip_unknown=True, rules=[ItemsConsistency()])
+
+        with self.assertRaisesRegex(ValidationError, 'Sum of items'):
+            validator.validate(doc, 'unknown')
+
+
+if __name__ == '__main__':
+    unittest.main()
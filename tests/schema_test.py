@@ -0,0 +1,274 @@
+# coding: utf8
+#
+#        Copyright (C) 2017 Yandex LLC
+#        http://yandex.com
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#
+
+import copy
+import datetime
+import json
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from jsonschema import Draft4Validator, RefResolver, SchemaError, ValidationError
+
+from ofd.bundle import build_bundle, write_bundles
+from ofd.protocol import DocumentValidator
+from ofd.schema import CompiledValidator, load_bundle
+from tests import SCHEMA_PATH
+
+VERSIONS = ['1.0', '1.05', '1.1']
+
+RECEIPT = {
+    'receipt': {
+        'user': 'РАПКАТ-ЦЕНТР',
+        'userInn': '500100732259',
+        'operator': 'СИС. АДМИНИСТРАТОР',
+        'requestNumber': 3,
+        'dateTime': 1481906640,
+        'shiftNumber': 4,
+        'operationType': 1,
+        'taxationType': 1,
+        'kktRegId': '0000000003038927',
+        'fiscalDriveNumber': '9999078900001366',
+        'fiscalDocumentNumber': 35,
+        'fiscalSign': 1334812543,
+        'items': [{'name': 'Тестовый товар', 'price': 2500, 'quantity': 5.0, 'sum': 12500, 'nds18': 1640}],
+        'totalSum': 12500,
+        'cashTotalSum': 12500,
+        'ecashTotalSum': 0,
+        'nds18': 1640,
+        'rawData': 'AwAeAQ==',
+        'code': 3,
+        'messageFiscalSign': 0,
+        'receiptCode': 3,
+    }
+}
+
+
+def mutations():
+    """Документы с типичными ошибками: неверный тип, выход за границы, лишний документ, пропущенное поле"""
+    yield RECEIPT
+    for key, value in [('userInn', '1'), ('userInn', 500100732259), ('shiftNumber', 0), ('shiftNumber', True),
+                       ('operationType', 7), ('fiscalSign', 2 ** 64), ('user', 'x' * 300), ('items', {}),
+                       ('items', [{'name': 1}]), ('items', [{'price': -1}]), ('receiptCode', 4),
+                       ('kktRegId', ''), ('rawData', ''), ('items', []), ('items', [{'name': ''}])]:
+        doc = copy.deepcopy(RECEIPT)
+        doc['receipt'][key] = value
+        yield doc
+    for key in ['dateTime', 'receiptCode', 'items']:
+        doc = copy.deepcopy(RECEIPT)
+        del doc['receipt'][key]
+        yield doc
+    yield {}
+    yield []
+    yield {'bso': RECEIPT['receipt']}
+    yield {'receipt': RECEIPT['receipt'], 'closeShift': {}}
+    yield {'fiscalReportCorrection': {'correctionReasonCode': []}}
+
+
+def error_details(validate, doc):
+    try:
+        validate(doc)
+    except ValidationError as e:
+        return (e.message, e.validator, e.validator_value, list(e.path), list(e.schema_path),
+                [context.message for context in e.context])
+
+
+def document_schema_validator(version):
+    full_path = os.path.abspath(os.path.join(SCHEMA_PATH, version, 'document.schema.json'))
+    with open(full_path, encoding='utf-8') as fh:
+        schema = json.load(fh)
+    return Draft4Validator(schema, resolver=RefResolver('file://' + full_path, schema))
+
+
+class TestDocumentValidator(unittest.TestCase):
+    def test_same_errors_for_all_backends(self):
+        for version in VERSIONS:
+            expected = DocumentValidator([version], SCHEMA_PATH)
+            actual = DocumentValidator([version], SCHEMA_PATH, backend='compiled')
+
+            for doc in mutations():
+                self.assertEqual(error_details(lambda d: expected.validate(d, version), doc),
+                                 error_details(lambda d: actual.validate(d, version), doc), (version, doc))
+
+    def test_body_errors_match_document_schema(self):
+        for version in VERSIONS:
+            document_schema = document_schema_validator(version)
+            validator = DocumentValidator([version], SCHEMA_PATH)
+
+            for doc in mutations():
+                if isinstance(doc, dict) and len(doc) == 1 and 'receipt' in doc:
+                    self.assertEqual(error_details(document_schema.validate, doc),
+                                     error_details(lambda d: validator.validate(d, version), doc), (version, doc))
+
+    def test_document_name_errors(self):
+        validator = DocumentValidator(['1.0'], SCHEMA_PATH)
+
+        with self.assertRaisesRegex(ValidationError, 'must contain one of'):
+            validator.validate({'unknown': {}}, '1.0')
+        with self.assertRaisesRegex(ValidationError, 'several documents'):
+            validator.validate({'receipt': RECEIPT['receipt'], 'closeShift': {}}, '1.0')
+        with self.assertRaisesRegex(ValidationError, 'must be an object'):
+            validator.validate([], '1.0')
+
+    def test_validate_document(self):
+        validator = DocumentValidator(['1.0'], SCHEMA_PATH, backend='compiled')
+        validator.validate(RECEIPT, '1.0')
+
+        doc = copy.deepcopy(RECEIPT)
+        doc['receipt']['fiscalDriveNumber'] = '1'
+        with self.assertRaises(ValidationError):
+            validator.validate(doc, '1.0')
+
+    def test_lazy_loading(self):
+        validator = DocumentValidator(['1.0', '1.05'], SCHEMA_PATH, backend='compiled', check_schema=False)
+        self.assertEqual({}, validator._validators)
+
+        validator.validate(RECEIPT, '1.0')
+        self.assertEqual({'1.0'}, set(validator._validators))
+
+        with self.assertRaises(FileNotFoundError):
+            DocumentValidator(['1.0'], os.path.join(SCHEMA_PATH, 'missing')).validate(RECEIPT, '1.0')
+
+    def test_document_dates(self):
+        validator = DocumentValidator(['1.0'], SCHEMA_PATH, min_date='2017.01.01')
+        with self.assertRaisesRegex(ValidationError, 'less than min. allowed date'):
+            validator.validate(RECEIPT, '1.0')
+
+        validator.min_date = None
+        validator.validate(RECEIPT, '1.0')
+
+        date_time = RECEIPT['receipt']['dateTime']
+        validator.min_date = datetime.datetime.fromtimestamp(date_time)
+        validator.validate(RECEIPT, '1.0')
+        validator.min_date = datetime.datetime.fromtimestamp(date_time + 0.5)
+        with self.assertRaisesRegex(ValidationError, 'less than min. allowed date'):
+            validator.validate(RECEIPT, '1.0')
+
+        doc = copy.deepcopy(RECEIPT)
+        doc['receipt']['dateTime'] = int(time.time()) + 3 * 3600
+        validator.future_hours = 1
+        with self.assertRaisesRegex(ValidationError, 'greater than now for 1 hours'):
+            validator.validate(doc, '1.0')
+        validator.future_hours = 48
+        validator.validate(doc, '1.0')
+
+    def test_future_bound_is_cached(self):
+        validator = DocumentValidator(['1.0'], SCHEMA_PATH)
+        validator.validate(RECEIPT, '1.0')
+        bound = validator._future_timestamp()
+
+        self.assertIsInstance(bound, int)
+        self.assertEqual(bound, validator._future_timestamp())
+        validator._future_expires = 0
+        self.assertLessEqual(bound, validator._future_timestamp())
+
+    def test_rules(self):
+        calls = []
+
+        def rule(doc_name, body):
+            calls.append((doc_name, body))
+            if body['totalSum'] > 10000:
+                raise ValidationError('too expensive')
+
+        validator = DocumentValidator(['1.0'], SCHEMA_PATH, rules=[rule])
+        with self.assertRaisesRegex(ValidationError, 'too expensive'):
+            validator.validate(RECEIPT, '1.0')
+        self.assertEqual([('receipt', RECEIPT['receipt'])], calls)
+
+    def test_unknown_backend(self):
+        with self.assertRaises(ValueError):
+            DocumentValidator(['1.0'], SCHEMA_PATH, backend='unknown')
+
+
+class TestCompiledValidator(unittest.TestCase):
+    def test_same_errors_as_jsonschema(self):
+        for version in VERSIONS:
+            expected = document_schema_validator(version)
+            actual = CompiledValidator(os.path.join(SCHEMA_PATH, version, 'document.schema.json'))
+
+            for doc in mutations():
+                self.assertEqual(error_details(expected.validate, doc), error_details(actual.validate, doc),
+                                 (version, doc))
+
+
+class TestSchemaCompiler(unittest.TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def compile(self, schema):
+        full_path = os.path.join(self.path, 'test.schema.json')
+        with open(full_path, 'w', encoding='utf-8') as fh:
+            json.dump(schema, fh)
+        return CompiledValidator(full_path)
+
+    def test_recursive_ref(self):
+        validator = self.compile({
+            'definitions': {'node': {'type': 'object', 'properties': {'children': {
+                'type': 'array', 'items': {'$ref': '#/definitions/node'}}}}},
+            '$ref': '#/definitions/node',
+        })
+
+        validator.validate({'children': [{'children': []}]})
+        with self.assertRaises(ValidationError) as cm:
+            validator.validate({'children': [{'children': [1]}]})
+        self.assertEqual(['children', 0, 'children', 0], list(cm.exception.path))
+
+    def test_unsupported_keyword(self):
+        with self.assertRaises(SchemaError):
+            self.compile({'type': 'object', 'additionalProperties': False})
+
+
+class TestBundle(unittest.TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_refs_are_local(self):
+        bundle = build_bundle(os.path.join(SCHEMA_PATH, '1.05'))
+
+        self.assertIn('dictionary.schema.json', bundle['files'])
+        self.assertEqual('#/files/receipt.schema.json/oneOf/0/properties/receipt',
+                         bundle['properties']['receipt']['$ref'])
+        self.assertNotIn('.schema.json#', json.dumps(bundle))
+
+    def test_same_errors_as_schema_directory(self):
+        write_bundles(SCHEMA_PATH, self.path)
+
+        for backend in DocumentValidator.BACKENDS:
+            expected = DocumentValidator(VERSIONS, SCHEMA_PATH, backend=backend)
+            actual = DocumentValidator(VERSIONS, self.path, backend=backend, bundle=True)
+            for version in VERSIONS:
+                for doc in mutations():
+                    self.assertEqual(error_details(lambda d: expected.validate(d, version), doc),
+                                     error_details(lambda d: actual.validate(d, version), doc),
+                                     (backend, version, doc))
+
+    def test_load_once(self):
+        bundle_path, = write_bundles(SCHEMA_PATH, self.path, ['1.0'])
+
+        self.assertIs(load_bundle(bundle_path), load_bundle(bundle_path))
+
+
+if __name__ == '__main__':
+    unittest.main()
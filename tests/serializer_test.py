@@ -0,0 +1,111 @@
+# coding: utf8
+#
+#        Copyright (C) 2017 Yandex LLC
+#        http://yandex.com
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#
+
+import io
+import json
+import struct
+import unittest
+
+from ofd.protocol import DOCS_BY_NAME, pack_json, unpack_container_message
+from ofd.serializer import dump_container_message, dumps_container_message
+from tests import FISCAL_SIGN, RECEIPT, VALID_RECEIPT
+
+# строки, которые json.dumps экранирует
+ESCAPED_RECEIPT = {
+    'receipt': {
+        'user': 'ООО "Ромашка" \\ магазин\t№1',
+        'propertiesUser': {'propertyName': 'цвет', 'propertyValue': 'синий'},
+        'items': [{'name': 'Хлеб "Бородинский"', 'price': 2500, 'quantity': 0.125, 'sum': 313}],
+    }
+}
+
+OPEN_SHIFT = {
+    'openShift': {
+        'user': 'РАПКАТ-ЦЕНТР',
+        'userInn': '7702203276  ',
+        'dateTime': 1481906640,
+        'shiftNumber': 4,
+        'kktRegId': '0000000003038927',
+        'fiscalDocumentNumber': 35,
+        'fiscalSign': 1334812543,
+    }
+}
+
+
+def append_tags(raw, tags):
+    """
+    Дописать теги в конец документа и поправить длину в заголовке.
+    """
+    ty, _ = struct.unpack_from('<HH', raw)
+    body = raw[4:] + tags
+    return struct.pack('<HH', ty, len(body)) + body
+
+
+class RecordingWriter(object):
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, text):
+        self.chunks.append(text)
+
+
+class TestDumpContainerMessage(unittest.TestCase):
+    def assertSameJson(self, raw):
+        expected = json.dumps(unpack_container_message(raw, FISCAL_SIGN)[0])
+        self.assertEqual(expected, dumps_container_message(raw, FISCAL_SIGN))
+        fp = io.StringIO()
+        dump_container_message(raw, FISCAL_SIGN, fp)
+        self.assertEqual(expected, fp.getvalue())
+
+    def test_same_as_json_dumps(self):
+        for doc in (RECEIPT, VALID_RECEIPT, ESCAPED_RECEIPT, OPEN_SHIFT, {'receipt': {}}):
+            self.assertSameJson(pack_json(doc, docs=DOCS_BY_NAME))
+
+    def test_repeated_tag_occurrences(self):
+        # второе вхождение неповторяющегося тега: значение последнее, место в документе - первое
+        raw = append_tags(pack_json(OPEN_SHIFT, docs=DOCS_BY_NAME), struct.pack('<HHI', 1038, 4, 5))
+        self.assertSameJson(raw)
+        self.assertIn('"shiftNumber": 5, "kktRegId"', dumps_container_message(raw, FISCAL_SIGN))
+
+    def test_repeated_tag_split(self):
+        # вхождения повторяющегося тега не подряд попадают в один список на месте первого
+        phone = 'телефон'.encode('cp866')
+        raw = append_tags(pack_json(RECEIPT, docs=DOCS_BY_NAME), struct.pack('<HH', 1073, len(phone)) + phone)
+        self.assertSameJson(raw)
+
+    def test_writes_incrementally(self):
+        raw = pack_json(RECEIPT, docs=DOCS_BY_NAME)
+        fp = RecordingWriter()
+        dump_container_message(raw, FISCAL_SIGN, fp)
+
+        self.assertGreater(len(fp.chunks), len(RECEIPT['receipt']))
+        self.assertEqual(dumps_container_message(raw, FISCAL_SIGN), ''.join(fp.chunks))
+
+    def test_broken_value(self):
+        # заголовки корректны, поэтому запись начинается и прерывается на сломанном значении
+        raw = append_tags(pack_json(OPEN_SHIFT, docs=DOCS_BY_NAME), struct.pack('<HH', 1012, 3) + b'\x00' * 3)
+        fp = RecordingWriter()
+        with self.assertRaises(struct.error):
+            dump_container_message(raw, FISCAL_SIGN, fp)
+        self.assertTrue(''.join(fp.chunks).startswith('{"openShift": {"user": '))
+
+    def test_broken_header(self):
+        raw = append_tags(pack_json(OPEN_SHIFT, docs=DOCS_BY_NAME), b'\x00')
+        fp = RecordingWriter()
+        with self.assertRaises(struct.error):
+            dump_container_message(raw, FISCAL_SIGN, fp)
+        self.assertEqual([], fp.chunks)
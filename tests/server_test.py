@@ -0,0 +1,166 @@
+# coding: utf8
+#
+#        Copyright (C) 2017 Yandex LLC
+#        http://yandex.com
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#
+
+import asyncio
+import concurrent.futures
+
+from ofd.protocol import DOCS_BY_NAME, FLK_ERROR, pack_json, unpack_container_message
+from ofd.server import RESPONSE_OK, Server
+from ofd.stream import SessionStreamParser
+from tests import SCHEMA_PATH, VALID_RECEIPT_INN10, make_container, make_session_message
+
+
+async def read_responses(rd, count):
+    parser = SessionStreamParser()
+    responses = []
+    while len(responses) < count:
+        chunk = await rd.read(4096)
+        assert chunk, 'connection closed'
+        for session, header, body in parser.feed(chunk):
+            responses.append(unpack_container_message(bytes(body), b'')[0]['operatorAck'])
+    return responses
+
+
+async def start(server):
+    """
+    Запустить сервер на свободном порту.
+    :return: порт сервера.
+    """
+    srv = await server.start(host='127.0.0.1')
+    return srv.sockets[0].getsockname()[1]
+
+
+def exchange(server, data, count):
+    """
+    Отправить серверу data в одном соединении и дождаться count ответов. Каждый тест запускается в своём event
+    loop через asyncio.run, без fixture event_loop из pytest-asyncio.
+    """
+    async def run():
+        port = await start(server)
+        try:
+            rd, wr = await asyncio.open_connection('127.0.0.1', port)
+            wr.write(data)
+            responses = await read_responses(rd, count)
+            wr.close()
+        finally:
+            server.close()
+            await server.wait_closed()
+        return responses
+
+    return asyncio.run(run())
+
+
+def test_pipelined_messages():
+    received = []
+
+    async def handler(doc, session, header):
+        received.append(doc['receipt']['fiscalDocumentNumber'])
+        if header.docnum() == 2:
+            return 1
+
+    server = Server(ofd_inn='7704358518', handler=handler)
+    broken = make_session_message(3, body=b'\x03\x00\x02\x00\x00')
+    responses = exchange(server, make_session_message(1) + make_session_message(2) + broken, 3)
+
+    assert [1, 2] == received
+    assert [1, 2, 3] == [r['fiscalDocumentNumber'] for r in responses]
+    assert [0, 1, FLK_ERROR] == [r['messageToFn']['ofdResponseCode'] for r in responses]
+    assert {'9999078900005488'} == {r['fiscalDriveNumber'] for r in responses}
+    assert {'7704358518'} == {r['ofdInn'] for r in responses}
+
+
+def test_read_timeout_closes_connection():
+    server = Server(ofd_inn='7704358518', read_timeout=0.05)
+
+    async def run():
+        port = await start(server)
+        try:
+            rd, wr = await asyncio.open_connection('127.0.0.1', port)
+            wr.write(make_session_message(1)[:10])
+            assert b'' == await asyncio.wait_for(rd.read(), 1)
+            wr.close()
+        finally:
+            server.close()
+            await server.wait_closed()
+
+    asyncio.run(run())
+
+
+def test_decode_in_executor():
+    received = []
+
+    async def handler(doc, session, header):
+        received.append(doc['receipt']['fiscalDocumentNumber'])
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=2) as executor:
+        server = Server(ofd_inn='7704358518', handler=handler, executor=executor, inline_threshold=60, max_pending=1)
+        large = make_container(2, user='x' * 100)
+        responses = exchange(server, make_session_message(1) + make_session_message(2, body=large) +
+                             make_session_message(3), 3)
+
+    assert [1, 2, 3] == received
+    assert [0, 0, 0] == [r['messageToFn']['ofdResponseCode'] for r in responses]
+
+
+def test_invalid_document_is_not_handled():
+    received = []
+
+    async def handler(doc, session, header):
+        received.append(doc)
+
+    server = Server(ofd_inn='7704358518', handler=handler, versions=['1.0'], validator_options={'path': SCHEMA_PATH})
+    response, = exchange(server, make_session_message(1), 1)
+
+    assert [] == received
+    assert FLK_ERROR == response['messageToFn']['ofdResponseCode']
+
+
+def test_valid_document_with_short_inn():
+    received = []
+
+    async def handler(doc, session, header):
+        received.append(doc)
+
+    server = Server(ofd_inn='7704358518', handler=handler, versions=['1.0'], validator_options={'path': SCHEMA_PATH})
+    response, = exchange(server, make_session_message(35, body=pack_json(VALID_RECEIPT_INN10, docs=DOCS_BY_NAME)), 1)
+
+    assert ['7702203276'] == [doc['receipt']['userInn'] for doc in received]
+    assert RESPONSE_OK == response['messageToFn']['ofdResponseCode']
+
+
+def test_created_outside_serving_loop():
+    # примитивы синхронизации должны принадлежать loop, в котором сервер запущен, а не текущему при создании
+    server = Server(ofd_inn='7704358518', handler=lambda doc, session, header: asyncio.sleep(0.01),
+                    max_concurrency=1)
+
+    async def run():
+        port = await start(server)
+        try:
+            connections = [await asyncio.open_connection('127.0.0.1', port) for _ in range(2)]
+            for number, (rd, wr) in enumerate(connections, 1):
+                wr.write(make_session_message(number))
+            responses = [(await read_responses(rd, 1))[0] for rd, wr in connections]
+            for rd, wr in connections:
+                wr.close()
+        finally:
+            server.close()
+            await server.wait_closed()
+        return responses
+
+    responses = asyncio.run(run())
+
+    assert [1, 2] == [r['fiscalDocumentNumber'] for r in responses]
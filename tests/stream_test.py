@@ -0,0 +1,151 @@
+# coding: utf8
+#
+#        Copyright (C) 2017 Yandex LLC
+#        http://yandex.com
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#
+
+import io
+import struct
+import unittest
+
+from ofd.protocol import FrameHeader, InvalidCrc, ProtocolError, SessionHeader, crc_ccitt
+from ofd.stream import SessionStreamParser, iter_messages
+from tests import FS_ID, make_container, make_session_message
+
+
+def make_message(number, flags=SessionHeader.SESSION_FLAGS):
+    body = make_container(number)
+    return make_session_message(number, body, flags), body
+
+
+class TestSessionStreamParser(unittest.TestCase):
+    def assertMessages(self, expected, actual):
+        self.assertEqual(len(expected), len(actual))
+        for (raw, body), (session, header, actual_body) in zip(expected, actual):
+            self.assertEqual(raw[:SessionHeader.STRUCT.size], session.pack())
+            self.assertEqual(raw[SessionHeader.STRUCT.size:][:FrameHeader.STRUCT.size], header.pack())
+            self.assertIsInstance(actual_body, memoryview)
+            self.assertEqual(body, actual_body)
+
+    def test_pipelined_messages_in_one_chunk(self):
+        messages = [make_message(i) for i in range(1, 4)]
+        parser = SessionStreamParser()
+
+        actual = parser.feed(b''.join(raw for raw, _ in messages))
+
+        self.assertMessages(messages, actual)
+        self.assertEqual(0, parser.buffered)
+        parser.close()
+
+    def test_split_at_every_position(self):
+        messages = [make_message(i) for i in range(1, 4)]
+        stream = b''.join(raw for raw, _ in messages)
+
+        for chunk_size in [1, 7, 29, 30, 31, 61, 100]:
+            parser = SessionStreamParser()
+            actual = []
+            for pos in range(0, len(stream), chunk_size):
+                actual += parser.feed(stream[pos:pos + chunk_size])
+            parser.close()
+            self.assertMessages(messages, actual)
+
+    def test_message_without_container(self):
+        session = SessionHeader(pva=256, fs_id=FS_ID, length=0, flags=SessionHeader.EMPTY_FLAGS, crc=0)
+        (actual, header, body), = SessionStreamParser().feed(session.pack())
+
+        self.assertEqual(0, actual.length)
+        self.assertIsNone(header)
+        self.assertEqual(b'', body)
+
+    def test_container_greater_than_maximum(self):
+        raw, _ = make_message(1)
+        with self.assertRaises(ProtocolError):
+            SessionStreamParser(max_len=FrameHeader.STRUCT.size).feed(raw[:SessionHeader.STRUCT.size])
+
+    def test_invalid_signature(self):
+        raw, _ = make_message(1)
+        with self.assertRaises(ValueError):
+            SessionStreamParser().feed(b'\x00' + raw[1:])
+
+    def test_incomplete_message(self):
+        raw, _ = make_message(1)
+        parser = SessionStreamParser()
+        self.assertEqual([], parser.feed(raw[:-1]))
+        with self.assertRaises(ProtocolError):
+            parser.close()
+
+    def test_iter_messages(self):
+        messages = [make_message(i) for i in range(1, 4)]
+        stream = io.BytesIO(b''.join(raw for raw, _ in messages))
+
+        self.assertMessages(messages, list(iter_messages(stream, chunk_size=50)))
+
+
+def make_signed_message(number, crc_flags=SessionHeader.CRC_NONE):
+    raw, body = make_message(number, flags=SessionHeader.SESSION_FLAGS | crc_flags)
+    session = SessionHeader.unpack_from(raw[:SessionHeader.STRUCT.size])
+    header = FrameHeader.unpack_from(raw[SessionHeader.STRUCT.size:][:FrameHeader.STRUCT.size])
+    header.recalculate_crc(body)
+    container = header.pack() + body
+    session.crc = session.calculate_crc(container)
+    return session.pack() + container, body
+
+
+class TestCrcVerification(unittest.TestCase):
+    def test_valid_crc(self):
+        for crc_flags in [SessionHeader.CRC_NONE, SessionHeader.CRC_HEADER, SessionHeader.CRC_HEADER_AND_BODY]:
+            raw, body = make_signed_message(1, crc_flags)
+            parser = SessionStreamParser(check_crc=True)
+
+            (_, _, actual_body), = parser.feed(raw[:40]) + parser.feed(raw[40:])
+
+            self.assertEqual(body, actual_body)
+
+    def test_corrupted_body(self):
+        raw, _ = make_signed_message(1)
+        corrupted = raw[:-1] + bytes([raw[-1] ^ 0xff])
+
+        self.assertEqual(1, len(SessionStreamParser().feed(corrupted)))
+        with self.assertRaises(InvalidCrc):
+            SessionStreamParser(check_crc=True).feed(corrupted)
+
+    def test_session_crc(self):
+        raw, _ = make_signed_message(1, SessionHeader.CRC_HEADER_AND_BODY)
+        session = SessionHeader.unpack_from(raw[:SessionHeader.STRUCT.size])
+        session.crc ^= 0xffff
+
+        with self.assertRaises(InvalidCrc):
+            SessionStreamParser(check_crc=True).feed(session.pack() + raw[SessionHeader.STRUCT.size:])
+
+    def test_reserved_crc_flags(self):
+        raw, _ = make_signed_message(1, SessionHeader.CRC_FLAGS_MASK)
+
+        with self.assertRaises(InvalidCrc):
+            SessionStreamParser(check_crc=True).feed(raw)
+
+    def test_valid_crc_other_msgtype(self):
+        raw, body = make_message(1)
+        container = bytearray(raw[SessionHeader.STRUCT.size:])
+        container[4] = 0xa6
+        container[2:4] = struct.pack('<H', crc_ccitt(bytes(container[:2] + container[4:])))
+
+        (_, header, actual_body), = SessionStreamParser(check_crc=True).feed(
+            raw[:SessionHeader.STRUCT.size] + container)
+
+        self.assertEqual(0xa6, header.msgtype)
+        self.assertEqual(body, actual_body)
+
+
+if __name__ == '__main__':
+    unittest.main()